@@ -4,10 +4,18 @@
 Базовый уровень - работа с CRUD операциями в SQLite
 """
 
+import json
 import sqlite3
 from datetime import datetime
 
 
+# Поля рецепта, изменения которых попадают в историю правок
+REVISION_FIELDS = ('name', 'category', 'ingredients', 'cooking_time', 'rating', 'description')
+
+# Каждая N-я ревизия хранит полный снимок рецепта, остальные - только изменённые поля
+SNAPSHOT_INTERVAL = 10
+
+
 class RecipeBook:
     """Приложение для управления рецептами"""
     
@@ -43,6 +51,24 @@ class RecipeBook:
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         """)
+        
+        # История правок: diff изменённых полей + периодические полные снимки.
+        # Ревизия 0 - исходная версия рецепта (снимок), пишется при первой правке.
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS recipe_revisions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                recipe_id INTEGER NOT NULL,
+                revision INTEGER NOT NULL,
+                changes TEXT,
+                snapshot TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE(recipe_id, revision)
+            )
+        """)
+        # Ревизии рецептов, удалённых до того, как история стала удаляться вместе с ними
+        self.cursor.execute("""
+            DELETE FROM recipe_revisions WHERE recipe_id NOT IN (SELECT id FROM recipes)
+        """)
         self.conn.commit()
     
     # ============ CRUD ОПЕРАЦИИ ============
@@ -107,15 +133,29 @@ class RecipeBook:
             print("✗ Рейтинг должен быть от 1 до 5!")
             return False
         
-        set_clause = ", ".join([f"{k} = ?" for k in update_fields.keys()])
-        values = list(update_fields.values()) + [recipe_id]
+        current = self._get_recipe_fields(recipe_id)
+        if current is None:
+            print(f"✗ Рецепт с ID {recipe_id} не найден!")
+            return False
+        
+        # В историю попадают только реально изменившиеся поля
+        changes = {k: v for k, v in update_fields.items() if current[k] != v}
+        if not changes:
+            print("✓ Изменений нет, рецепт оставлен без правок")
+            return True
+        
+        set_clause = ", ".join([f"{k} = ?" for k in changes.keys()])
+        values = list(changes.values()) + [recipe_id]
         
         try:
+            self.conn.execute("BEGIN TRANSACTION")
             self.cursor.execute(f"UPDATE recipes SET {set_clause} WHERE id = ?", values)
+            self._record_revision(recipe_id, current, changes)
             self.conn.commit()
             print(f"✓ Рецепт успешно обновлён!")
             return True
         except sqlite3.IntegrityError:
+            self.conn.rollback()
             print("✗ Ошибка: рецепт с таким названием уже существует!")
             return False
     
@@ -129,11 +169,150 @@ class RecipeBook:
             return False
         
         name = recipe[0]
-        self.cursor.execute("DELETE FROM recipes WHERE id = ?", (recipe_id,))
-        self.conn.commit()
+        try:
+            # История правок удаляется вместе с рецептом
+            self.conn.execute("BEGIN TRANSACTION")
+            self.cursor.execute("DELETE FROM recipe_revisions WHERE recipe_id = ?", (recipe_id,))
+            self.cursor.execute("DELETE FROM recipes WHERE id = ?", (recipe_id,))
+            self.conn.commit()
+        except sqlite3.Error as e:
+            self.conn.rollback()
+            print(f"✗ Ошибка: {e}")
+            return False
         print(f"✓ Рецепт '{name}' успешно удалён!")
         return True
     
+    # ============ ИСТОРИЯ ПРАВОК ============
+    
+    def _get_recipe_fields(self, recipe_id):
+        """Текущие значения версионируемых полей рецепта (dict) или None"""
+        self.cursor.execute(
+            f"SELECT {', '.join(REVISION_FIELDS)} FROM recipes WHERE id = ?",
+            (recipe_id,)
+        )
+        row = self.cursor.fetchone()
+        return dict(zip(REVISION_FIELDS, row)) if row else None
+    
+    def _record_revision(self, recipe_id, previous, changes):
+        """
+        Запись ревизии в рамках текущей транзакции
+        Args:
+            recipe_id: ID рецепта
+            previous: значения полей до правки
+            changes: изменённые поля с новыми значениями
+        """
+        self.cursor.execute(
+            "SELECT MAX(revision) FROM recipe_revisions WHERE recipe_id = ?",
+            (recipe_id,)
+        )
+        last_revision = self.cursor.fetchone()[0]
+        
+        if last_revision is None:
+            # Первая правка: сохраняем исходную версию как ревизию 0
+            self.cursor.execute("""
+                INSERT INTO recipe_revisions (recipe_id, revision, snapshot)
+                VALUES (?, 0, ?)
+            """, (recipe_id, json.dumps(previous, ensure_ascii=False)))
+            last_revision = 0
+        
+        revision = last_revision + 1
+        snapshot = None
+        if revision % SNAPSHOT_INTERVAL == 0:
+            snapshot = json.dumps({**previous, **changes}, ensure_ascii=False)
+        
+        self.cursor.execute("""
+            INSERT INTO recipe_revisions (recipe_id, revision, changes, snapshot)
+            VALUES (?, ?, ?, ?)
+        """, (recipe_id, revision, json.dumps(changes, ensure_ascii=False), snapshot))
+    
+    def history(self, recipe_id):
+        """
+        Ленивый обход истории правок рецепта (от старых к новым)
+        Yields:
+            (revision, changes, created_at), где changes - изменённые поля;
+            для ревизии 0 - полная исходная версия рецепта
+        """
+        # Отдельный курсор, чтобы обход не сбивался другими запросами
+        cursor = self.conn.execute("""
+            SELECT revision, COALESCE(changes, snapshot), created_at
+            FROM recipe_revisions
+            WHERE recipe_id = ?
+            ORDER BY revision
+        """, (recipe_id,))
+        
+        try:
+            for revision, changes, created_at in cursor:
+                yield revision, json.loads(changes), created_at
+        finally:
+            cursor.close()
+    
+    def get_recipe_version(self, recipe_id, revision):
+        """
+        Восстановление рецепта на момент ревизии:
+        ближайший снимок + применение diff'ов после него
+        """
+        self.cursor.execute("""
+            SELECT revision, snapshot
+            FROM recipe_revisions
+            WHERE recipe_id = ? AND revision <= ? AND snapshot IS NOT NULL
+            ORDER BY revision DESC
+            LIMIT 1
+        """, (recipe_id, revision))
+        base = self.cursor.fetchone()
+        
+        if not base:
+            print(f"✗ Ревизия {revision} рецепта {recipe_id} не найдена!")
+            return None
+        
+        base_revision, snapshot = base
+        state = json.loads(snapshot)
+        
+        self.cursor.execute("""
+            SELECT revision, changes
+            FROM recipe_revisions
+            WHERE recipe_id = ? AND revision > ? AND revision <= ?
+            ORDER BY revision
+        """, (recipe_id, base_revision, revision))
+        
+        last_revision = base_revision
+        for last_revision, changes in self.cursor.fetchall():
+            state.update(json.loads(changes))
+        
+        if last_revision != revision:
+            print(f"✗ Ревизия {revision} рецепта {recipe_id} не найдена!")
+            return None
+        
+        return state
+    
+    def rollback_recipe(self, recipe_id, revision):
+        """Откат рецепта к ревизии (сам откат тоже попадает в историю)"""
+        state = self.get_recipe_version(recipe_id, revision)
+        if state is None:
+            return False
+        
+        if self._get_recipe_fields(recipe_id) is None:
+            print(f"✗ Рецепт с ID {recipe_id} не найден!")
+            return False
+        
+        print(f"↩️  Откат рецепта {recipe_id} к ревизии {revision}...")
+        return self.update_recipe(recipe_id, **state)
+    
+    def print_history(self, recipe_id):
+        """Вывод истории правок рецепта"""
+        count = 0
+        for revision, changes, created_at in self.history(recipe_id):
+            if count == 0:
+                print(f"\n🕘 ИСТОРИЯ ПРАВОК РЕЦЕПТА {recipe_id}:")
+            title = "исходная версия" if revision == 0 else "изменения"
+            print(f"  #{revision} ({created_at}) - {title}:")
+            for field, value in changes.items():
+                print(f"      {field}: {value}")
+            count += 1
+        
+        if count == 0:
+            print(f"✗ У рецепта {recipe_id} нет истории правок!")
+        return count
+    
     # ============ ПОИСК ============
     
     def search_by_category(self, category):
@@ -294,10 +473,12 @@ class RecipeBook:
             print("9. 📊 Статистика по категориям")
             print("10. 📖 Все рецепты")
             print("11. 🚀 Добавить тестовые данные")
+            print("12. 🕘 История правок рецепта")
+            print("13. ↩️  Откат рецепта к ревизии")
             print("0. ❌ Выход")
             print("=" * 60)
             
-            choice = input("Выберите действие (0-11): ").strip()
+            choice = input("Выберите действие (0-13): ").strip()
             
             if choice == "0":
                 print("✓ До свидания!")
@@ -324,6 +505,10 @@ class RecipeBook:
                 self.list_all_recipes()
             elif choice == "11":
                 self._add_test_data()
+            elif choice == "12":
+                self._menu_history()
+            elif choice == "13":
+                self._menu_rollback()
             else:
                 print("✗ Неверный выбор! Попробуйте снова.")
     
@@ -421,6 +606,23 @@ class RecipeBook:
         except ValueError:
             print("✗ Ошибка: время должно быть числом!")
     
+    def _menu_history(self):
+        """Меню истории правок"""
+        try:
+            recipe_id = int(input("Введите ID рецепта: ").strip())
+            self.print_history(recipe_id)
+        except ValueError:
+            print("✗ Ошибка: ID должно быть числом!")
+    
+    def _menu_rollback(self):
+        """Меню отката к ревизии"""
+        try:
+            recipe_id = int(input("Введите ID рецепта: ").strip())
+            revision = int(input("Номер ревизии: ").strip())
+            self.rollback_recipe(recipe_id, revision)
+        except ValueError:
+            print("✗ Ошибка: ID и ревизия должны быть числами!")
+    
     def _add_test_data(self):
         """Добавление тестовых данных"""
         test_recipes = [
@@ -0,0 +1,483 @@
+
+"""
+Аналитика трекера привычек на NumPy
+Статистика считается по годовым битмапам habit_bitmaps, без GROUP BY по habit_logs
+"""
+
+import json
+from datetime import date, timedelta
+
+import numpy as np
+
+from habit_tracker import BITMAP_BYTES, TRACKING_START_SQL
+
+
+# Сколько результатов correlations() хранится в кэше
+CORRELATION_CACHE_SIZE = 16
+
+
+class _RollingSeries:
+    """Префиксные суммы выполнений и плана по дням для rolling_rates()"""
+    
+    def __init__(self, habits, origin):
+        self.habits = habits            # [(id, расписание, начало отслеживания)]
+        self.origin = origin            # день, с которого идут суммы
+        count = len(habits)
+        self.done = np.zeros((count, 1))
+        self.plan = np.zeros((count, 1))
+        self.valid_until = origin - timedelta(days=1)
+
+
+class HabitAnalytics:
+    """Векторная статистика по календарю выполнения привычек"""
+    
+    def __init__(self, tracker):
+        """
+        Args:
+            tracker: экземпляр HabitTracker (используется его соединение с БД)
+        """
+        self.tracker = tracker
+        # (привычки, период, сдвиги) -> (версия данных, результат correlations)
+        self._correlation_cache = {}
+        # habit_id (None - все привычки) -> _RollingSeries
+        self._rolling = {}
+        self._rolling_version = None
+        self._watching_logs = False
+    
+    # ============ КАЛЕНДАРЬ ============
+    
+    def completion_matrix(self, habit_ids, start, end):
+        """
+        Матрица выполнения: строка на привычку, столбец на день периода
+        Args:
+            habit_ids: список ID привычек
+            start, end: границы периода включительно (date или ISO-строка)
+        Returns:
+            np.ndarray bool формы (len(habit_ids), дней в периоде)
+        """
+        start, end = _to_date(start), _to_date(end)
+        years = list(range(start.year, end.year + 1))
+        row_of = {habit_id: i for i, habit_id in enumerate(habit_ids)}
+        
+        packed = np.zeros((len(habit_ids), len(years), BITMAP_BYTES), dtype=np.uint8)
+        cursor = self.tracker.conn.execute(f"""
+            SELECT habit_id, year, bits
+            FROM habit_bitmaps
+            WHERE habit_id IN ({", ".join("?" * len(habit_ids))})
+                AND year BETWEEN ? AND ?
+        """, (*habit_ids, start.year, end.year))
+        for habit_id, year, bits in cursor:
+            packed[row_of[habit_id], year - start.year] = np.frombuffer(bits, dtype=np.uint8)
+        
+        # Распаковка всех лет разом, затем склейка без «лишнего» 366-го дня
+        days = np.unpackbits(packed, axis=-1).astype(bool)
+        calendar = np.concatenate(
+            [days[:, i, :_days_in_year(year)] for i, year in enumerate(years)], axis=1
+        )
+        
+        offset = (start - date(start.year, 1, 1)).days
+        return calendar[:, offset:offset + (end - start).days + 1]
+    
+    def completion_calendar(self, habit_id, start, end):
+        """Вектор выполнения привычки по дням периода (bool)"""
+        return self.completion_matrix([habit_id], start, end)[0]
+    
+    def daily_summary(self, start, end):
+        """
+        Плотные массивы сводки по дням для тепловой карты
+        Returns:
+            (дни np.datetime64[D], выполнено np.int64, запланировано np.int64)
+            Дни без записей в daily_summary получают completed = 0, а scheduled
+            считается по тому же правилу, что и SCHEDULED_ON_DAY_SQL: привычки,
+            отслеживаемые в этот день и не отключённые к нему.
+        """
+        start, end = _to_date(start), _to_date(end)
+        days = np.arange(start, end + timedelta(days=1), dtype="datetime64[D]")
+        
+        # Привычка запланирована на дни [начало отслеживания, дата отключения)
+        conn = self.tracker.conn
+        rows = conn.execute(f"""
+            SELECT start, CASE WHEN is_active = 1 THEN NULL ELSE deactivated_at END
+            FROM (SELECT is_active, deactivated_at,
+                         {TRACKING_START_SQL.format(habit="habits")} AS start
+                  FROM habits)
+            WHERE is_active = 1 OR deactivated_at > start
+        """).fetchall()
+        tracking_starts = np.sort(np.array([row[0] for row in rows], dtype="datetime64[D]"))
+        deactivations = np.sort(np.array([row[1] for row in rows if row[1]], dtype="datetime64[D]"))
+        scheduled = (np.searchsorted(tracking_starts, days, side="right")
+                     - np.searchsorted(deactivations, days, side="right")).astype(np.int64)
+        completed = np.zeros(len(days), dtype=np.int64)
+        
+        rows = conn.execute("""
+            SELECT log_date, completed, scheduled
+            FROM daily_summary
+            WHERE log_date BETWEEN ? AND ?
+        """, (start.isoformat(), end.isoformat())).fetchall()
+        if rows:
+            log_dates, day_completed, day_scheduled = zip(*rows)
+            index = (np.array(log_dates, dtype="datetime64[D]") - days[0]).astype(np.int64)
+            completed[index] = day_completed
+            scheduled[index] = day_scheduled
+        
+        return days, completed, scheduled
+    
+    # ============ РАСПИСАНИЕ ============
+    
+    def expected_occurrences(self, start, end, habit_ids=None):
+        """
+        Ожидаемое по расписанию число выполнений в [start, end] сразу для всех
+        (или выбранных) привычек; дни до начала отслеживания не учитываются,
+        неполные недели и месяцы - пропорционально доле дней
+        Returns:
+            (ID привычек np.int64, план np.float64)
+        """
+        start, end = _to_date(start), _to_date(end)
+        rows = self.tracker.conn.execute(f"""
+            SELECT id, frequency, {TRACKING_START_SQL.format(habit="habits")}
+            FROM habits
+            WHERE ? IS NULL OR id IN (SELECT value FROM json_each(?))
+            ORDER BY id
+        """, (None if habit_ids is None else 1,
+              None if habit_ids is None else json.dumps(list(habit_ids)))).fetchall()
+        if not rows:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        
+        ids, frequencies, tracking_starts = zip(*rows)
+        schedules = [self.tracker._schedule_of(frequency) for frequency in frequencies]
+        times = np.array([schedule.times for schedule in schedules], dtype=np.float64)
+        period = np.array([schedule.period for schedule in schedules])
+        
+        first = np.maximum(np.array(tracking_starts, dtype="datetime64[D]"), np.datetime64(start, "D"))
+        stop = np.datetime64(end, "D") + 1
+        first = np.minimum(first, stop)
+        days = (stop - first).astype(np.float64)
+        
+        expected = np.where(period == "day", times * days, times * days / 7)
+        is_month = period == "month"
+        expected[is_month] = times[is_month] * (_month_position(stop) - _month_position(first[is_month]))
+        return np.array(ids, dtype=np.int64), expected
+    
+    # ============ СТАТИСТИКА ============
+    
+    def period_stats(self, habit_id, start, end, period="week"):
+        """
+        Статистика по неделям (с понедельника) или календарным месяцам
+        Args:
+            period: 'week' или 'month'
+        Returns:
+            (начала периодов [date], выполнено [int], дней в периоде [int],
+             процент успеха [float])
+        """
+        start, end = _to_date(start), _to_date(end)
+        calendar = self.completion_calendar(habit_id, start, end)
+        
+        days = np.arange(start, end + timedelta(days=1), dtype="datetime64[D]")
+        if period == "week":
+            # 1970-01-01 - четверг, поэтому понедельник: (день + 3) % 7 == 0
+            is_boundary = (days.astype(np.int64) + 3) % 7 == 0
+        elif period == "month":
+            is_boundary = days == days.astype("datetime64[M]").astype("datetime64[D]")
+        else:
+            raise ValueError(f"Неизвестный период: {period}")
+        is_boundary[0] = True
+        
+        boundaries = np.flatnonzero(is_boundary)
+        completed = np.add.reduceat(calendar.astype(np.int64), boundaries)
+        total = np.diff(np.append(boundaries, len(calendar)))
+        rates = np.round(completed * 100.0 / total, 1)
+        
+        return days[boundaries].tolist(), completed, total, rates
+    
+    def rolling_rates(self, habit_id=None, windows=(7, 30), start=None, end=None):
+        """
+        Процент выполнения плана по расписанию в скользящих окнах,
+        заканчивающихся в каждом дне периода (выполнения сверх плана не засчитываются)
+        Args:
+            habit_id: ID привычки; None - все привычки
+            windows: длины окон в днях
+            start, end: период, по умолчанию - от начала отслеживания до сегодня
+        Returns:
+            {'days': np.datetime64[D], 'habit_ids': np.int64, 'rates': {окно: проценты}}
+            проценты - вектор по дням для одной привычки, матрица (привычки, дни)
+            для всех; NaN - в окне ещё ничего не запланировано
+        
+        Выполнения и план копятся префиксными суммами по плотному массиву дней.
+        Суммы кэшируются: новые дни дописываются в конец, отметка задним числом
+        пересчитывает суммы только начиная с её дня.
+        """
+        windows = tuple(sorted({int(window) for window in windows}))
+        if not windows or windows[0] < 1:
+            raise ValueError("Длина окна должна быть не меньше 1 дня")
+        self._watch_logs()
+        version = self.tracker.conn.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._rolling_version:
+            self._rolling.clear()   # запись из другого соединения - изменённые дни неизвестны
+            self._rolling_version = version
+        
+        habits = self._rolling_habits(habit_id)
+        if habit_id is not None and not habits:
+            raise ValueError(f"Привычка с ID {habit_id} не найдена")
+        end = _to_date(end) if end is not None else date.today()
+        if start is None:
+            start = min((tracking_start for _, _, tracking_start in habits), default=end)
+        start = min(_to_date(start), end)
+        
+        series = self._rolling_series(habit_id, habits, start - timedelta(days=windows[-1] - 1))
+        if series.valid_until < end:
+            self._extend_rolling(series, series.valid_until + timedelta(days=1), end)
+        
+        # Индекс суммы по конец дня t: (t - origin) + 1
+        index = np.arange((start - series.origin).days, (end - series.origin).days + 1) + 1
+        rates = {}
+        for window in windows:
+            done = series.done[:, index] - series.done[:, index - window]
+            plan = series.plan[:, index] - series.plan[:, index - window]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                rate = np.where(plan > 1e-9, np.round(np.minimum(done, plan) * 100.0 / plan, 1), np.nan)
+            rates[window] = rate[0] if habit_id is not None else rate
+        
+        return {
+            'days': np.arange(start, end + timedelta(days=1), dtype="datetime64[D]"),
+            'habit_ids': np.array([habit[0] for habit in habits], dtype=np.int64),
+            'rates': rates,
+        }
+    
+    def _rolling_habits(self, habit_id):
+        """Привычки ряда: [(id, расписание, начало отслеживания date)]"""
+        rows = self.tracker.conn.execute(f"""
+            SELECT id, frequency, {TRACKING_START_SQL.format(habit="habits")}
+            FROM habits
+            WHERE ? IS NULL OR id = ?
+            ORDER BY id
+        """, (habit_id, habit_id)).fetchall()
+        return [(row[0], self.tracker._schedule_of(row[1]), date.fromisoformat(row[2][:10]))
+                for row in rows]
+    
+    def _rolling_series(self, habit_id, habits, origin):
+        """Кэшированный ряд; смена состава, расписаний или более раннее начало - заново"""
+        series = self._rolling.get(habit_id)
+        if (series is None or series.origin > origin
+                or [habit[:2] for habit in habits] != [habit[:2] for habit in series.habits]):
+            series = self._rolling[habit_id] = _RollingSeries(habits, origin)
+            return series
+        
+        # Начало отслеживания сдвинулось (отметка раньше создания) - пересчёт с этого дня
+        for (_, _, new_start), (_, _, old_start) in zip(habits, series.habits):
+            if new_start != old_start:
+                self._invalidate_rolling(series, min(new_start, old_start))
+        series.habits = habits
+        return series
+    
+    def _extend_rolling(self, series, first, last):
+        """Пересчёт префиксных сумм ряда с дня first по last (дни до first не меняются)"""
+        ids = [habit[0] for habit in series.habits]
+        days = np.arange(first, last + timedelta(days=1), dtype="datetime64[D]")
+        done = self.completion_matrix(ids, first, last).astype(np.float64)
+        
+        # План на день: раз за период / дней в периоде, с начала отслеживания
+        months = days.astype("datetime64[M]")
+        month_days = ((months + 1).astype("datetime64[D]") - months.astype("datetime64[D]")).astype(np.float64)
+        plan = np.zeros((len(ids), len(days)))
+        for row, (_, schedule, tracking_start) in enumerate(series.habits):
+            length = {'day': 1.0, 'week': 7.0}.get(schedule.period, month_days)
+            plan[row] = np.where(days >= np.datetime64(tracking_start, "D"), schedule.times / length, 0.0)
+        
+        keep = (first - series.origin).days + 1
+        series.done = np.concatenate(
+            (series.done[:, :keep], series.done[:, keep - 1:keep] + np.cumsum(done, axis=1)), axis=1
+        )
+        series.plan = np.concatenate(
+            (series.plan[:, :keep], series.plan[:, keep - 1:keep] + np.cumsum(plan, axis=1)), axis=1
+        )
+        series.valid_until = last
+    
+    def _invalidate_rolling(self, series, day):
+        """Суммы ряда с дня day и дальше устарели"""
+        series.valid_until = max(min(series.valid_until, day - timedelta(days=1)),
+                                 series.origin - timedelta(days=1))
+    
+    def _watch_logs(self):
+        """Подписка на изменения логов трекера (при первом обращении к рядам)"""
+        if not self._watching_logs:
+            self.tracker.log_listeners.append(self._logs_changed)
+            self._watching_logs = True
+    
+    def _logs_changed(self, habit_id, log_date):
+        """Отметка изменилась: ряды с этой привычкой пересчитываются с её дня"""
+        if habit_id is None:
+            self._rolling.clear()
+            return
+        day = _to_date(log_date)
+        for series in self._rolling.values():
+            if any(habit[0] == habit_id for habit in series.habits):
+                self._invalidate_rolling(series, day)
+    
+    def rolling_counts(self, habit_id, window, start, end):
+        """
+        Количество выполнений в скользящем окне из window дней, заканчивающемся
+        в каждом дне периода (окно учитывает и дни до start)
+        """
+        start, end = _to_date(start), _to_date(end)
+        history = self.completion_calendar(habit_id, start - timedelta(days=window - 1), end)
+        return np.convolve(history.astype(np.int64), np.ones(window, dtype=np.int64), mode="valid")
+    
+    def streaks(self, habit_id, start, end):
+        """
+        Серии подряд выполненных дней внутри периода
+        Returns:
+            (даты начала серий [date], длины серий np.ndarray)
+        """
+        start = _to_date(start)
+        starts, lengths = _runs(self.completion_calendar(habit_id, start, end))
+        return [start + timedelta(days=int(i)) for i in starts], lengths
+    
+    def summary(self, habit_id, start, end):
+        """Сводка за период: дней, выполнено, процент, самая длинная серия"""
+        calendar = self.completion_calendar(habit_id, start, end)
+        _, lengths = _runs(calendar)
+        
+        completed = int(np.count_nonzero(calendar))
+        return {
+            'days': len(calendar),
+            'completed': completed,
+            'success_rate': round(completed * 100.0 / len(calendar), 1) if len(calendar) else 0.0,
+            'longest_streak': int(lengths.max()) if len(lengths) else 0,
+        }
+    
+    
+    # ============ СОВМЕСТНОЕ ВЫПОЛНЕНИЕ ============
+    
+    def correlations(self, start, end, habit_ids=None, lags=(0,)):
+        """
+        Совместное выполнение привычек попарно: для сдвига lag пара (i, j) -
+        привычка i выполнена в день t, привычка j - в день t + lag.
+        Учитываются только дни, когда отслеживались обе привычки. Все пары
+        и все четыре счётчика сдвига считаются одним матричным произведением
+        по матрице привычки × дни; результат кэшируется до следующей записи в БД.
+        Args:
+            habit_ids: список ID привычек; None - все привычки
+            lags: сдвиги в днях (>= 0)
+        Returns:
+            {'habit_ids': np.int64, 'completed': выполнено дней np.int64,
+             'lags': {lag: {'together': оба выполнены, 'days': дней в паре,
+                            'lift': P(i и j) / (P(i) * P(j)),
+                            'phi': коэффициент φ (корреляция Пирсона для 0/1)}}}
+            матрицы формы (привычек, привычек); lift/phi - NaN, где не определены
+        """
+        start, end = _to_date(start), _to_date(end)
+        lags = tuple(sorted({int(lag) for lag in lags}))
+        total_days = (end - start).days + 1
+        if not lags or lags[0] < 0 or lags[-1] >= total_days:
+            raise ValueError(f"Сдвиги должны быть от 0 до {total_days - 1} дней")
+        
+        key = (None if habit_ids is None else tuple(habit_ids), start, end, lags)
+        version = self._data_version()
+        cached = self._correlation_cache.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        
+        rows = self.tracker.conn.execute(f"""
+            SELECT id, {TRACKING_START_SQL.format(habit="habits")}
+            FROM habits
+            WHERE ? IS NULL OR id IN (SELECT value FROM json_each(?))
+            ORDER BY id
+        """, (None if habit_ids is None else 1,
+              None if habit_ids is None else json.dumps(list(habit_ids)))).fetchall()
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        tracking_starts = np.array([row[1] for row in rows], dtype="datetime64[D]")
+        
+        days = np.arange(start, end + timedelta(days=1), dtype="datetime64[D]")
+        tracked = days[None, :] >= tracking_starts[:, None]
+        done = self.completion_matrix(ids.tolist(), start, end) & tracked
+        # Строки 0..n-1 - выполнение, n..2n-1 - отслеживание
+        stacked = np.concatenate((done, tracked)).astype(np.float64)
+        count = len(ids)
+        
+        result = {'habit_ids': ids, 'completed': done.sum(axis=1), 'lags': {}}
+        for lag in lags:
+            products = stacked[:, :total_days - lag] @ stacked[:, lag:].T
+            together = products[:count, :count]
+            first = products[:count, count:]    # i выполнена, j отслеживается
+            second = products[count:, :count]   # i отслеживается, j выполнена
+            overlap = products[count:, count:]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                lift = together * overlap / (first * second)
+                phi = ((overlap * together - first * second)
+                       / np.sqrt(first * (overlap - first) * second * (overlap - second)))
+            result['lags'][lag] = {
+                'together': together.astype(np.int64),
+                'days': overlap.astype(np.int64),
+                'lift': np.where(np.isfinite(lift), lift, np.nan),
+                'phi': np.where(np.isfinite(phi), phi, np.nan),
+            }
+        _freeze(result)
+        
+        if len(self._correlation_cache) >= CORRELATION_CACHE_SIZE:
+            self._correlation_cache.pop(next(iter(self._correlation_cache)))
+        self._correlation_cache[key] = (version, result)
+        return result
+    
+    def top_pairs(self, start, end, lag=0, min_together=5, limit=10):
+        """
+        Пары привычек с наибольшей корреляцией выполнения
+        Returns:
+            [(habit_a, habit_b, together, lift, phi)] по убыванию phi;
+            при lag > 0 привычка b выполняется через lag дней после a
+        """
+        result = self.correlations(start, end, lags=(lag,))
+        stats = result['lags'][lag]
+        ids = result['habit_ids']
+        
+        pairs = np.ones((len(ids), len(ids)), dtype=bool)
+        pairs = np.triu(pairs, k=1) if lag == 0 else ~np.eye(len(ids), dtype=bool)
+        pairs &= (stats['together'] >= min_together) & np.isfinite(stats['phi'])
+        rows, cols = np.nonzero(pairs)
+        order = np.argsort(-stats['phi'][rows, cols], kind="stable")[:limit]
+        return [
+            (int(ids[i]), int(ids[j]), int(stats['together'][i, j]),
+             round(float(stats['lift'][i, j]), 3), round(float(stats['phi'][i, j]), 3))
+            for i, j in zip(rows[order], cols[order])
+        ]
+    
+    def _data_version(self):
+        """
+        Версия данных БД: data_version меняется после записи из других
+        соединений, total_changes - после записи через соединение трекера
+        """
+        conn = self.tracker.conn
+        return conn.execute("PRAGMA data_version").fetchone()[0], conn.total_changes
+
+
+def _freeze(result):
+    """Массивы кэшированного результата - только для чтения"""
+    for value in result.values():
+        if isinstance(value, np.ndarray):
+            value.setflags(write=False)
+        elif isinstance(value, dict):
+            _freeze(value)
+
+
+def _to_date(value):
+    """date из date или ISO-строки"""
+    return value if isinstance(value, date) else date.fromisoformat(value)
+
+
+def _month_position(days):
+    """Номер месяца с долей прошедших дней: 1970-01-16 -> 0.48"""
+    months = np.asarray(days).astype("datetime64[M]")
+    month_start = months.astype("datetime64[D]")
+    month_length = ((months + 1).astype("datetime64[D]") - month_start).astype(np.float64)
+    return months.astype(np.float64) + (days - month_start).astype(np.float64) / month_length
+
+
+def _runs(calendar):
+    """Серии единиц в булевом векторе: (индексы начала, длины)"""
+    edges = np.diff(np.concatenate(([0], calendar.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    return starts, np.flatnonzero(edges == -1) - starts
+
+
+def _days_in_year(year):
+    """Количество дней в году"""
+    return (date(year + 1, 1, 1) - date(year, 1, 1)).days
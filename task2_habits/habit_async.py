@@ -0,0 +1,165 @@
+
+"""
+Асинхронный фасад трекера привычек для asyncio
+Все вызовы HabitTracker выполняются в отдельном потоке БД, event loop не блокируется.
+"""
+
+import asyncio
+import queue
+import threading
+
+from habit_tracker import HabitTracker
+
+
+class _Request:
+    """Запрос к потоку БД"""
+    
+    def __init__(self, loop, future, method, args, kwargs):
+        self.loop = loop
+        self.future = future
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.cancelled = False
+
+
+class AsyncHabitTracker:
+    """
+    Корутинные версии публичных методов HabitTracker:
+        async with AsyncHabitTracker("habits.db") as tracker:
+            await tracker.log_habit_completion(1)
+            stats = await tracker.get_weekly_stats(1)
+    """
+    
+    def __init__(self, db_path="habits.db", max_pending=100):
+        """
+        Args:
+            db_path: путь к БД
+            max_pending: максимум запросов в очереди; остальные вызовы ждут
+                свободного места (backpressure)
+        """
+        self.db_path = db_path
+        self.max_pending = max_pending
+        self._requests = queue.Queue()
+        self._slots = asyncio.Semaphore(max_pending)
+        self._current = None
+        self._current_lock = threading.Lock()
+        self._closed = False
+        
+        # Соединение создаётся и используется только в потоке БД
+        self._tracker = None
+        self._startup_error = None
+        started = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(started,),
+                                        name="habit-db", daemon=True)
+        self._thread.start()
+        started.wait()
+        if self._startup_error is not None:
+            raise self._startup_error
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, exc_type, exc, traceback):
+        await self.close()
+    
+    def __getattr__(self, name):
+        """Публичный метод HabitTracker в виде корутины"""
+        if name.startswith('_') or not callable(getattr(HabitTracker, name, None)):
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+        
+        async def method(*args, **kwargs):
+            return await self.call(name, *args, **kwargs)
+        
+        method.__name__ = name
+        method.__doc__ = getattr(HabitTracker, name).__doc__
+        return method
+    
+    # ============ ВЫЗОВЫ ============
+    
+    async def call(self, method, *args, **kwargs):
+        """
+        Вызов метода HabitTracker в потоке БД
+        Отмена корутины во время выполнения прерывает текущий запрос
+        через Connection.interrupt(), незавершённая транзакция откатывается.
+        """
+        if method.startswith('_') or not callable(getattr(HabitTracker, method, None)):
+            raise AttributeError(f"HabitTracker не содержит публичного метода '{method}'")
+        if self._closed:
+            raise RuntimeError("AsyncHabitTracker закрыт")
+        
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            request = _Request(loop, loop.create_future(), method, args, kwargs)
+            self._requests.put(request)
+            try:
+                return await request.future
+            except asyncio.CancelledError:
+                with self._current_lock:
+                    request.cancelled = True
+                    if self._current is request:
+                        self._tracker.conn.interrupt()
+                raise
+    
+    def pending(self):
+        """Число запросов в очереди потока БД"""
+        return self._requests.qsize()
+    
+    async def close(self):
+        """Завершение потока БД после обработки уже поставленных запросов"""
+        if self._closed:
+            return
+        self._closed = True
+        self._requests.put(None)
+        await asyncio.get_running_loop().run_in_executor(None, self._thread.join)
+    
+    # ============ ПОТОК БД ============
+    
+    def _run(self, started):
+        """Цикл потока БД: запросы выполняются строго по очереди"""
+        try:
+            self._tracker = HabitTracker(self.db_path)
+        except Exception as e:
+            self._startup_error = e
+            return
+        finally:
+            started.set()
+        
+        while True:
+            request = self._requests.get()
+            if request is None:
+                break
+            
+            with self._current_lock:
+                if request.cancelled:
+                    continue
+                self._current = request
+            
+            result = error = None
+            try:
+                result = getattr(self._tracker, request.method)(*request.args, **request.kwargs)
+            except Exception as e:
+                error = e
+            finally:
+                with self._current_lock:
+                    self._current = None
+                    cancelled = request.cancelled
+            if cancelled and self._tracker.conn.in_transaction:
+                self._tracker.conn.rollback()
+            
+            try:
+                request.loop.call_soon_threadsafe(self._resolve, request.future, result, error)
+            except RuntimeError:
+                pass  # event loop вызывающего уже закрыт
+        
+        self._tracker.close()
+    
+    @staticmethod
+    def _resolve(future, result, error):
+        """Передача результата в event loop (если корутину ещё ждут)"""
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
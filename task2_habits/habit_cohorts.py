@@ -0,0 +1,233 @@
+
+"""
+Удержание привычек: кривые выживания Каплана-Мейера и когортные таблицы
+Длительности привычек извлекаются одним агрегирующим запросом по habits
+(без чтения логов - последний выполненный день поддерживают триггеры),
+кривые и таблицы удержания считаются на NumPy сразу для всех групп.
+"""
+
+from datetime import date
+
+import numpy as np
+
+from habit_sharding import ShardedHabitService
+from habit_tracker import DAY_OFFSET, TRACKING_START_SQL
+
+
+# Привычка брошена, если не выполнялась дольше этого числа дней
+# (и дольше двух допустимых по расписанию перерывов) или отключена
+DEFAULT_LAPSE_DAYS = 30
+
+# Длина периода когортной таблицы в днях
+RETENTION_PERIOD_DAYS = {'week': 7, 'month': 30}
+
+# Поля, по которым можно группировать кривые и когорты
+COHORT_GROUPS = ('category', 'frequency')
+
+# Длительности привычек, свёрнутые по (категория, частота, месяц создания,
+# длительность, брошена): миллионы привычек дают сотни тысяч строк.
+# LIMIT -1 не даёт встроить spans во внешний запрос - иначе начало отслеживания
+# (коррелированные подзапросы) вычислялось бы заново для каждого упоминания start_day
+SPANS_SQL = f"""
+    WITH spans AS (
+        SELECT COALESCE(NULLIF(category, ''), 'Без категории') AS category,
+               COALESCE(frequency, 'daily') AS frequency, is_active,
+               MAX(:lapse_days, 2 * COALESCE(reminder_gap_days, 2)) AS lapse_days,
+               CAST(julianday({TRACKING_START_SQL.format(habit="habits")}) - {DAY_OFFSET} AS INTEGER)
+                   AS start_day,
+               CAST(julianday(last_completed_date) - {DAY_OFFSET} AS INTEGER) AS last_completed
+        FROM habits
+        LIMIT -1
+    )
+    SELECT category, frequency, substr(date(start_day + {DAY_OFFSET}), 1, 7) AS cohort,
+           CASE WHEN abandoned THEN last_day - start_day ELSE :as_of - start_day END AS duration,
+           abandoned, COUNT(*) AS habits
+    FROM (
+        SELECT category, frequency, start_day, last_day,
+               last_day < :as_of - lapse_days OR (is_active = 0 AND last_day <= :as_of) AS abandoned
+        FROM (SELECT *, MAX(start_day, COALESCE(last_completed, 0)) AS last_day FROM spans)
+        WHERE start_day <= :as_of
+    )
+    GROUP BY 1, 2, 3, 4, 5
+"""
+
+
+class HabitCohorts:
+    """
+    Выживание и удержание привычек:
+        cohorts = HabitCohorts(tracker)                # одна БД
+        cohorts = HabitCohorts(service)                # все пользователи ShardedHabitService
+        cohorts.survival_curves(by="category")
+        cohorts.retention_table(by=("category", "frequency"), period="month")
+    """
+    
+    def __init__(self, source, user_ids=None):
+        """
+        Args:
+            source: HabitTracker или ShardedHabitService (по всем пользователям)
+            user_ids: пользователи для ShardedHabitService; None - все
+        """
+        self.source = source
+        self.user_ids = user_ids
+        # (as_of, lapse_days, версия данных) -> длительности последнего запроса
+        self._spans_key = None
+        self._spans = None
+    
+    # ============ ДЛИТЕЛЬНОСТИ ============
+    
+    def spans(self, as_of=None, lapse_days=DEFAULT_LAPSE_DAYS):
+        """
+        Длительности привычек: от начала отслеживания до последнего выполнения
+        (брошенные) или до as_of (ещё живые - цензурированные наблюдения)
+        Returns:
+            {'category', 'frequency', 'cohort' (YYYY-MM): np.ndarray строк,
+             'duration': дней, 'abandoned': bool, 'habits': число привычек в строке}
+        """
+        as_of = _to_date(as_of or date.today())
+        params = {'as_of': as_of.toordinal(), 'lapse_days': int(lapse_days)}
+        
+        if isinstance(self.source, ShardedHabitService):
+            rows = []
+            per_user = self.source.map_users(
+                lambda tracker: tracker.conn.execute(SPANS_SQL, params).fetchall(), self.user_ids)
+            for user_rows in per_user.values():
+                if not isinstance(user_rows, Exception):
+                    rows.extend(user_rows)
+        else:
+            conn = self.source.conn
+            key = (as_of, params['lapse_days'],
+                   conn.execute("PRAGMA data_version").fetchone()[0], conn.total_changes)
+            if key == self._spans_key:
+                return self._spans
+            rows = conn.execute(SPANS_SQL, params).fetchall()
+        
+        columns = list(zip(*rows)) or [()] * 6
+        spans = {
+            'category': np.array(columns[0], dtype=object),
+            'frequency': np.array(columns[1], dtype=object),
+            'cohort': np.array(columns[2], dtype=object),
+            'duration': np.array(columns[3], dtype=np.int64),
+            'abandoned': np.array(columns[4], dtype=bool),
+            'habits': np.array(columns[5], dtype=np.int64),
+        }
+        spans['as_of'] = as_of
+        if not isinstance(self.source, ShardedHabitService):
+            self._spans_key, self._spans = key, spans
+        return spans
+    
+    # ============ КРИВЫЕ ВЫЖИВАНИЯ ============
+    
+    def survival_curves(self, by=None, as_of=None, lapse_days=DEFAULT_LAPSE_DAYS, max_days=None):
+        """
+        Оценка Каплана-Мейера: доля привычек, которые живут дольше t дней
+        Args:
+            by: None, 'category', 'frequency' или ('category', 'frequency')
+            max_days: длина кривой; None - до самой длинной привычки
+        Returns:
+            {группа: {'habits': ..., 'abandoned': ..., 'survival': S(t) для t = 0..max_days,
+                      'at_risk': живых к дню t, 'stderr': ошибка по Гринвуду,
+                      'median_days': первый день с S(t) <= 0.5 или None}}
+        """
+        spans = self.spans(as_of, lapse_days)
+        labels, codes = _group_codes(spans, by)
+        if max_days is None:
+            max_days = int(spans['duration'].max()) if len(spans['duration']) else 0
+        width = max_days + 2                    # последний столбец - живут дольше max_days
+        
+        index = codes * width + np.minimum(spans['duration'], max_days + 1)
+        size = len(labels) * width
+        exits = np.bincount(index, weights=spans['habits'], minlength=size).reshape(-1, width)
+        deaths = np.bincount(index, weights=spans['habits'] * spans['abandoned'],
+                             minlength=size).reshape(-1, width)[:, :max_days + 1]
+        
+        # В риске в день t - привычки с длительностью >= t
+        at_risk = exits[:, ::-1].cumsum(axis=1)[:, ::-1][:, :max_days + 1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            hazard = np.where(at_risk > 0, deaths / at_risk, 0.0)
+            survival = np.cumprod(1.0 - hazard, axis=1)
+            greenwood = np.cumsum(np.where(at_risk > deaths, deaths / (at_risk * (at_risk - deaths)),
+                                           0.0), axis=1)
+        stderr = survival * np.sqrt(greenwood)
+        
+        below = survival <= 0.5
+        medians = np.where(below.any(axis=1), below.argmax(axis=1), -1)
+        return {
+            label: {
+                'habits': int(exits[i].sum()),
+                'abandoned': int(deaths[i].sum()),
+                'survival': survival[i],
+                'at_risk': at_risk[i].astype(np.int64),
+                'stderr': stderr[i],
+                'median_days': int(medians[i]) if medians[i] >= 0 else None,
+            }
+            for i, label in enumerate(labels)
+        }
+    
+    # ============ КОГОРТЫ ============
+    
+    def retention_table(self, by=None, period="month", periods=12, as_of=None,
+                        lapse_days=DEFAULT_LAPSE_DAYS):
+        """
+        Удержание по месяцам создания: доля привычек когорты, живых через k периодов
+        Args:
+            by: None, 'category', 'frequency' или ('category', 'frequency')
+            period: 'week' или 'month' (30 дней)
+            periods: число столбцов после нулевого
+        Returns:
+            {группа: {'cohorts': [YYYY-MM], 'habits': размер когорты np.int64,
+                      'retention': матрица (когорт, periods + 1)}}
+            NaN - возраст, которого когорта ещё не достигла к as_of
+        """
+        if period not in RETENTION_PERIOD_DAYS:
+            raise ValueError(f"Период должен быть одним из: {', '.join(RETENTION_PERIOD_DAYS)}")
+        period_days = RETENTION_PERIOD_DAYS[period]
+        spans = self.spans(as_of, lapse_days)
+        labels, codes = _group_codes(spans, by)
+        cohorts, cohort_codes = np.unique(spans['cohort'].astype(str), return_inverse=True)
+        width = periods + 1
+        
+        # Полных периодов прожито: живые в k-м столбце - прожившие >= k периодов
+        survived = np.minimum(spans['duration'] // period_days, periods)
+        index = (codes * len(cohorts) + cohort_codes) * width + survived
+        counts = np.bincount(index, weights=spans['habits'],
+                             minlength=len(labels) * len(cohorts) * width)
+        alive = counts.reshape(len(labels), len(cohorts), width)[:, :, ::-1].cumsum(axis=2)[:, :, ::-1]
+        
+        # Столбец k известен, если k периодов прошло и для созданных в последний день месяца
+        month_ends = (cohorts.astype("datetime64[M]") + 1).astype("datetime64[D]") - 1
+        age = np.maximum((np.datetime64(spans['as_of'], "D") - month_ends).astype(np.int64), 0)
+        observed = age[:, None] >= np.arange(width)[None, :] * period_days
+        
+        result = {}
+        for i, label in enumerate(labels):
+            sizes = alive[i, :, 0]
+            present = sizes > 0
+            with np.errstate(divide="ignore", invalid="ignore"):
+                retention = np.where(observed, alive[i] / sizes[:, None], np.nan)[present]
+            result[label] = {
+                'cohorts': cohorts[present].tolist(),
+                'habits': sizes[present].astype(np.int64),
+                'retention': retention,
+            }
+        return result
+
+
+def _group_codes(spans, by):
+    """Метки групп и номер группы для каждой строки длительностей"""
+    fields = () if by is None else (by,) if isinstance(by, str) else tuple(by)
+    unknown = [field for field in fields if field not in COHORT_GROUPS]
+    if unknown:
+        raise ValueError(f"Группировка возможна по: {', '.join(COHORT_GROUPS)}")
+    if not fields:
+        return ["Все"], np.zeros(len(spans['habits']), dtype=np.int64)
+    
+    keys = [tuple(values) if len(fields) > 1 else values[0]
+            for values in zip(*(spans[field].tolist() for field in fields))]
+    labels = sorted(set(keys))
+    positions = {label: i for i, label in enumerate(labels)}
+    return labels, np.array([positions[key] for key in keys], dtype=np.int64)
+
+
+def _to_date(value):
+    """date из date или ISO-строки"""
+    return value if isinstance(value, date) else date.fromisoformat(value)
@@ -0,0 +1,244 @@
+
+"""
+Очередь приёма отметок с групповым commit
+Параллельные отметки копятся до max_batch штук или max_delay_ms миллисекунд
+и пишутся одной транзакцией; вызывающий получает ответ только после commit.
+"""
+
+import bisect
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from datetime import date, datetime
+
+from habit_tracker import HabitTracker
+
+
+# Границы корзин гистограмм (последняя корзина - всё, что больше)
+BATCH_SIZE_BOUNDS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+COMMIT_MS_BOUNDS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+class Histogram:
+    """Гистограмма с фиксированными границами корзин (потокобезопасная)"""
+    
+    def __init__(self, bounds):
+        self.bounds = tuple(bounds)
+        self._counts = [0] * (len(self.bounds) + 1)
+        self._total = 0
+        self._sum = 0.0
+        self._max = None
+        self._lock = threading.Lock()
+    
+    def add(self, value):
+        """Добавление значения"""
+        with self._lock:
+            self._counts[bisect.bisect_left(self.bounds, value)] += 1
+            self._total += 1
+            self._sum += value
+            self._max = value if self._max is None else max(self._max, value)
+    
+    def snapshot(self):
+        """
+        Текущее состояние
+        Returns:
+            {'count', 'mean', 'max', 'p50', 'p99', 'buckets': [(граница, число), ...]}
+            p50/p99 - верхняя граница корзины, в которую попал перцентиль
+        """
+        with self._lock:
+            counts = list(self._counts)
+            total, value_sum, value_max = self._total, self._sum, self._max
+        
+        labels = [f"<={bound}" for bound in self.bounds] + [f">{self.bounds[-1]}"]
+        return {
+            'count': total,
+            'mean': round(value_sum / total, 3) if total else None,
+            'max': round(value_max, 3) if value_max is not None else None,
+            'p50': self._percentile(counts, total, 0.5, value_max),
+            'p99': self._percentile(counts, total, 0.99, value_max),
+            'buckets': list(zip(labels, counts)),
+        }
+    
+    def _percentile(self, counts, total, fraction, value_max):
+        """Верхняя граница корзины, содержащей перцентиль"""
+        if not total:
+            return None
+        seen = 0
+        for index, count in enumerate(counts):
+            seen += count
+            if seen >= total * fraction:
+                return self.bounds[index] if index < len(self.bounds) else value_max
+        return value_max
+
+
+class _CheckIn:
+    """Отметка в очереди и ожидающий её результата Future"""
+    
+    def __init__(self, habit_id, log_date, note):
+        self.habit_id = habit_id
+        self.log_date = log_date
+        self.note = note
+        self.future = Future()
+
+
+class GroupCommitQueue:
+    """
+    Приём отметок с объединением в транзакции:
+        with GroupCommitQueue("habits.db") as ingest:
+            ingest.check_in(1)                   # ждёт commit своего пакета
+            future = ingest.submit(2, "2024-01-15")
+    """
+    
+    def __init__(self, db_path="habits.db", max_batch=500, max_delay_ms=5):
+        """
+        Args:
+            db_path: путь к БД
+            max_batch: максимум отметок в одной транзакции
+            max_delay_ms: сколько ждать новых отметок после первой в пакете
+        """
+        self.db_path = db_path
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self.batch_sizes = Histogram(BATCH_SIZE_BOUNDS)
+        self.commit_ms = Histogram(COMMIT_MS_BOUNDS)
+        self._requests = queue.Queue()
+        self._closed = False
+        
+        # Соединение создаётся и используется только в потоке записи
+        self._tracker = None
+        self._startup_error = None
+        started = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(started,),
+                                        name="habit-ingest", daemon=True)
+        self._thread.start()
+        started.wait()
+        if self._startup_error is not None:
+            raise self._startup_error
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+    
+    # ============ ПРИЁМ ОТМЕТОК ============
+    
+    def submit(self, habit_id, log_date=None, note=""):
+        """
+        Постановка отметки в очередь
+        Returns:
+            Future: True после commit пакета, False - привычка не найдена
+                или пакет не записан
+        Raises:
+            ValueError: некорректная дата
+        """
+        if self._closed:
+            raise RuntimeError("Очередь приёма отметок закрыта")
+        if log_date is None:
+            log_date = datetime.now().date().isoformat()
+        else:
+            try:
+                log_date = date.fromisoformat(str(log_date)).isoformat()
+            except ValueError:
+                raise ValueError(f"Некорректная дата '{log_date}', ожидается YYYY-MM-DD") from None
+        
+        request = _CheckIn(habit_id, log_date, note)
+        self._requests.put(request)
+        return request.future
+    
+    def check_in(self, habit_id, log_date=None, note="", timeout=None):
+        """Отметка с ожиданием записи на диск; возвращает True/False"""
+        return self.submit(habit_id, log_date, note).result(timeout)
+    
+    def pending(self):
+        """Число отметок, ожидающих записи"""
+        return self._requests.qsize()
+    
+    def stats(self):
+        """Гистограммы размера пакета и времени записи пакета (мс)"""
+        return {
+            'batch_size': self.batch_sizes.snapshot(),
+            'commit_ms': self.commit_ms.snapshot(),
+        }
+    
+    def print_stats(self):
+        """Вывод гистограмм"""
+        stats = self.stats()
+        print("\n📥 ОЧЕРЕДЬ ПРИЁМА ОТМЕТОК")
+        for title, key in (("Размер пакета", 'batch_size'), ("Запись пакета, мс", 'commit_ms')):
+            histogram = stats[key]
+            print(f"  {title}: пакетов {histogram['count']}, среднее {histogram['mean']}, "
+                  f"p50 {histogram['p50']}, p99 {histogram['p99']}, макс {histogram['max']}")
+            for label, count in histogram['buckets']:
+                if count:
+                    print(f"    {label:>7}: {count}")
+    
+    def close(self):
+        """Запись оставшихся отметок и завершение потока записи"""
+        if self._closed:
+            return
+        self._closed = True
+        self._requests.put(None)
+        self._thread.join()
+    
+    # ============ ПОТОК ЗАПИСИ ============
+    
+    def _run(self, started):
+        """Цикл потока записи: сбор пакета и одна транзакция на пакет"""
+        try:
+            self._tracker = HabitTracker(self.db_path)
+        except Exception as e:
+            self._startup_error = e
+            return
+        finally:
+            started.set()
+        
+        stopping = False
+        while not stopping:
+            request = self._requests.get()
+            if request is None:
+                break
+            
+            batch = [request]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                try:
+                    request = (self._requests.get(timeout=timeout) if timeout > 0
+                               else self._requests.get_nowait())
+                except queue.Empty:
+                    break
+                if request is None:
+                    stopping = True
+                    break
+                batch.append(request)
+            
+            self._write_batch(batch)
+        
+        self._tracker.close()
+    
+    def _write_batch(self, batch):
+        """Запись пакета одной транзакцией и ответ всем его отправителям"""
+        try:
+            habit_ids = sorted({request.habit_id for request in batch})
+            existing = {row[0] for row in self._tracker.conn.execute("""
+                SELECT id FROM habits WHERE id IN (SELECT value FROM json_each(?))
+            """, (json.dumps(habit_ids),))}
+            entries = [(request.habit_id, request.log_date, request.note)
+                       for request in batch if request.habit_id in existing]
+            
+            written = True
+            if entries:
+                started = time.perf_counter()
+                written = self._tracker.log_completions(entries, quiet=True) > 0
+                self.commit_ms.add((time.perf_counter() - started) * 1000)
+                self.batch_sizes.add(len(entries))
+        except Exception as e:
+            for request in batch:
+                request.future.set_exception(e)
+            return
+        
+        for request in batch:
+            request.future.set_result(written and request.habit_id in existing)
@@ -0,0 +1,240 @@
+
+"""
+Планировщик напоминаний по habits.target_time
+Ближайшие моменты напоминаний хранятся в куче (heapq): поток спит до самого
+раннего из них, проверяет выполнение точечным запросом по первичному ключу
+(habit_id, day) и ставит следующее напоминание этой привычки.
+"""
+
+import heapq
+import threading
+from datetime import datetime
+
+from habit_schedule import (
+    next_reminder_at, parse_frequency, parse_target_time, period_start, required_by,
+)
+from habit_tracker import HabitTracker
+
+
+class ReminderScheduler:
+    """
+    Напоминания о невыполненных привычках в момент target_time:
+        scheduler = ReminderScheduler("habits.db")
+        scheduler.watch(tracker)   # изменения привычек в tracker сразу попадают в кучу
+        scheduler.start()
+        ...
+        scheduler.stop()
+    """
+    
+    def __init__(self, db_path="habits.db", on_reminder=None, clock=datetime.now):
+        """
+        Args:
+            db_path: путь к БД
+            on_reminder: функция (habit_id, name, fire_at); по умолчанию - вывод в консоль
+            clock: источник текущего времени (datetime)
+        """
+        self.db_path = db_path
+        self.on_reminder = on_reminder or self._print_reminder
+        self.clock = clock
+        # Куча (момент, habit_id, версия); записи устаревших версий пропускаются
+        self._heap = []
+        # habit_id -> (версия, момент, название, расписание, время напоминания)
+        self._habits = {}
+        self._version = 0
+        self._changed = set()
+        self._reload_all = True
+        self._stopping = False
+        self._condition = threading.Condition()
+        self._thread = None
+        self._tracker = None
+    
+    # ============ УПРАВЛЕНИЕ ============
+    
+    def watch(self, tracker):
+        """Подписка на создание, изменение и удаление привычек в HabitTracker"""
+        tracker.habit_listeners.append(self.habit_changed)
+    
+    def habit_changed(self, habit_id):
+        """Пересчёт напоминания привычки (None - всех привычек); потокобезопасно"""
+        with self._condition:
+            if habit_id is None:
+                self._reload_all = True
+            else:
+                self._changed.add(habit_id)
+            self._condition.notify()
+    
+    def refresh(self):
+        """Перечитать все привычки (после изменений из другого процесса)"""
+        self.habit_changed(None)
+    
+    def next_reminder(self):
+        """Ближайшее напоминание: (момент, habit_id) или None"""
+        with self._condition:
+            current = [(fire_at, habit_id) for fire_at, habit_id, version in self._heap
+                       if self._is_current(habit_id, version)]
+        return min(current) if current else None
+    
+    def start(self):
+        """Запуск планировщика в фоновом потоке"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name="habit-reminders", daemon=True)
+            self._thread.start()
+    
+    def stop(self):
+        """Остановка планировщика"""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+    
+    def run(self):
+        """Цикл планировщика в текущем потоке (до stop())"""
+        self._tracker = HabitTracker(self.db_path)
+        try:
+            while True:
+                with self._condition:
+                    if self._stopping:
+                        break
+                    changed, reload_all = self._changed, self._reload_all
+                    self._changed, self._reload_all = set(), False
+                
+                if reload_all:
+                    self._load_all()
+                else:
+                    for habit_id in changed:
+                        self._load_habit(habit_id)
+                self._fire_due()
+                
+                with self._condition:
+                    if self._stopping or self._changed or self._reload_all:
+                        continue
+                    timeout = None
+                    if self._heap:
+                        timeout = max(0.0, (self._heap[0][0] - self.clock()).total_seconds())
+                    self._condition.wait(timeout)
+        finally:
+            self._tracker.close()
+            self._tracker = None
+            with self._condition:
+                self._stopping = False
+    
+    # ============ КУЧА НАПОМИНАНИЙ ============
+    
+    def _load_all(self):
+        """Построение кучи по всем активным привычкам с target_time"""
+        self._tracker.cursor.execute("""
+            SELECT id, name, frequency, target_time FROM habits
+            WHERE is_active = 1 AND target_time IS NOT NULL AND target_time != ''
+        """)
+        rows = self._tracker.cursor.fetchall()
+        with self._condition:
+            self._heap.clear()
+            self._habits.clear()
+        for habit_id, name, frequency, target_time in rows:
+            self._schedule(habit_id, name, frequency, target_time)
+    
+    def _load_habit(self, habit_id):
+        """Пересчёт напоминания одной привычки (точечный запрос по первичному ключу)"""
+        self._tracker.cursor.execute("""
+            SELECT name, frequency, target_time, is_active FROM habits WHERE id = ?
+        """, (habit_id,))
+        row = self._tracker.cursor.fetchone()
+        if row and row[3]:
+            self._schedule(habit_id, row[0], row[1], row[2])
+        else:
+            self._unschedule(habit_id)
+    
+    def _schedule(self, habit_id, name, frequency, target_time):
+        """Постановка следующего напоминания привычки (старая запись устаревает)"""
+        try:
+            schedule = parse_frequency(frequency)
+            target = parse_target_time(target_time)
+        except ValueError as e:
+            print(f"✗ Напоминание для '{name}' не запланировано: {e}")
+            target = None
+        if target is None:
+            self._unschedule(habit_id)
+            return
+        
+        fire_at = next_reminder_at(target, self.clock())
+        with self._condition:
+            self._version += 1
+            self._habits[habit_id] = (self._version, fire_at, name, schedule, target)
+            heapq.heappush(self._heap, (fire_at, habit_id, self._version))
+            self._compact_heap()
+    
+    def _unschedule(self, habit_id):
+        """Снятие напоминаний привычки (запись в куче становится устаревшей)"""
+        with self._condition:
+            self._habits.pop(habit_id, None)
+            self._compact_heap()
+    
+    def _is_current(self, habit_id, version):
+        """Актуальна ли запись кучи"""
+        habit = self._habits.get(habit_id)
+        return habit is not None and habit[0] == version
+    
+    def _compact_heap(self):
+        """Перестройка кучи, когда устаревших записей больше, чем актуальных"""
+        if len(self._heap) > 2 * len(self._habits) + 64:
+            self._heap = [(fire_at, habit_id, version)
+                          for habit_id, (version, fire_at, *_) in self._habits.items()]
+            heapq.heapify(self._heap)
+    
+    # ============ НАПОМИНАНИЯ ============
+    
+    def _fire_due(self):
+        """Напоминания, время которых наступило"""
+        now = self.clock()
+        while True:
+            with self._condition:
+                if not self._heap or self._heap[0][0] > now:
+                    return
+                fire_at, habit_id, version = heapq.heappop(self._heap)
+                if not self._is_current(habit_id, version):
+                    continue
+                _, _, name, schedule, target = self._habits[habit_id]
+            
+            if not self._is_on_track(habit_id, schedule, target, fire_at.date()):
+                try:
+                    self.on_reminder(habit_id, name, fire_at)
+                except Exception as e:
+                    print(f"✗ Ошибка обработчика напоминания: {e}")
+            
+            # Пропущенные (пока планировщик не работал) моменты не повторяются
+            with self._condition:
+                if not self._is_current(habit_id, version):
+                    continue
+                next_at = next_reminder_at(target, max(fire_at, now))
+                self._version += 1
+                self._habits[habit_id] = (self._version, next_at, name, schedule, target)
+                heapq.heappush(self._heap, (next_at, habit_id, self._version))
+    
+    def _is_on_track(self, habit_id, schedule, target, day):
+        """Выполнен ли план текущего периода к концу day"""
+        self._tracker.cursor.execute("""
+            SELECT COUNT(*) FROM habit_logs
+            WHERE habit_id = ? AND day BETWEEN ? AND ? AND completed = 1
+        """, (habit_id, period_start(day, schedule.period).toordinal(), day.toordinal()))
+        return self._tracker.cursor.fetchone()[0] >= required_by(schedule, target, day)
+    
+    @staticmethod
+    def _print_reminder(habit_id, name, fire_at):
+        """Напоминание по умолчанию - вывод в консоль"""
+        print(f"⏰ {fire_at:%Y-%m-%d %H:%M} Напоминание: '{name}' (ID: {habit_id}) ещё не выполнена")
+
+
+def main():
+    """Запуск планировщика напоминаний в консоли (Ctrl+C - выход)"""
+    scheduler = ReminderScheduler()
+    print("⏰ Планировщик напоминаний запущен (Ctrl+C - выход)")
+    try:
+        scheduler.run()
+    except KeyboardInterrupt:
+        print("\n👋 Планировщик остановлен")
+
+
+if __name__ == "__main__":
+    main()
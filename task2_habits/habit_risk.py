@@ -0,0 +1,279 @@
+
+"""
+Риск пропуска привычки сегодня: логистическая регрессия на NumPy
+Признаки строятся по календарю выполнения (годовые битмапы) за последние недели
+сразу для всех привычек; оценки кэшируются на день и пересчитываются только
+для привычек, по которым пришли отметки.
+"""
+
+import json
+from datetime import date, timedelta
+
+import numpy as np
+
+from habit_analytics import HabitAnalytics
+from habit_tracker import TRACKING_START_SQL
+
+
+# Сколько дней истории видит модель
+RISK_HISTORY_DAYS = 56
+
+# За сколько прошлых дней собираются примеры для обучения
+RISK_TRAIN_DAYS = 56
+
+# Признаки в порядке весов модели
+RISK_FEATURES = ('bias', 'recency', 'rate_7', 'rate_28', 'weekday_rate',
+                 'plan_rate', 'period_done', 'tracked')
+
+# Веса по умолчанию (обучены на синтетической истории habit_workload.py);
+# обучение на своей БД стягивается к ним с силой RISK_PRIOR_STRENGTH
+DEFAULT_RISK_WEIGHTS = (-0.66, 1.34, -0.77, -0.01, -0.95, -0.51, 0.78, 0.2)
+RISK_PRIOR_STRENGTH = 10.0
+
+# Меньше примеров - модель не обучается, используются веса по умолчанию
+RISK_MIN_SAMPLES = 200
+
+# Порог риска для напоминаний
+RISK_THRESHOLD = 0.5
+
+_NOMINAL_DAYS = {'day': 1, 'week': 7, 'month': 30}
+
+
+class HabitRiskModel:
+    """
+    Вероятность того, что активная привычка не будет выполнена сегодня:
+        model = HabitRiskModel(tracker)
+        model.at_risk()              # [(habit_id, название, риск)] по убыванию риска
+        model.risk(habit_id)         # O(1) после первого расчёта за день
+        tracker.get_reminder_habits(risk_model=model)
+    """
+    
+    def __init__(self, tracker, clock=date.today):
+        """
+        Args:
+            tracker: экземпляр HabitTracker (используется его соединение с БД)
+            clock: источник текущей даты
+        """
+        self.tracker = tracker
+        self.analytics = HabitAnalytics(tracker)
+        self.clock = clock
+        self.weights = np.array(DEFAULT_RISK_WEIGHTS, dtype=np.float64)
+        self.trained_on = None              # день последнего обучения
+        self._day = None                    # день, на который посчитаны оценки
+        self._data_version = None
+        self._total_changes = None
+        self._dirty = set()
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._names = []
+        self._row_of = {}
+        self._risk = np.zeros(0)
+        tracker.log_listeners.append(self._logs_changed)
+        tracker.habit_listeners.append(self._habits_changed)
+    
+    # ============ ОЦЕНКИ ============
+    
+    def scores(self):
+        """
+        Риск пропуска сегодня для всех активных привычек
+        Returns:
+            (ID привычек np.int64, риск np.float64) - массивы только для чтения;
+            у выполненных сегодня привычек риск 0
+        """
+        today = self.clock()
+        conn = self.tracker.conn
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if conn.total_changes != self._total_changes and today == self._day:
+            # Запись через это же соединение в обход habit_listeners: сверка состава
+            active = [row[0] for row in conn.execute(
+                "SELECT id FROM habits WHERE is_active = 1 ORDER BY id")]
+            if active != self._ids.tolist():
+                self._day = None
+        self._total_changes = conn.total_changes
+        if today != self._day or version != self._data_version:
+            if self.trained_on != today:
+                self.fit(today)
+            self._refresh(today)
+            self._data_version = version
+        elif self._dirty:
+            self._refresh(today, self._dirty)
+        return _read_only(self._ids), _read_only(self._risk)
+    
+    def risk(self, habit_id):
+        """Риск пропуска привычки сегодня; None - привычка не активна"""
+        self.scores()
+        row = self._row_of.get(habit_id)
+        return None if row is None else float(self._risk[row])
+    
+    def at_risk(self, threshold=RISK_THRESHOLD, limit=None):
+        """
+        Привычки с риском пропуска не ниже порога
+        Returns:
+            [(habit_id, название, риск)] по убыванию риска
+        """
+        ids, risk = self.scores()
+        order = np.argsort(-risk, kind="stable")
+        order = order[risk[order] >= threshold][:limit]
+        return [(int(ids[i]), self._names[i], round(float(risk[i]), 3)) for i in order]
+    
+    def _refresh(self, today, habit_ids=None):
+        """Пересчёт оценок всех привычек или только habit_ids"""
+        if habit_ids is not None:
+            # Отметки неактивных привычек оценок не меняют
+            habit_ids = [habit_id for habit_id in habit_ids if habit_id in self._row_of]
+        habits = self._habits(habit_ids)
+        if habit_ids is None:
+            self._ids = np.array([habit[0] for habit in habits], dtype=np.int64)
+            self._names = [habit[1] for habit in habits]
+            self._row_of = {habit_id: i for i, habit_id in enumerate(self._ids.tolist())}
+            self._risk = np.zeros(len(habits))
+            self._day = today
+        self._dirty = set()
+        
+        # Привычка отключена в обход habit_listeners - меняется состав, полный пересчёт
+        if habit_ids is not None and len(habits) != len(habit_ids):
+            self._refresh(today)
+            return
+        if not habits:
+            return
+        
+        features, done, _ = self._features(habits, today, days=1)
+        rows = [self._row_of[habit[0]] for habit in habits]
+        self._risk[rows] = np.where(done[:, 0], 0.0, _sigmoid(features[:, 0] @ self.weights))
+    
+    # ============ ОБУЧЕНИЕ ============
+    
+    def fit(self, today=None):
+        """
+        Обучение логистической регрессии на RISK_TRAIN_DAYS прошлых днях
+        (метка - день пропущен) методом Ньютона с L2-стягиванием к весам по умолчанию
+        Returns:
+            число примеров (0 - мало данных, оставлены веса по умолчанию)
+        """
+        today = today or self.clock()
+        self.trained_on = today
+        prior = np.array(DEFAULT_RISK_WEIGHTS, dtype=np.float64)
+        self.weights = prior.copy()
+        
+        habits = self._habits()
+        if not habits:
+            return 0
+        features, done, tracked = self._features(habits, today - timedelta(days=1), days=RISK_TRAIN_DAYS)
+        x = features[tracked]
+        y = (~done[tracked]).astype(np.float64)
+        if len(y) < RISK_MIN_SAMPLES or y.min() == y.max():
+            return 0
+        
+        weights = prior.copy()
+        penalty = RISK_PRIOR_STRENGTH * np.eye(len(weights))
+        for _ in range(25):
+            p = _sigmoid(x @ weights)
+            gradient = x.T @ (p - y) + penalty @ (weights - prior)
+            hessian = (x * (p * (1 - p))[:, None]).T @ x + penalty
+            step = np.linalg.solve(hessian, gradient)
+            weights -= step
+            if np.abs(step).max() < 1e-6:
+                break
+        self.weights = weights
+        return len(y)
+    
+    # ============ ПРИЗНАКИ ============
+    
+    def _habits(self, habit_ids=None):
+        """Активные привычки: [(id, название, расписание, начало отслеживания)]"""
+        rows = self.tracker.conn.execute(f"""
+            SELECT id, name, frequency, {TRACKING_START_SQL.format(habit="habits")}
+            FROM habits
+            WHERE is_active = 1 AND (? IS NULL OR id IN (SELECT value FROM json_each(?)))
+            ORDER BY id
+        """, (None if habit_ids is None else 1,
+              None if habit_ids is None else json.dumps(sorted(habit_ids)))).fetchall()
+        return [(habit_id, name, self.tracker._schedule_of(frequency), date.fromisoformat(start))
+                for habit_id, name, frequency, start in rows]
+    
+    def _features(self, habits, last_day, days):
+        """
+        Признаки для дней (last_day - days, last_day] сразу для всех привычек:
+        каждый день видит только историю до себя (RISK_HISTORY_DAYS дней)
+        Returns:
+            (признаки формы (привычек, days, len(RISK_FEATURES)),
+             выполнена ли привычка в этот день, отслеживалась ли в этот день -
+             bool формы (привычек, days))
+        """
+        history = RISK_HISTORY_DAYS
+        first = last_day - timedelta(days=history + days - 1)
+        calendar = self.analytics.completion_matrix([habit[0] for habit in habits], first, last_day)
+        dates = np.arange(first, last_day + timedelta(days=1), dtype="datetime64[D]")
+        starts = np.array([habit[3] for habit in habits], dtype="datetime64[D]")
+        tracked_days = dates[None, :] >= starts[:, None]
+        calendar &= tracked_days
+        
+        # Суммы по префиксам: за окно перед днём j - разность C[j] - C[j - окно]
+        done_sums = np.concatenate((np.zeros((len(habits), 1)), calendar.cumsum(axis=1)), axis=1)
+        tracked_sums = np.concatenate((np.zeros((len(habits), 1)), tracked_days.cumsum(axis=1)), axis=1)
+        targets = np.arange(history, history + days)
+        
+        def window_rate(window):
+            done = done_sums[:, targets] - done_sums[:, targets - window]
+            tracked = tracked_sums[:, targets] - tracked_sums[:, targets - window]
+            return np.divide(done, tracked, out=np.zeros_like(done), where=tracked > 0)
+        
+        # Дней с последнего выполнения (или с начала отслеживания), не больше окна истории
+        columns = np.arange(calendar.shape[1])
+        start_columns = ((starts - dates[0]).astype(np.int64) - 1)[:, None]
+        last_done = np.maximum.accumulate(
+            np.maximum(np.where(calendar, columns, -1), start_columns), axis=1)
+        recency = np.clip(targets - last_done[:, targets - 1], 0, history + 1)
+        
+        weekday_done = sum(calendar[:, targets - 7 * week] for week in range(1, history // 7 + 1))
+        weekday_tracked = sum(tracked_days[:, targets - 7 * week] for week in range(1, history // 7 + 1))
+        
+        # Выполнено в текущем периоде расписания до дня j (доля плана периода)
+        target_dates = dates[targets]
+        day_numbers = target_dates.astype(np.int64)
+        week_offset = (day_numbers + 3) % 7                             # 1970-01-01 - четверг
+        month_offset = (target_dates - target_dates.astype("datetime64[M]")).astype(np.int64)
+        periods = [habit[2].period for habit in habits]
+        offsets = np.array([week_offset if period == 'week' else month_offset if period == 'month'
+                            else np.zeros(days, dtype=np.int64) for period in periods])
+        rows = np.arange(len(habits))[:, None]
+        period_done = done_sums[rows, targets] - done_sums[rows, targets - offsets]
+        times = np.array([habit[2].times for habit in habits], dtype=np.float64)
+        plan_rate = np.minimum(1.0, times / np.array([_NOMINAL_DAYS[period] for period in periods]))
+        
+        features = np.stack([
+            np.ones((len(habits), days)),
+            np.log1p(recency),
+            window_rate(7),
+            window_rate(28),
+            np.divide(weekday_done, weekday_tracked, out=np.zeros((len(habits), days)),
+                      where=weekday_tracked > 0),
+            np.broadcast_to(plan_rate[:, None], (len(habits), days)),
+            np.minimum(1.0, period_done / times[:, None]),
+            (tracked_sums[:, targets] - tracked_sums[:, targets - history]) / history,
+        ], axis=2)
+        return features, calendar[:, targets], tracked_days[:, targets]
+    
+    # ============ ИНКРЕМЕНТАЛЬНОЕ ОБНОВЛЕНИЕ ============
+    
+    def _logs_changed(self, habit_id, log_date):
+        """Отметка за день: пересчёт оценки одной привычки (None - всех)"""
+        if habit_id is None:
+            self._day = None
+        else:
+            self._dirty.add(habit_id)
+    
+    def _habits_changed(self, habit_id):
+        """Создание, изменение или удаление привычки меняет состав оценок"""
+        self._day = None
+
+
+def _sigmoid(values):
+    """Логистическая функция"""
+    return 1.0 / (1.0 + np.exp(-values))
+
+
+def _read_only(array):
+    """Представление массива только для чтения"""
+    view = array.view()
+    view.setflags(write=False)
+    return view
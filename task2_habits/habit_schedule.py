@@ -0,0 +1,216 @@
+
+"""
+Расписание привычек: разбор частоты и ожидаемое число выполнений
+Поддерживаемые значения habits.frequency: 'daily', 'weekly', 'monthly',
+'Nx/day', 'Nx/week', 'Nx/month' (а также 'N/week', 'N раза в неделю' и т.п.)
+Время напоминания habits.target_time: 'HH:MM' или 'День HH:MM' ('Sunday 19:00')
+"""
+
+import math
+import re
+from collections import namedtuple
+from datetime import datetime, time, timedelta
+
+
+# Сколько раз (times) за период (period: 'day', 'week' или 'month')
+Schedule = namedtuple('Schedule', ['times', 'period'])
+
+DAILY = Schedule(1, 'day')
+
+_ALIASES = {
+    'daily': DAILY,
+    'ежедневно': DAILY,
+    'weekly': Schedule(1, 'week'),
+    'еженедельно': Schedule(1, 'week'),
+    'monthly': Schedule(1, 'month'),
+    'ежемесячно': Schedule(1, 'month'),
+}
+
+_PERIOD_NAMES = {
+    'd': 'day', 'day': 'day', 'день': 'day', 'сутки': 'day',
+    'w': 'week', 'week': 'week', 'неделю': 'week', 'неделя': 'week',
+    'm': 'month', 'month': 'month', 'месяц': 'month',
+}
+
+_FREQUENCY_RE = re.compile(
+    r'^(\d+)\s*(?:x|х|times|раза?)?\s*(?:/|per|в)\s*([a-zа-я]+)$'
+)
+
+# День недели напоминания (0 - понедельник, None - каждый день) и время
+TargetTime = namedtuple('TargetTime', ['weekday', 'time'])
+
+_WEEKDAYS = {}
+for _index, _names in enumerate((
+    ('monday', 'mon', 'понедельник', 'пн'),
+    ('tuesday', 'tue', 'вторник', 'вт'),
+    ('wednesday', 'wed', 'среда', 'ср'),
+    ('thursday', 'thu', 'четверг', 'чт'),
+    ('friday', 'fri', 'пятница', 'пт'),
+    ('saturday', 'sat', 'суббота', 'сб'),
+    ('sunday', 'sun', 'воскресенье', 'вс'),
+)):
+    _WEEKDAYS.update(dict.fromkeys(_names, _index))
+
+_TARGET_TIME_RE = re.compile(r'^(?:([a-zа-я]+),?\s+)?(\d{1,2})[:.](\d{2})$')
+
+# Номинальная длина периода в днях - для допустимого перерыва в напоминаниях
+_NOMINAL_DAYS = {'day': 1, 'week': 7, 'month': 30}
+
+
+def parse_frequency(text):
+    """
+    Разбор частоты привычки
+    Returns:
+        Schedule(times, period)
+    Raises:
+        ValueError: если частота не распознана
+    """
+    value = (text or 'daily').strip().lower()
+    if value in _ALIASES:
+        return _ALIASES[value]
+    
+    match = _FREQUENCY_RE.match(value)
+    if match and match.group(2) in _PERIOD_NAMES and int(match.group(1)) > 0:
+        return Schedule(int(match.group(1)), _PERIOD_NAMES[match.group(2)])
+    
+    raise ValueError(f"Неизвестная частота '{text}'")
+
+
+def period_start(day, period):
+    """Первый день периода, содержащего day (неделя - с понедельника)"""
+    if period == 'day':
+        return day
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def next_period_start(day, period):
+    """Первый день следующего периода"""
+    start = period_start(day, period)
+    if period == 'day':
+        return start + timedelta(days=1)
+    if period == 'week':
+        return start + timedelta(days=7)
+    return (start + timedelta(days=31)).replace(day=1)
+
+
+def iter_periods(start, end, period):
+    """
+    Периоды, пересекающиеся с [start, end]
+    Yields:
+        (начало периода, дней пересечения, дней в периоде)
+    """
+    current = period_start(start, period)
+    while current <= end:
+        following = next_period_start(current, period)
+        overlap = (min(following - timedelta(days=1), end) - max(current, start)).days + 1
+        yield current, overlap, (following - current).days
+        current = following
+
+
+def expected_occurrences(schedule, start, end):
+    """
+    Ожидаемое число выполнений в [start, end]; неполные периоды
+    учитываются пропорционально доле дней периода, попавших в диапазон
+    """
+    if start > end:
+        return 0.0
+    days = (end - start).days + 1
+    if schedule.period == 'day':
+        return float(schedule.times * days)
+    if schedule.period == 'week':
+        return schedule.times * days / 7
+    return sum(schedule.times * overlap / length
+               for _, overlap, length in iter_periods(start, end, 'month'))
+
+
+def parse_target_time(text):
+    """
+    Разбор времени напоминания
+    Returns:
+        TargetTime(weekday, time) или None, если время не задано
+    Raises:
+        ValueError: если время не распознано
+    """
+    value = (text or '').strip().lower()
+    if not value:
+        return None
+    
+    match = _TARGET_TIME_RE.match(value)
+    if match and (match.group(1) is None or match.group(1) in _WEEKDAYS):
+        hour, minute = int(match.group(2)), int(match.group(3))
+        if hour < 24 and minute < 60:
+            weekday = _WEEKDAYS[match.group(1)] if match.group(1) else None
+            return TargetTime(weekday, time(hour, minute))
+    
+    raise ValueError(f"Неизвестное время напоминания '{text}'")
+
+
+def next_reminder_at(target, after):
+    """Ближайший момент напоминания строго после after (datetime)"""
+    day = after.date()
+    if target.weekday is not None:
+        day += timedelta(days=(target.weekday - day.weekday()) % 7)
+    moment = datetime.combine(day, target.time)
+    if moment <= after:
+        moment += timedelta(days=1 if target.weekday is None else 7)
+    return moment
+
+
+def required_by(schedule, target, day):
+    """
+    Сколько выполнений должно быть в текущем периоде к концу day:
+    с днём недели в target_time - весь план периода, иначе - доля плана
+    по прошедшим дням периода (не больше одного выполнения в день)
+    """
+    start = period_start(day, schedule.period)
+    elapsed = (day - start).days + 1
+    if target.weekday is not None:
+        return min(schedule.times, elapsed)
+    length = (next_period_start(day, schedule.period) - start).days
+    return min(math.ceil(schedule.times * elapsed / length), elapsed)
+
+
+def reminder_gap_days(schedule):
+    """Сколько дней без выполнения допустимо до напоминания (не меньше 2)"""
+    return max(2, math.ceil(_NOMINAL_DAYS[schedule.period] / schedule.times))
+
+
+class ScheduleCache:
+    """Кэш числа выполнений по (привычка, период); сбрасывается при отметках"""
+    
+    def __init__(self, max_entries=100000):
+        self.max_entries = max_entries
+        self._counts = {}
+        self._size = 0
+    
+    def get(self, habit_id, period, start):
+        """Число выполнений за период или None, если его нет в кэше"""
+        return self._counts.get(habit_id, {}).get((period, start))
+    
+    def put(self, habit_id, period, start, count):
+        """Сохранение числа выполнений за период"""
+        if self._size >= self.max_entries:
+            self.clear()
+        habit_counts = self._counts.setdefault(habit_id, {})
+        if (period, start) not in habit_counts:
+            self._size += 1
+        habit_counts[(period, start)] = count
+    
+    def invalidate(self, habit_id, day=None):
+        """Сброс периодов, содержащих day (или всех периодов привычки)"""
+        habit_counts = self._counts.get(habit_id)
+        if not habit_counts:
+            return
+        if day is None:
+            self._size -= len(self._counts.pop(habit_id))
+            return
+        for period in _NOMINAL_DAYS:
+            if habit_counts.pop((period, period_start(day, period)), None) is not None:
+                self._size -= 1
+    
+    def clear(self):
+        """Полная очистка кэша"""
+        self._counts.clear()
+        self._size = 0
@@ -0,0 +1,247 @@
+
+"""
+Шардирование трекера привычек: отдельный файл SQLite на пользователя
+Запись одного пользователя не блокирует остальных, открытые соединения
+хранятся в LRU-кэше ограниченного размера с вытеснением по простою.
+"""
+
+import os
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+from habit_tracker import HabitTracker
+
+
+class _Shard:
+    """Открытый трекер пользователя, его блокировка и время последнего обращения"""
+    
+    def __init__(self, tracker):
+        self.tracker = tracker
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+        self.users = 0
+
+
+class ShardedHabitService:
+    """Трекеры привычек по пользователям с ограниченным кэшем соединений"""
+    
+    def __init__(self, base_dir="habit_shards", buckets=None, max_open=32,
+                 idle_timeout=300, max_workers=4):
+        """
+        Args:
+            base_dir: каталог с файлами пользователей
+            buckets: число подкаталогов-корзин (по хешу ID пользователя), чтобы
+                не держать все файлы в одном каталоге; None - без корзин
+            max_open: максимум одновременно открытых соединений
+            idle_timeout: через сколько секунд простоя соединение закрывается
+            max_workers: потоки для запросов сразу по нескольким пользователям
+        """
+        self.base_dir = base_dir
+        self.buckets = buckets
+        self.max_open = max_open
+        self.idle_timeout = idle_timeout
+        self.max_workers = max_workers
+        self._shards = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool = None
+        os.makedirs(base_dir, exist_ok=True)
+    
+    # ============ ФАЙЛЫ ПОЛЬЗОВАТЕЛЕЙ ============
+    
+    def shard_path(self, user_id):
+        """Путь к файлу БД пользователя"""
+        user_id = str(user_id)
+        if not re.fullmatch(r"[\w-]+", user_id):
+            raise ValueError(f"Некорректный ID пользователя '{user_id}'")
+        
+        directory = self.base_dir
+        if self.buckets:
+            bucket = zlib.crc32(user_id.encode("utf-8")) % self.buckets
+            directory = os.path.join(directory, f"{bucket:04d}")
+        return os.path.join(directory, f"user_{user_id}.db")
+    
+    def list_users(self):
+        """ID всех пользователей, у которых уже есть файл БД"""
+        users = []
+        for root, _, files in os.walk(self.base_dir):
+            for name in files:
+                match = re.fullmatch(r"user_([\w-]+)\.db", name)
+                if match:
+                    users.append(match.group(1))
+        return sorted(users)
+    
+    # ============ КЭШ СОЕДИНЕНИЙ ============
+    
+    @contextmanager
+    def tracker(self, user_id):
+        """
+        Трекер пользователя для последовательности вызовов:
+            with service.tracker(42) as tracker:
+                tracker.log_habit_completion(1)
+        Вызовы одного пользователя сериализуются, разных - идут параллельно.
+        """
+        shard = self._acquire(str(user_id))
+        try:
+            with shard.lock:
+                yield shard.tracker
+        finally:
+            with self._lock:
+                shard.users -= 1
+                shard.last_used = time.monotonic()
+                self._evict_locked()
+    
+    def call(self, user_id, method, *args, **kwargs):
+        """Вызов метода HabitTracker для пользователя: call(42, 'get_weekly_stats', 1)"""
+        with self.tracker(user_id) as tracker:
+            return getattr(tracker, method)(*args, **kwargs)
+    
+    def _acquire(self, user_id):
+        """Открытый трекер пользователя (открывается при первом обращении)"""
+        with self._lock:
+            shard = self._shards.get(user_id)
+            if shard is not None:
+                self._shards.move_to_end(user_id)
+                shard.users += 1
+                return shard
+        
+        # Открытие файла и создание схемы - вне общей блокировки
+        path = self.shard_path(user_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tracker = HabitTracker(path, check_same_thread=False)
+        
+        with self._lock:
+            shard = self._shards.get(user_id)
+            if shard is None:
+                shard = self._shards[user_id] = _Shard(tracker)
+            else:
+                tracker.close()
+            self._shards.move_to_end(user_id)
+            shard.users += 1
+            self._evict_locked()
+            return shard
+    
+    def evict_idle(self):
+        """Закрытие соединений, простаивающих дольше idle_timeout; возвращает их число"""
+        with self._lock:
+            return self._evict_locked()
+    
+    def _evict_locked(self):
+        """Вытеснение простаивающих и самых давних соединений сверх max_open"""
+        now = time.monotonic()
+        evicted = 0
+        for user_id, shard in list(self._shards.items()):
+            if shard.users:
+                continue
+            if len(self._shards) > self.max_open or now - shard.last_used > self.idle_timeout:
+                del self._shards[user_id]
+                shard.tracker.close()
+                evicted += 1
+        return evicted
+    
+    def open_count(self):
+        """Число открытых соединений"""
+        with self._lock:
+            return len(self._shards)
+    
+    # ============ ЗАПРОСЫ ПО НЕСКОЛЬКИМ ПОЛЬЗОВАТЕЛЯМ ============
+    
+    def map_users(self, func, user_ids=None):
+        """
+        Параллельный вызов func(tracker) для пользователей через пул потоков
+        Returns:
+            {user_id: результат}; ошибки пользователя возвращаются как исключения
+        """
+        user_ids = self.list_users() if user_ids is None else [str(user_id) for user_id in user_ids]
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers,
+                                            thread_name_prefix="habit-shard")
+        
+        def run(user_id):
+            with self.tracker(user_id) as tracker:
+                return func(tracker)
+        
+        futures = {user_id: self._pool.submit(run, user_id) for user_id in user_ids}
+        results = {}
+        for user_id, future in futures.items():
+            try:
+                results[user_id] = future.result()
+            except Exception as e:
+                results[user_id] = e
+        return results
+    
+    def aggregate_window_stats(self, start=None, end=None, user_ids=None):
+        """
+        Сводная статистика по расписанию за окно по всем (или выбранным) пользователям
+        (без вывода в консоль - печатает вызывающий)
+        Args:
+            start, end: границы окна (YYYY-MM-DD), по умолчанию - последние 7 дней
+        Returns:
+            {'start': ..., 'end': ..., 'users': ..., 'habits': ..., 'expected': ...,
+             'completed': ..., 'success_rate': ...}
+        Raises:
+            ValueError: некорректная дата
+        """
+        try:
+            end = datetime.now().date() if end is None else date.fromisoformat(str(end))
+            start = end - timedelta(days=6) if start is None else date.fromisoformat(str(start))
+        except ValueError:
+            raise ValueError("Некорректная дата окна, ожидается YYYY-MM-DD") from None
+        per_user = self.map_users(
+            lambda tracker: tracker._window_stats_rows(None, start.isoformat(), end.isoformat()),
+            user_ids)
+        
+        total = {'start': start.isoformat(), 'end': end.isoformat(),
+                 'users': 0, 'habits': 0, 'expected': 0.0, 'completed': 0}
+        credited = 0.0
+        for rows in per_user.values():
+            if isinstance(rows, Exception):
+                continue
+            total['users'] += 1
+            for _, _, expected, completed, rate in rows:
+                total['habits'] += 1
+                total['expected'] += expected
+                total['completed'] += completed
+                credited += expected * (rate or 0) / 100
+        
+        total['expected'] = round(total['expected'], 1)
+        total['success_rate'] = (round(credited * 100.0 / total['expected'], 1)
+                                 if total['expected'] else None)
+        return total
+    
+    def add_achievement_rule(self, badge_name, description, metric, threshold, window_days=None,
+                             user_ids=None):
+        """
+        Добавление правила достижения всем (или выбранным) пользователям с выдачей
+        бейджей по всей истории
+        Returns:
+            {user_id: True/False или исключение}
+        """
+        return self.map_users(
+            lambda tracker: tracker.add_achievement_rule(badge_name, description, metric,
+                                                         threshold, window_days),
+            user_ids)
+    
+    def backfill_achievements(self, user_ids=None):
+        """
+        Выдача заслуженных по текущим правилам бейджей всем (или выбранным) пользователям
+        Returns:
+            число выданных бейджей
+        """
+        per_user = self.map_users(lambda tracker: tracker.backfill_achievements(), user_ids)
+        return sum(count for count in per_user.values() if not isinstance(count, Exception))
+    
+    def close(self):
+        """Закрытие всех соединений и пула потоков"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+        with self._lock:
+            for shard in self._shards.values():
+                shard.tracker.close()
+            self._shards.clear()
@@ -4,24 +4,175 @@
 Средний уровень - работа с датами, JOIN и агрегирующими функциями
 """
 
+import csv
+import gzip
+import json
+import random
 import sqlite3
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+
+from habit_schedule import (
+    DAILY, ScheduleCache, expected_occurrences, iter_periods, parse_frequency,
+    parse_target_time, period_start, reminder_gap_days,
+)
+
+
+# Версия схемы БД (PRAGMA user_version): таблицы, представление habit_days, триггеры
+# и индексы создаются и мигрируют только при открытии БД с меньшей версией, поэтому
+# увеличивается при любом изменении их определений
+SCHEMA_VERSION = 1
+
+# Публичные поля привычки в порядке, который ожидают _print_habit и GUI
+HABIT_COLUMNS = ("id, name, description, category, frequency, target_time, created_at, is_active, "
+                 "target_value, unit")
+
+# Метрики правил достижений (таблица achievement_rules): бейдж выдаётся, когда метрика >= порога
+ACHIEVEMENT_METRICS = {
+    'count': "выполненных дней всего (habits.completed_count)",
+    'streak': "самая длинная серия, дней",
+    'window': "выполненных дней в каком-либо окне из window_days дней подряд",
+    'rate': "процент выполненных дней за последние window_days дней (окно, заканчивающееся сегодня)",
+}
+
+# Правила, которые добавляются в новую БД: (название, описание, метрика, порог, окно в днях)
+DEFAULT_ACHIEVEMENT_RULES = [
+    ("🎯 Неделяч", "Выполнил привычку 7 дней подряд!", 'streak', 7, None),
+    ("🏆 Месячник", "Выполнил привычку 30 дней!", 'count', 30, None),
+    ("💯 Столетие", "Выполнил привычку 100 раз!", 'count', 100, None),
+]
+
+# Даты логов хранятся номером дня habit_logs.day = date.toordinal() (0001-01-01 - день 1):
+# в SQL это julianday(дата) - DAY_OFFSET, обратно - date(day + DAY_OFFSET)
+DAY_OFFSET = 1721424.5
+
+# Число привычек, запланированных на день {day} (номер дня {day_number}): отслеживаемых
+# в этот день (созданных к нему или уже имеющих записи - логи могут быть внесены задним
+# числом) и не отключённых к нему (активных или отключённых позже, см. deactivated_at).
+# Этому же правилу следуют триггеры daily_summary и HabitAnalytics.daily_summary
+SCHEDULED_ON_DAY_SQL = """
+    (SELECT COUNT(*) FROM habits
+     WHERE (is_active = 1 OR deactivated_at > {day}) AND (
+         date(created_at) <= {day}
+         OR (SELECT MIN(first_log.day) FROM habit_logs AS first_log
+             WHERE first_log.habit_id = habits.id) <= {day_number}
+         OR EXISTS (SELECT 1 FROM habit_log_rollups AS first_rollup
+                    WHERE first_rollup.habit_id = habits.id AND first_rollup.first_day <= {day})
+     ))
+"""
+
+# Начало отслеживания привычки {habit}: создание или первая запись в логе,
+# если она раньше (с учётом месячных свёрток старых логов)
+TRACKING_START_SQL = f"""
+    MIN(
+        date({{habit}}.created_at),
+        COALESCE((SELECT date(MIN(day) + {DAY_OFFSET}) FROM habit_logs
+                  WHERE habit_id = {{habit}}.id), '9999-12-31'),
+        COALESCE((SELECT MIN(first_day) FROM habit_log_rollups WHERE habit_id = {{habit}}.id),
+                 '9999-12-31')
+    )
+"""
+
+# Условие для триггеров habit_logs: месяц записи {row} не свёрнут в habit_log_rollups.
+# Перенос строк между логами и свёртками не меняет производные данные
+ROW_NOT_ROLLED_UP_SQL = """
+    NOT EXISTS (SELECT 1 FROM habit_log_rollups
+                WHERE habit_id = {row}.habit_id AND month = substr({row}.log_date, 1, 7))
+"""
+
+# Дни месячной свёртки в виде строк habit_logs (ключи days - номера дней 'DD')
+ROLLUP_DAYS_SQL = f"""
+    SELECT 
+        rollups.habit_id,
+        CAST(julianday(rollups.month || '-' || entry.key) - {DAY_OFFSET} AS INTEGER) as day,
+        rollups.month || '-' || entry.key as log_date,
+        (rollups.completed_bits >> (CAST(entry.key AS INTEGER) - 1)) & 1 as completed,
+        json_extract(entry.value, '$[0]') as note,
+        json_extract(entry.value, '$[1]') as created_at,
+        json_extract(entry.value, '$[2]') as amount
+    FROM habit_log_rollups AS rollups, json_each(rollups.days) AS entry
+"""
+
+# Схема habit_logs ({table} - другое имя для пересоздания при миграции)
+HABIT_LOGS_TABLE_SQL = f"""
+    CREATE TABLE IF NOT EXISTS {{table}} (
+        habit_id INTEGER NOT NULL,
+        day INTEGER NOT NULL,
+        completed INTEGER DEFAULT 0,
+        note TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        log_date TEXT GENERATED ALWAYS AS (date(day + {DAY_OFFSET})) VIRTUAL,
+        amount REAL,
+        PRIMARY KEY (habit_id, day),
+        FOREIGN KEY (habit_id) REFERENCES habits(id) ON DELETE CASCADE
+    ) WITHOUT ROWID
+"""
+
+# Таблицы со ссылкой на habits и их первичные ключи - для удаления
+# осиротевших строк (collect_orphans), оставшихся от удалений без внешних ключей
+ORPHAN_TABLES = (
+    ("habit_logs", "habit_id, day"),
+    ("habit_log_rollups", "habit_id, month"),
+    ("habit_streaks", "habit_id"),
+    ("habit_bitmaps", "habit_id, year"),
+    ("achievements", "id"),
+    ("habit_events", "id"),
+)
+
+# Логи старше этого числа дней сворачиваются compact_logs() в месячные свёртки
+LOG_RETENTION_DAYS = 365
+
+# Поля, переносимые export_data/import_data; производные колонки
+# (счётчики, серии, битмапы, сводка) пересчитываются после импорта
+EXPORT_FIELDS = {
+    'habits': ['id', 'name', 'description', 'category', 'frequency', 'target_time',
+               'created_at', 'is_active', 'target_value', 'unit', 'deactivated_at'],
+    'habit_logs': ['habit_id', 'log_date', 'completed', 'note', 'created_at', 'amount'],
+    'achievements': ['habit_id', 'badge_name', 'description', 'achieved_at'],
+}
+
+# Общий заголовок CSV: колонка table и объединение полей всех таблиц
+EXPORT_CSV_COLUMNS = ['table'] + list(dict.fromkeys(
+    field for fields in EXPORT_FIELDS.values() for field in fields
+))
+EXPORT_INT_FIELDS = {'id', 'habit_id', 'is_active', 'completed'}
+# Числа и даты: пустая ячейка CSV - NULL; текстовые поля переносятся как выгружены
+EXPORT_NULLABLE_FIELDS = EXPORT_INT_FIELDS | {
+    'target_value', 'amount', 'created_at', 'log_date', 'achieved_at', 'deactivated_at',
+}
+
+# Размер годового битмапа выполнения: бит на день года (366 бит), старший бит - 1 января
+BITMAP_BYTES = 46
 
 
 class HabitTracker:
     """Приложение для отслеживания привычек"""
     
-    def __init__(self, db_path="habits.db"):
-        """Инициализация базы данных"""
+    def __init__(self, db_path="habits.db", check_same_thread=True):
+        """
+        Инициализация базы данных
+        Args:
+            check_same_thread: False - соединение можно использовать из других
+                потоков (вызовы должен сериализовать владелец, см. habit_sharding.py)
+        """
         self.db_path = db_path
+        self.check_same_thread = check_same_thread
         self.conn = None
         self.cursor = None
+        # Кэш числа выполнений по (привычка, период) для оценки по расписанию
+        self.schedule_cache = ScheduleCache()
+        # Вызываются с ID привычки после её создания, изменения или удаления
+        # (None - изменились все привычки, например после импорта)
+        self.habit_listeners = []
+        # Вызываются с (ID привычки, дата) после записи или снятия отметки
+        # ((None, None) - логи изменились целиком, например после импорта)
+        self.log_listeners = []
         self.connect()
-        self.create_tables()
+        self.migrate_schema()
     
     def connect(self):
-        """Подключение к БД"""
-        self.conn = sqlite3.connect(self.db_path)
+        """Подключение к БД с включением внешних ключей (ON DELETE CASCADE)"""
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=self.check_same_thread)
+        self.conn.execute("PRAGMA foreign_keys = ON")
         self.cursor = self.conn.cursor()
     
     def close(self):
@@ -29,8 +180,31 @@ class HabitTracker:
         if self.conn:
             self.conn.close()
     
+    def migrate_schema(self):
+        """
+        Создание и миграция схемы, если версия БД меньше SCHEMA_VERSION.
+        Открытие актуальной БД схему не меняет и блокировку записи не берёт -
+        параллельные соединения (GUI, очередь записи, планировщик, шарды)
+        не получают "database is locked" при старте
+        Returns:
+            True, если схема обновлялась
+        """
+        self.cursor.execute("PRAGMA user_version")
+        if self.cursor.fetchone()[0] >= SCHEMA_VERSION:
+            return False
+        # Действует для новой БД; существующую переводит compact_logs()
+        self.cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        self.create_tables()
+        self.create_indexes()
+        self.cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.conn.commit()
+        return True
+    
     def create_tables(self):
         """Создание таблиц"""
+        self.cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+        existing_tables = {row[0] for row in self.cursor.fetchall()}
+        
         # Таблица привычек
         self.cursor.execute("""
             CREATE TABLE IF NOT EXISTS habits (
@@ -41,23 +215,114 @@ class HabitTracker:
                 frequency TEXT DEFAULT 'daily',
                 target_time TEXT,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                is_active INTEGER DEFAULT 1
+                is_active INTEGER DEFAULT 1,
+                completed_count INTEGER DEFAULT 0,
+                last_completed_date TEXT,
+                reminder_gap_days INTEGER DEFAULT 2,
+                reminder_due TEXT GENERATED ALWAYS AS (
+                    date(last_completed_date, '+' || reminder_gap_days || ' days')
+                ) VIRTUAL,
+                target_value REAL,
+                unit TEXT,
+                deactivated_at TEXT
             )
         """)
         
-        # Таблица логов выполнения привычек
+        # Таблица логов выполнения привычек: день - целый номер (см. DAY_OFFSET),
+        # строки хранятся в порядке первичного ключа (habit_id, day);
+        # log_date - вычисляемая ISO-дата для чтения
+        if 'habit_logs' in existing_tables:
+            self.cursor.execute("PRAGMA table_xinfo(habit_logs)")
+            if not any(row[1] == 'day' for row in self.cursor.fetchall()):
+                self._migrate_log_days()
+        self.cursor.execute(HABIT_LOGS_TABLE_SQL.format(table="habit_logs"))
+        # Миграция БД, созданных до появления привычек с количеством
+        self._add_column_if_missing('habit_logs', 'amount', 'REAL')
+        self._add_column_if_missing('habits', 'target_value', 'REAL')
+        self._add_column_if_missing('habits', 'unit', 'TEXT')
+        # Миграция БД, созданных до учёта даты отключения: сводка по дням пересчитывается
+        # по новому правилу (отключённые раньше привычки не запланированы ни на один день)
+        added_deactivated = self._add_column_if_missing('habits', 'deactivated_at', 'TEXT')
+        
+        # Отметки количества (стаканы воды, шаги) - только дописываются;
+        # дневной итог habit_logs.amount поддерживает триггер trg_habit_events_insert
         self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS habit_logs (
+            CREATE TABLE IF NOT EXISTS habit_events (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 habit_id INTEGER NOT NULL,
-                log_date TEXT NOT NULL,
-                completed INTEGER DEFAULT 0,
+                day INTEGER NOT NULL,
+                amount REAL NOT NULL,
                 note TEXT,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (habit_id) REFERENCES habits(id) ON DELETE CASCADE,
-                UNIQUE(habit_id, log_date)
+                FOREIGN KEY (habit_id) REFERENCES habits(id) ON DELETE CASCADE
             )
         """)
+        self.cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_habit_events_habit_day ON habit_events(habit_id, day)
+        """)
+        
+        # Месячные свёртки старых логов (compact_logs): битмап выполненных дней
+        # (бит d-1 - день d), счётчики и заметка/время создания/количество каждой записи
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS habit_log_rollups (
+                habit_id INTEGER NOT NULL,
+                month TEXT NOT NULL,
+                completed_bits INTEGER NOT NULL DEFAULT 0,
+                completed_count INTEGER NOT NULL DEFAULT 0,
+                first_day TEXT NOT NULL,
+                last_completed TEXT,
+                days TEXT NOT NULL,
+                PRIMARY KEY (habit_id, month),
+                FOREIGN KEY (habit_id) REFERENCES habits(id) ON DELETE CASCADE
+            ) WITHOUT ROWID
+        """)
+        
+        # Все записи лога: свежие строки habit_logs и развёрнутые свёртки.
+        # Подходит для запросов с постоянными границами (условия проталкиваются
+        # в обе части UNION ALL); в коррелированных подзапросах - таблицы напрямую
+        self.cursor.execute("DROP VIEW IF EXISTS habit_days")
+        self.cursor.execute(f"""
+            CREATE VIEW habit_days AS
+            SELECT habit_id, day, log_date, completed, note, created_at, amount FROM habit_logs
+            UNION ALL
+            {ROLLUP_DAYS_SQL}
+        """)
+        
+        # Состояние серий (streak) по привычке - поддерживается инкрементально
+        # при логировании, чтобы не пересчитывать всю историю на каждый запрос
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS habit_streaks (
+                habit_id INTEGER PRIMARY KEY,
+                current_streak INTEGER DEFAULT 0,
+                current_start TEXT,
+                current_end TEXT,
+                longest_streak INTEGER DEFAULT 0,
+                longest_start TEXT,
+                longest_end TEXT,
+                FOREIGN KEY (habit_id) REFERENCES habits(id) ON DELETE CASCADE
+            )
+        """)
+        
+        # Компактный календарь выполнения: один битмап на привычку и год,
+        # зеркалирует выполненные дни из habit_logs (см. habit_analytics.py)
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS habit_bitmaps (
+                habit_id INTEGER NOT NULL,
+                year INTEGER NOT NULL,
+                bits BLOB NOT NULL,
+                PRIMARY KEY (habit_id, year),
+                FOREIGN KEY (habit_id) REFERENCES habits(id) ON DELETE CASCADE
+            ) WITHOUT ROWID
+        """)
+        
+        # Сводка по дням для тепловой карты: выполнено и запланировано привычек
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS daily_summary (
+                log_date TEXT PRIMARY KEY,
+                completed INTEGER NOT NULL DEFAULT 0,
+                scheduled INTEGER NOT NULL DEFAULT 0
+            ) WITHOUT ROWID
+        """)
         
         # Таблица достижений (бейджи)
         self.cursor.execute("""
@@ -70,22 +335,316 @@ class HabitTracker:
                 FOREIGN KEY (habit_id) REFERENCES habits(id) ON DELETE CASCADE
             )
         """)
+        self.cursor.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_achievements_habit_badge
+            ON achievements(habit_id, badge_name)
+        """)
+        
+        # Правила достижений - данные, а не код: новое правило сразу применяется
+        # ко всей истории (backfill_achievements), отключённое - is_active = 0
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS achievement_rules (
+                badge_name TEXT PRIMARY KEY,
+                description TEXT NOT NULL,
+                metric TEXT NOT NULL CHECK (metric IN ('count', 'streak', 'window', 'rate')),
+                threshold REAL NOT NULL CHECK (threshold > 0),
+                window_days INTEGER CHECK (window_days IS NULL OR window_days > 0),
+                is_active INTEGER DEFAULT 1
+            ) WITHOUT ROWID
+        """)
+        self.cursor.executemany("""
+            INSERT OR IGNORE INTO achievement_rules (badge_name, description, metric, threshold, window_days)
+            VALUES (?, ?, ?, ?, ?)
+        """, DEFAULT_ACHIEVEMENT_RULES)
+        
+        # Миграция БД, созданных до появления денормализованных счётчиков
+        added_count = self._add_column_if_missing('habits', 'completed_count', 'INTEGER DEFAULT 0')
+        added_last = self._add_column_if_missing('habits', 'last_completed_date', 'TEXT')
+        if added_count or added_last:
+            self._recount_habit_counters()
+        
+        # Миграция БД, созданных до появления расписаний: допустимый перерыв
+        # считается из частоты, срок напоминания - генерируемая колонка
+        if self._add_column_if_missing('habits', 'reminder_gap_days', 'INTEGER DEFAULT 2'):
+            self._update_reminder_gaps()
+        self._add_column_if_missing(
+            'habits', 'reminder_due',
+            "TEXT GENERATED ALWAYS AS "
+            "(date(last_completed_date, '+' || reminder_gap_days || ' days')) VIRTUAL"
+        )
+        
+        self.create_triggers()
+        
+        # Миграция БД, созданных до появления битмапов
+        if 'habit_bitmaps' not in existing_tables:
+            self._rebuild_bitmaps()
+        if 'daily_summary' not in existing_tables or added_deactivated:
+            self._rebuild_daily_summary()
+        
+        self.conn.commit()
+    
+    def create_triggers(self):
+        """
+        Триггеры, поддерживающие habits.completed_count и habits.last_completed_date
+        при любых изменениях habit_logs (в т.ч. upsert через ON CONFLICT)
+        """
+        # Отметка выполнения: новая запись или completed 0 -> 1
+        mark_done = """
+            UPDATE habits SET 
+                completed_count = completed_count + 1,
+                last_completed_date = CASE
+                    WHEN last_completed_date IS NULL OR NEW.log_date > last_completed_date
+                    THEN NEW.log_date ELSE last_completed_date
+                END
+            WHERE id = NEW.habit_id;
+        """
+        # Снятие отметки: при снятии последнего дня откатываемся к предыдущему
+        mark_undone = f"""
+            UPDATE habits SET 
+                completed_count = completed_count - 1,
+                last_completed_date = CASE
+                    WHEN OLD.log_date = last_completed_date THEN NULLIF(MAX(
+                        COALESCE((SELECT date(MAX(day) + {DAY_OFFSET}) FROM habit_logs
+                                  WHERE habit_id = OLD.habit_id AND completed = 1), ''),
+                        COALESCE((SELECT MAX(last_completed) FROM habit_log_rollups
+                                  WHERE habit_id = OLD.habit_id), '')
+                    ), '')
+                    ELSE last_completed_date
+                END
+            WHERE id = OLD.habit_id;
+        """
+        new_live = ROW_NOT_ROLLED_UP_SQL.format(row="NEW")
+        old_live = ROW_NOT_ROLLED_UP_SQL.format(row="OLD")
+        triggers = [
+            ("trg_habit_logs_insert", "AFTER INSERT ON habit_logs "
+             f"WHEN NEW.completed = 1 AND {new_live}", mark_done),
+            ("trg_habit_logs_done", "AFTER UPDATE OF completed ON habit_logs "
+             f"WHEN OLD.completed IS NOT 1 AND NEW.completed = 1 AND {new_live}", mark_done),
+            ("trg_habit_logs_undone", "AFTER UPDATE OF completed ON habit_logs "
+             f"WHEN OLD.completed = 1 AND NEW.completed IS NOT 1 AND {new_live}", mark_undone),
+            ("trg_habit_logs_delete", "AFTER DELETE ON habit_logs "
+             f"WHEN OLD.completed = 1 AND {old_live}", mark_undone),
+        ]
+        
+        # Отметка количества: прибавка к дневному итогу; пересечение цели вверх
+        # отмечает день выполненным, вниз (исправление) - снимает отметку,
+        # иначе сохраняется ручная отметка выполнения
+        target = "(SELECT target_value FROM habits WHERE id = NEW.habit_id)"
+        triggers.append(("trg_habit_events_insert", "AFTER INSERT ON habit_events", f"""
+            INSERT INTO habit_logs (habit_id, day, completed, amount)
+            VALUES (NEW.habit_id, NEW.day, COALESCE(NEW.amount >= {target}, 0), NEW.amount)
+            ON CONFLICT(habit_id, day) DO UPDATE SET
+                amount = COALESCE(habit_logs.amount, 0) + excluded.amount,
+                completed = CASE
+                    WHEN COALESCE(habit_logs.amount, 0) + excluded.amount >= {target} THEN 1
+                    WHEN COALESCE(habit_logs.amount, 0) >= {target} THEN 0
+                    ELSE habit_logs.completed
+                END;
+        """))
+        
+        # Сводка по дням: строка дня создаётся при первой записи за этот день
+        # (scheduled считается один раз), далее меняется только счётчик
+        ensure_day = f"""
+            INSERT INTO daily_summary (log_date, completed, scheduled)
+            SELECT {{row}}.log_date, 0, {SCHEDULED_ON_DAY_SQL.format(
+                day="{row}.log_date", day_number="{row}.day")}
+            WHERE NOT EXISTS (SELECT 1 FROM daily_summary WHERE log_date = {{row}}.log_date);
+        """
+        # Запись задним числом раньше начала отслеживания привычки делает её
+        # запланированной и в уже существующих днях до прежнего начала
+        # (но не позже отключения)
+        extend_tracking = f"""
+            UPDATE daily_summary SET scheduled = scheduled + 1
+            WHERE log_date >= NEW.log_date AND log_date < (
+                SELECT MIN(
+                    date(created_at),
+                    COALESCE((SELECT date(MIN(day) + {DAY_OFFSET}) FROM habit_logs
+                              WHERE habit_id = NEW.habit_id AND day != NEW.day),
+                             '9999-12-31'),
+                    COALESCE((SELECT MIN(first_day) FROM habit_log_rollups
+                              WHERE habit_id = NEW.habit_id), '9999-12-31'),
+                    CASE WHEN is_active = 1 THEN '9999-12-31' ELSE COALESCE(deactivated_at, '') END
+                )
+                FROM habits
+                WHERE id = NEW.habit_id
+            );
+        """
+        # Удаление самой ранней записи (до создания привычки) сдвигает начало
+        # отслеживания вперёд: привычка уходит из плана дней до нового начала
+        shrink_tracking = f"""
+            UPDATE daily_summary SET scheduled = scheduled - 1
+            WHERE log_date >= OLD.log_date AND log_date < (
+                SELECT MIN(
+                    {TRACKING_START_SQL.format(habit="habits")},
+                    CASE WHEN is_active = 1 THEN '9999-12-31' ELSE COALESCE(deactivated_at, '') END
+                )
+                FROM habits
+                WHERE id = OLD.habit_id
+            );
+        """
+        triggers += [
+            ("trg_daily_summary_insert", f"AFTER INSERT ON habit_logs WHEN {new_live}",
+             extend_tracking + ensure_day.format(row="NEW") + """
+                UPDATE daily_summary SET completed = completed + (NEW.completed IS 1)
+                WHERE log_date = NEW.log_date;
+             """),
+            ("trg_daily_summary_update", "AFTER UPDATE OF completed ON habit_logs "
+             f"WHEN (OLD.completed IS 1) != (NEW.completed IS 1) AND {new_live}",
+             ensure_day.format(row="NEW") + """
+                UPDATE daily_summary
+                SET completed = completed + (NEW.completed IS 1) - (OLD.completed IS 1)
+                WHERE log_date = NEW.log_date;
+             """),
+            ("trg_daily_summary_delete", "AFTER DELETE ON habit_logs "
+             f"WHEN OLD.completed = 1 AND {old_live}", """
+                UPDATE daily_summary SET completed = completed - 1
+                WHERE log_date = OLD.log_date;
+             """),
+            ("trg_daily_summary_delete_first", f"AFTER DELETE ON habit_logs WHEN {old_live}",
+             shrink_tracking),
+            ("trg_daily_summary_new_habit", "AFTER INSERT ON habits", """
+                UPDATE daily_summary SET scheduled = scheduled + 1
+                WHERE log_date >= date(NEW.created_at)
+                    AND (NEW.is_active = 1 OR log_date < NEW.deactivated_at);
+             """),
+            # Удалённая привычка уходит из плана всех дней, на которые была запланирована;
+            # BEFORE - пока её логи и свёртки ещё не удалены каскадом
+            ("trg_daily_summary_delete_habit", "BEFORE DELETE ON habits", f"""
+                UPDATE daily_summary SET scheduled = scheduled - 1
+                WHERE log_date >= {TRACKING_START_SQL.format(habit="OLD")}
+                    AND (OLD.is_active = 1 OR log_date < OLD.deactivated_at);
+             """),
+            # Отключение запоминает дату и снимает привычку с плана начиная с сегодня;
+            # включение возвращает её во все дни с даты отключения
+            ("trg_daily_summary_deactivate", "AFTER UPDATE OF is_active ON habits "
+             "WHEN OLD.is_active IS 1 AND NEW.is_active IS NOT 1", f"""
+                UPDATE habits SET deactivated_at = date('now', 'localtime') WHERE id = NEW.id;
+                UPDATE daily_summary SET scheduled = scheduled - 1
+                WHERE log_date >= MAX(date('now', 'localtime'),
+                                      {TRACKING_START_SQL.format(habit="NEW")});
+             """),
+            ("trg_daily_summary_activate", "AFTER UPDATE OF is_active ON habits "
+             "WHEN OLD.is_active IS NOT 1 AND NEW.is_active IS 1", f"""
+                UPDATE habits SET deactivated_at = NULL WHERE id = NEW.id;
+                UPDATE daily_summary SET scheduled = scheduled + 1
+                WHERE log_date >= MAX(COALESCE(OLD.deactivated_at, ''),
+                                      {TRACKING_START_SQL.format(habit="NEW")});
+             """),
+        ]
+        
+        # Триггеры пересоздаются при смене SCHEMA_VERSION (см. migrate_schema),
+        # чтобы старые БД получали актуальные определения
+        # Заменён на trg_daily_summary_deactivate/trg_daily_summary_activate
+        self.cursor.execute("DROP TRIGGER IF EXISTS trg_daily_summary_active")
+        for name, event, body in triggers:
+            self.cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+            self.cursor.execute(f"CREATE TRIGGER {name} {event} BEGIN {body} END")
+    
+    def _recount_habit_counters(self):
+        """Пересчёт completed_count и last_completed_date по логам и свёрткам (без commit)"""
+        self.cursor.execute(f"""
+            UPDATE habits SET 
+                completed_count = (
+                    SELECT COUNT(*) FROM habit_logs
+                    WHERE habit_logs.habit_id = habits.id AND habit_logs.completed = 1
+                ) + (
+                    SELECT COALESCE(SUM(completed_count), 0) FROM habit_log_rollups
+                    WHERE habit_log_rollups.habit_id = habits.id
+                ),
+                last_completed_date = NULLIF(MAX(
+                    COALESCE((SELECT date(MAX(day) + {DAY_OFFSET}) FROM habit_logs
+                              WHERE habit_logs.habit_id = habits.id AND habit_logs.completed = 1), ''),
+                    COALESCE((SELECT MAX(last_completed) FROM habit_log_rollups
+                              WHERE habit_log_rollups.habit_id = habits.id), '')
+                ), '')
+        """)
+    
+    def create_indexes(self):
+        """Создание индексов для оптимизации запросов"""
+        indexes = [
+            # Диапазон дней по привычке покрывает первичный ключ habit_logs
+            # (WITHOUT ROWID) - отдельный индекс не нужен
+            "DROP INDEX IF EXISTS idx_habit_logs_habit_date",
+            # Частичный индекс для напоминаний: срок по расписанию, только активные
+            "DROP INDEX IF EXISTS idx_habits_active_last_completed",
+            "CREATE INDEX IF NOT EXISTS idx_habits_active_reminder_due "
+            "ON habits(reminder_due) WHERE is_active = 1",
+        ]
+        
+        for index_sql in indexes:
+            try:
+                self.cursor.execute(index_sql)
+            except sqlite3.OperationalError:
+                pass
         
         self.conn.commit()
     
+    def _add_column_if_missing(self, table, column, definition):
+        """Добавление колонки в существующую таблицу; True, если колонка добавлена
+        (table_xinfo, а не table_info - чтобы видеть и генерируемые колонки)"""
+        self.cursor.execute(f"PRAGMA table_xinfo({table})")
+        if any(row[1] == column for row in self.cursor.fetchall()):
+            return False
+        self.cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        return True
+    
+    def _migrate_log_days(self):
+        """
+        Перевод habit_logs с ISO-дат (TEXT) на номера дней: таблица
+        пересоздаётся как WITHOUT ROWID с первичным ключом (habit_id, day).
+        Логи удалённых привычек не переносятся - новая таблица проверяет внешний ключ
+        """
+        try:
+            self.conn.execute("BEGIN TRANSACTION")
+            # Представление и триггеры ссылаются на habit_logs - создаются заново ниже
+            self.cursor.execute("DROP VIEW IF EXISTS habit_days")
+            self.cursor.execute(HABIT_LOGS_TABLE_SQL.format(table="habit_logs_days"))
+            self.cursor.execute(f"""
+                INSERT INTO habit_logs_days (habit_id, day, completed, note, created_at)
+                SELECT habit_id, CAST(julianday(log_date) - {DAY_OFFSET} AS INTEGER),
+                       completed, note, created_at
+                FROM habit_logs
+                WHERE julianday(log_date) IS NOT NULL
+                    AND habit_id IN (SELECT id FROM habits)
+            """)
+            migrated = self.cursor.rowcount
+            self.cursor.execute("DROP TABLE habit_logs")
+            self.cursor.execute("ALTER TABLE habit_logs_days RENAME TO habit_logs")
+            self.conn.commit()
+            print(f"✓ Логи переведены на номера дней: {migrated} записей")
+        except sqlite3.Error as e:
+            self.conn.rollback()
+            print(f"✗ Ошибка миграции логов: {e}")
+            raise
+    
     # ============ CRUD ДЛЯ ПРИВЫЧЕК ============
     
-    def create_habit(self, name, description="", category="", frequency="daily", target_time=""):
-        """Создание новой привычки"""
+    def create_habit(self, name, description="", category="", frequency="daily", target_time="",
+                     target_value=None, unit=""):
+        """
+        Создание новой привычки
+        Args:
+            target_value: цель на день для привычки с количеством (8 стаканов,
+                10000 шагов); None - обычная привычка «выполнено/нет»
+            unit: единица количества
+        """
         if not self._validate_habit(name):
             return False
+        schedule = self._parse_frequency(frequency)
+        if schedule is None or not self._validate_target_time(target_time):
+            return False
+        if not self._validate_target_value(target_value):
+            return False
         
         try:
             self.cursor.execute("""
-                INSERT INTO habits (name, description, category, frequency, target_time)
-                VALUES (?, ?, ?, ?, ?)
-            """, (name, description, category, frequency, target_time))
+                INSERT INTO habits (name, description, category, frequency, target_time,
+                                    reminder_gap_days, target_value, unit)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, (name, description, category, frequency, target_time,
+                  reminder_gap_days(schedule), target_value, unit))
             self.conn.commit()
+            self._notify_habit_changed(self.cursor.lastrowid)
             print(f"✓ Привычка '{name}' успешно создана!")
             return True
         except sqlite3.IntegrityError:
@@ -94,7 +653,7 @@ class HabitTracker:
     
     def read_habit(self, habit_id):
         """Получение информации о привычке"""
-        self.cursor.execute("SELECT * FROM habits WHERE id = ?", (habit_id,))
+        self.cursor.execute(f"SELECT {HABIT_COLUMNS} FROM habits WHERE id = ?", (habit_id,))
         habit = self.cursor.fetchone()
         
         if habit:
@@ -106,12 +665,23 @@ class HabitTracker:
     
     def update_habit(self, habit_id, **kwargs):
         """Обновление привычки"""
-        valid_fields = {'name', 'description', 'category', 'frequency', 'target_time', 'is_active'}
+        valid_fields = {'name', 'description', 'category', 'frequency', 'target_time', 'is_active',
+                        'target_value', 'unit'}
         update_fields = {k: v for k, v in kwargs.items() if k in valid_fields}
         
         if not update_fields:
             print("✗ Нет полей для обновления!")
             return False
+        if 'frequency' in update_fields:
+            schedule = self._parse_frequency(update_fields['frequency'])
+            if schedule is None:
+                return False
+            update_fields['reminder_gap_days'] = reminder_gap_days(schedule)
+        if 'target_time' in update_fields and not self._validate_target_time(update_fields['target_time']):
+            return False
+        # Новая цель действует для следующих отметок, прошлые дни не пересчитываются
+        if 'target_value' in update_fields and not self._validate_target_value(update_fields['target_value']):
+            return False
         
         set_clause = ", ".join([f"{k} = ?" for k in update_fields.keys()])
         values = list(update_fields.values()) + [habit_id]
@@ -119,6 +689,9 @@ class HabitTracker:
         try:
             self.cursor.execute(f"UPDATE habits SET {set_clause} WHERE id = ?", values)
             self.conn.commit()
+            if 'frequency' in update_fields:
+                self.schedule_cache.invalidate(habit_id)
+            self._notify_habit_changed(habit_id)
             print(f"✓ Привычка успешно обновлена!")
             return True
         except sqlite3.IntegrityError:
@@ -135,8 +708,22 @@ class HabitTracker:
             return False
         
         name = habit[0]
-        self.cursor.execute("DELETE FROM habits WHERE id = ?", (habit_id,))
-        self.conn.commit()
+        try:
+            self.conn.execute("BEGIN TRANSACTION")
+            # Логи, серии, битмапы и достижения удаляются каскадно (ON DELETE CASCADE);
+            # триггеры habit_logs не видят свёрнутые месяцы - вычитаем их из сводки сами
+            self.cursor.execute(
+                "SELECT habit_id, month FROM habit_log_rollups WHERE habit_id = ?", (habit_id,)
+            )
+            self._forget_rolled_up_days(self.cursor.fetchall())
+            self.cursor.execute("DELETE FROM habits WHERE id = ?", (habit_id,))
+            self.conn.commit()
+        except sqlite3.Error as e:
+            self.conn.rollback()
+            print(f"✗ Ошибка при удалении привычки: {e}")
+            return False
+        self.schedule_cache.invalidate(habit_id)
+        self._notify_habit_changed(habit_id)
         print(f"✓ Привычка '{name}' успешно удалена!")
         return True
     
@@ -144,11 +731,20 @@ class HabitTracker:
     
     def log_habit_completion(self, habit_id, log_date=None, note=""):
         """Отметить выполнение привычки за день"""
+        log_date = self._normalize_date(log_date)
         if log_date is None:
-            log_date = datetime.now().date().isoformat()
+            return False
+        self._unroll_logs([(habit_id, log_date)])
         
-        # Проверяем существование привычки
-        self.cursor.execute("SELECT name FROM habits WHERE id = ?", (habit_id,))
+        # Проверяем существование привычки и текущую отметку за этот день
+        day = self._day_number(log_date)
+        self.cursor.execute("""
+            SELECT habits.name, habit_logs.completed
+            FROM habits
+            LEFT JOIN habit_logs ON habit_logs.habit_id = habits.id
+                AND habit_logs.day = ?
+            WHERE habits.id = ?
+        """, (day, habit_id))
         habit = self.cursor.fetchone()
         if not habit:
             print(f"✗ Привычка с ID {habit_id} не найдена!")
@@ -156,88 +752,1014 @@ class HabitTracker:
         
         try:
             self.cursor.execute("""
-                INSERT INTO habit_logs (habit_id, log_date, completed, note)
+                INSERT INTO habit_logs (habit_id, day, completed, note)
                 VALUES (?, ?, 1, ?)
-                ON CONFLICT(habit_id, log_date) DO UPDATE SET completed = 1, note = ?
-            """, (habit_id, log_date, note, note))
+                ON CONFLICT(habit_id, day) DO UPDATE SET completed = 1, note = ?
+            """, (habit_id, day, note, note))
+            
+            awarded = []
+            if habit[1] != 1:
+                self._set_bitmap_days(habit_id, [log_date], True)
+                self._streak_on_log(habit_id, [log_date])
+                awarded = self._evaluate_achievements({habit_id: [log_date]})
             self.conn.commit()
+            self.schedule_cache.invalidate(habit_id, date.fromisoformat(log_date))
+            self._notify_logs_changed(habit_id, log_date)
             print(f"✓ '{habit[0]}' отмечена как выполненная на {log_date}")
-            self._check_achievements(habit_id)
+            self._print_awarded(awarded)
             return True
         except sqlite3.Error as e:
+            self.conn.rollback()
             print(f"✗ Ошибка: {e}")
             return False
     
+    def log_completions(self, entries, quiet=False):
+        """
+        Пакетная отметка выполнения (синхронизация офлайн-отметок)
+        Args:
+            entries: итерируемое из (habit_id, log_date) или (habit_id, log_date, note)
+            quiet: ничего не печатать - ни итог, ни ошибки, ни достижения
+                (для очереди приёма, см. habit_ingest.py)
+        Returns:
+            количество записанных отметок
+        
+        Все отметки пишутся одной транзакцией через executemany, счётчики,
+        серии и достижения обновляются один раз на каждую затронутую привычку.
+        """
+        rows = {}
+        for entry in entries:
+            habit_id, log_date = entry[0], self._normalize_date(entry[1], quiet)
+            if log_date is not None:
+                rows[(habit_id, log_date)] = entry[2] if len(entry) > 2 else ""
+        if not rows:
+            if not quiet:
+                print("✗ Нет отметок для записи!")
+            return 0
+        
+        # Проверка всех ID одним запросом
+        habit_ids = sorted({habit_id for habit_id, _ in rows})
+        self.cursor.execute("""
+            SELECT id FROM habits
+            WHERE id IN (SELECT value FROM json_each(?))
+        """, (json.dumps(habit_ids),))
+        found = {row[0] for row in self.cursor.fetchall()}
+        
+        missing = [habit_id for habit_id in habit_ids if habit_id not in found]
+        if missing:
+            if not quiet:
+                print(f"✗ Привычки не найдены, отметки пропущены: {missing}")
+            rows = {key: note for key, note in rows.items() if key[0] in found}
+            if not rows:
+                return 0
+        
+        # Свёрнутые месяцы из пакета возвращаются в habit_logs заранее
+        if self._unroll_logs(rows):
+            self.conn.commit()
+        
+        # Уже выполненные дни из пакета - чтобы не считать их повторно
+        days = {log_date: self._day_number(log_date) for _, log_date in rows}
+        self.cursor.execute("""
+            SELECT habit_id, log_date FROM habit_logs
+            WHERE completed = 1
+                AND habit_id IN (SELECT value FROM json_each(?))
+                AND day BETWEEN ? AND ?
+        """, (json.dumps(sorted(found)), min(days.values()), max(days.values())))
+        already_done = set(self.cursor.fetchall())
+        
+        new_dates = {}
+        for key in sorted(rows):
+            if key not in already_done:
+                new_dates.setdefault(key[0], []).append(key[1])
+        
+        awarded = []
+        try:
+            self.conn.execute("BEGIN TRANSACTION")
+            self.cursor.executemany("""
+                INSERT INTO habit_logs (habit_id, day, completed, note)
+                VALUES (?, ?, 1, ?)
+                ON CONFLICT(habit_id, day) DO UPDATE SET completed = 1, note = excluded.note
+            """, [(habit_id, days[log_date], note) for (habit_id, log_date), note in rows.items()])
+            
+            for habit_id, log_dates in new_dates.items():
+                self._set_bitmap_days(habit_id, log_dates, True)
+                self._streak_on_log(habit_id, log_dates)
+            if new_dates:
+                awarded = self._evaluate_achievements(new_dates)
+            
+            self.conn.commit()
+        except sqlite3.Error as e:
+            self.conn.rollback()
+            if not quiet:
+                print(f"✗ Ошибка: {e}")
+            return 0
+        
+        for habit_id, log_date in rows:
+            self.schedule_cache.invalidate(habit_id, date.fromisoformat(log_date))
+            self._notify_logs_changed(habit_id, log_date)
+        
+        if not quiet:
+            print(f"✓ Записано отметок: {len(rows)} (привычек: {len({key[0] for key in rows})})")
+            self._print_awarded(awarded)
+        return len(rows)
+    
     def unlog_habit_completion(self, habit_id, log_date=None):
         """Отменить отметку выполнения"""
+        log_date = self._normalize_date(log_date)
         if log_date is None:
-            log_date = datetime.now().date().isoformat()
+            return False
+        self._unroll_logs([(habit_id, log_date)])
         
         self.cursor.execute("""
-            UPDATE habit_logs SET completed = 0 WHERE habit_id = ? AND log_date = ?
-        """, (habit_id, log_date))
+            UPDATE habit_logs SET completed = 0
+            WHERE habit_id = ? AND day = ? AND completed = 1
+        """, (habit_id, self._day_number(log_date)))
+        if self.cursor.rowcount:
+            self._set_bitmap_days(habit_id, [log_date], False)
+            self._streak_on_unlog(habit_id, log_date)
         self.conn.commit()
+        self.schedule_cache.invalidate(habit_id, date.fromisoformat(log_date))
+        self._notify_logs_changed(habit_id, log_date)
         print(f"✓ Отметка выполнения отменена")
         return True
     
-    # ============ СТАТИСТИКА ============
+    def add_check_in(self, habit_id, amount, log_date=None, note=""):
+        """
+        Отметка количества для привычки с целью (стаканы воды, шаги)
+        Событие дописывается в habit_events, дневной итог habit_logs.amount
+        обновляет триггер; день выполнен, когда итог достиг target_value.
+        Отрицательное количество исправляет ошибочную отметку.
+        """
+        log_date = self._normalize_date(log_date)
+        if log_date is None:
+            return False
+        try:
+            amount = float(amount)
+        except (TypeError, ValueError):
+            print(f"✗ Некорректное количество '{amount}'!")
+            return False
+        if amount == 0:
+            print("✗ Количество не может быть нулевым!")
+            return False
+        self._unroll_logs([(habit_id, log_date)])
+        
+        day = self._day_number(log_date)
+        self.cursor.execute("""
+            SELECT habits.name, habits.target_value, habits.unit,
+                   habit_logs.completed, habit_logs.amount
+            FROM habits
+            LEFT JOIN habit_logs ON habit_logs.habit_id = habits.id
+                AND habit_logs.day = ?
+            WHERE habits.id = ?
+        """, (day, habit_id))
+        habit = self.cursor.fetchone()
+        if not habit:
+            print(f"✗ Привычка с ID {habit_id} не найдена!")
+            return False
+        name, target, unit, was_done, total = habit
+        if target is None:
+            print(f"✗ У привычки '{name}' нет цели по количеству - используйте отметку выполнения")
+            return False
+        total = (total or 0) + amount
+        if total < 0:
+            print(f"✗ Итог за день не может быть отрицательным!")
+            return False
+        
+        try:
+            self.cursor.execute("""
+                INSERT INTO habit_events (habit_id, day, amount, note) VALUES (?, ?, ?, ?)
+            """, (habit_id, day, amount, note))
+            self.cursor.execute(
+                "SELECT completed FROM habit_logs WHERE habit_id = ? AND day = ?", (habit_id, day)
+            )
+            done = self.cursor.fetchone()[0]
+            
+            awarded = []
+            if done == 1 and was_done != 1:
+                self._set_bitmap_days(habit_id, [log_date], True)
+                self._streak_on_log(habit_id, [log_date])
+                awarded = self._evaluate_achievements({habit_id: [log_date]})
+            elif done != 1 and was_done == 1:
+                self._set_bitmap_days(habit_id, [log_date], False)
+                self._streak_on_unlog(habit_id, log_date)
+            self.conn.commit()
+        except sqlite3.Error as e:
+            self.conn.rollback()
+            print(f"✗ Ошибка: {e}")
+            return False
+        
+        self.schedule_cache.invalidate(habit_id, date.fromisoformat(log_date))
+        self._notify_logs_changed(habit_id, log_date)
+        print(f"✓ '{name}': {amount:+g} {unit or ''} на {log_date}, итог {total:g} из {target:g}"
+              + (" - цель достигнута! 🎉" if done == 1 and was_done != 1 else ""))
+        self._print_awarded(awarded)
+        return True
     
-    def get_weekly_stats(self, habit_id):
-        """Статистика выполнения за неделю"""
-        today = datetime.now().date()
-        week_ago = today - timedelta(days=6)
+    # ============ СЕРИИ (STREAKS) ============
+    
+    def _get_streak_state(self, habit_id):
+        """Текущее состояние серий привычки (dict); при отсутствии - пересчёт"""
+        state = self._load_streak_state(habit_id)
+        if state is None:
+            state = self._recompute_streaks([habit_id])[habit_id]
+        return state
+    
+    def _load_streak_state(self, habit_id):
+        """Сохранённое состояние серий привычки (dict) или None"""
+        self.cursor.execute("""
+            SELECT current_streak, current_start, current_end,
+                   longest_streak, longest_start, longest_end
+            FROM habit_streaks
+            WHERE habit_id = ?
+        """, (habit_id,))
+        row = self.cursor.fetchone()
+        if row is None:
+            return None
         
+        keys = ('current_streak', 'current_start', 'current_end',
+                'longest_streak', 'longest_start', 'longest_end')
+        return dict(zip(keys, row))
+    
+    def _save_streak_state(self, habit_id, state):
+        """Сохранение состояния серий (без commit)"""
         self.cursor.execute("""
+            INSERT OR REPLACE INTO habit_streaks
+            (habit_id, current_streak, current_start, current_end,
+             longest_streak, longest_start, longest_end)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (habit_id, state['current_streak'], state['current_start'], state['current_end'],
+              state['longest_streak'], state['longest_start'], state['longest_end']))
+    
+    def _recompute_streaks(self, habit_ids):
+        """
+        Полный пересчёт серий методом gaps-and-islands:
+        у подряд идущих дней разность номер дня - ROW_NUMBER() постоянна.
+        Используется только для правок задним числом и первичного заполнения.
+        Returns:
+            {habit_id: state}
+        """
+        habit_ids = list(habit_ids)
+        self.cursor.execute(f"""
+            WITH islands AS (
+                SELECT 
+                    habit_id,
+                    day,
+                    day - ROW_NUMBER() OVER (PARTITION BY habit_id ORDER BY day) as island
+                FROM ({self._habit_days_sql("completed = 1")})
+            )
             SELECT 
-                habits.name,
-                COUNT(habit_logs.id) as total_days,
-                SUM(CASE WHEN habit_logs.completed = 1 THEN 1 ELSE 0 END) as completed_days,
-                ROUND(SUM(CASE WHEN habit_logs.completed = 1 THEN 1 ELSE 0 END) * 100.0 / 
-                      COUNT(habit_logs.id), 1) as success_rate
-            FROM habits
-            LEFT JOIN habit_logs ON habits.id = habit_logs.habit_id 
-            WHERE habits.id = ? AND habit_logs.log_date BETWEEN ? AND ?
-            GROUP BY habits.id
-        """, (habit_id, week_ago.isoformat(), today.isoformat()))
+                habit_id,
+                COUNT(*) as streak_length,
+                MIN(day) as start_day,
+                MAX(day) as end_day
+            FROM islands
+            GROUP BY habit_id, island
+            ORDER BY habit_id, end_day
+        """, {'habit_ids': json.dumps(habit_ids)})
         
-        result = self.cursor.fetchone()
-        if result:
-            name, total, completed, rate = result
-            print(f"\n📊 Статистика за неделю - '{name}':")
-            print(f"  ✓ Выполнено дней: {completed} из {total}")
-            print(f"  📈 Процент успеха: {rate}%")
-            return result
+        states = {
+            habit_id: {
+                'current_streak': 0, 'current_start': None, 'current_end': None,
+                'longest_streak': 0, 'longest_start': None, 'longest_end': None,
+            }
+            for habit_id in habit_ids
+        }
+        # Острова идут по возрастанию даты: последний - текущая серия,
+        # при равной длине самой длинной считается более поздняя
+        for habit_id, length, start, end in self.cursor.fetchall():
+            start, end = date.fromordinal(start).isoformat(), date.fromordinal(end).isoformat()
+            state = states[habit_id]
+            state.update(current_streak=length, current_start=start, current_end=end)
+            if length >= state['longest_streak']:
+                state.update(longest_streak=length, longest_start=start, longest_end=end)
+        
+        for habit_id, state in states.items():
+            self._save_streak_state(habit_id, state)
+        return states
+    
+    def _streak_on_log(self, habit_id, log_dates):
+        """
+        Обновление серий после новых отметок: O(1) на дату, если все даты
+        идут после последней серии (обычная отметка "за сегодня")
+        Args:
+            log_dates: новые выполненные даты (ISO), отсортированные по возрастанию
+        Returns:
+            (самая длинная серия до отметки, самая длинная серия после)
+        """
+        state = self._load_streak_state(habit_id)
+        if state is None:
+            return 0, self._recompute_streaks([habit_id])[habit_id]['longest_streak']
+        
+        longest_before = state['longest_streak']
+        current_end = state['current_end']
+        
+        if current_end is not None and log_dates[0] <= current_end:
+            # Отметка задним числом может склеить острова - пересчитываем
+            state = self._recompute_streaks([habit_id])[habit_id]
+            return longest_before, state['longest_streak']
+        
+        for log_date in log_dates:
+            if current_end is not None and self._days_between(current_end, log_date) == 1:
+                state['current_streak'] += 1
+            else:
+                state['current_streak'] = 1
+                state['current_start'] = log_date
+            state['current_end'] = current_end = log_date
+            
+            if state['current_streak'] >= state['longest_streak']:
+                state['longest_streak'] = state['current_streak']
+                state['longest_start'] = state['current_start']
+                state['longest_end'] = state['current_end']
+        
+        self._save_streak_state(habit_id, state)
+        return longest_before, state['longest_streak']
+    
+    def _streak_on_unlog(self, habit_id, log_date):
+        """Обновление серий после снятия отметки: O(1) для последнего дня текущей серии"""
+        state = self._get_streak_state(habit_id)
+        
+        if (log_date == state['current_end'] and state['current_streak'] > 1
+                and state['longest_end'] != log_date):
+            state['current_streak'] -= 1
+            state['current_end'] = (date.fromisoformat(log_date) - timedelta(days=1)).isoformat()
+            self._save_streak_state(habit_id, state)
         else:
-            print(f"✗ Нет данных за неделю для привычки {habit_id}")
+            self._recompute_streaks([habit_id])
+    
+    def rebuild_progress(self):
+        """
+        Пересчёт счётчиков, серий, битмапов, сводки по дням и достижений
+        (после импорта, загрузки тестовых данных или ручной правки БД)
+        """
+        self._recount_habit_counters()
+        self.cursor.execute("SELECT id FROM habits")
+        habit_ids = [row[0] for row in self.cursor.fetchall()]
+        self._recompute_streaks(habit_ids)
+        self._rebuild_bitmaps()
+        self._rebuild_daily_summary()
+        awarded = len(self._evaluate_achievements())
+        self.conn.commit()
+        self.schedule_cache.clear()
+        self._notify_logs_changed(None, None)
+        print(f"✓ Счётчики и серии пересчитаны для {len(habit_ids)} привычек")
+        if awarded:
+            print(f"  🎉 Выдано пропущенных достижений: {awarded}")
+        return len(habit_ids)
+    
+    # ============ КАЛЕНДАРЬ-БИТМАПЫ ============
+    
+    def _set_bitmap_days(self, habit_id, log_dates, value):
+        """Установка (value=True) или сброс битов дней в годовых битмапах (без commit)"""
+        days_by_year = {}
+        for log_date in log_dates:
+            day = date.fromisoformat(log_date)
+            days_by_year.setdefault(day.year, []).append(day.timetuple().tm_yday - 1)
+        
+        for year, days in days_by_year.items():
+            self.cursor.execute(
+                "SELECT bits FROM habit_bitmaps WHERE habit_id = ? AND year = ?",
+                (habit_id, year)
+            )
+            row = self.cursor.fetchone()
+            bits = bytearray(row[0]) if row else bytearray(BITMAP_BYTES)
+            
+            for day in days:
+                mask = 0x80 >> (day & 7)
+                if value:
+                    bits[day >> 3] |= mask
+                else:
+                    bits[day >> 3] &= ~mask & 0xFF
+            
+            self.cursor.execute("""
+                INSERT OR REPLACE INTO habit_bitmaps (habit_id, year, bits)
+                VALUES (?, ?, ?)
+            """, (habit_id, year, bytes(bits)))
+    
+    def get_year_calendar(self, habit_id, year):
+        """
+        Выполненные дни года из битмапа (без запросов к логам)
+        Returns:
+            список 0/1 по дням года (индекс 0 - 1 января)
+        """
+        self.cursor.execute(
+            "SELECT bits FROM habit_bitmaps WHERE habit_id = ? AND year = ?",
+            (habit_id, year)
+        )
+        row = self.cursor.fetchone()
+        bits = row[0] if row else bytes(BITMAP_BYTES)
+        days = (date(year + 1, 1, 1) - date(year, 1, 1)).days
+        return [(bits[day >> 3] >> (7 - (day & 7))) & 1 for day in range(days)]
+    
+    def _rebuild_bitmaps(self):
+        """Полное построение битмапов из логов и свёрток (без commit)"""
+        bitmaps = {}
+        cursor = self.conn.execute("""
+            SELECT habit_id, log_date FROM habit_days
+            WHERE completed = 1 AND habit_id IN (SELECT id FROM habits)
+        """)
+        for habit_id, log_date in cursor:
+            day = date.fromisoformat(log_date)
+            bits = bitmaps.setdefault((habit_id, day.year), bytearray(BITMAP_BYTES))
+            day_index = day.timetuple().tm_yday - 1
+            bits[day_index >> 3] |= 0x80 >> (day_index & 7)
+        
+        self.cursor.execute("DELETE FROM habit_bitmaps")
+        self.cursor.executemany(
+            "INSERT INTO habit_bitmaps (habit_id, year, bits) VALUES (?, ?, ?)",
+            [(habit_id, year, bytes(bits)) for (habit_id, year), bits in bitmaps.items()]
+        )
+    
+    # ============ СВОДКА ПО ДНЯМ ============
+    
+    def _daily_summary_sql(self):
+        """
+        Сводка по дням, посчитанная заново из логов и свёрток: дни с записями
+        и дни, уже имеющие строку в daily_summary (их логи могли быть удалены)
+        """
+        return f"""
+            SELECT 
+                days.log_date,
+                days.completed,
+                {SCHEDULED_ON_DAY_SQL.format(day="days.log_date", day_number="days.day")} as scheduled
+            FROM (
+                SELECT CAST(julianday(log_date) - {DAY_OFFSET} AS INTEGER) as day,
+                       log_date, SUM(completed) as completed
+                FROM (
+                    SELECT log_date, completed = 1 as completed FROM habit_days
+                    WHERE habit_id IN (SELECT id FROM habits)
+                    UNION ALL
+                    SELECT log_date, 0 FROM daily_summary
+                )
+                GROUP BY log_date
+            ) days
+        """
+    
+    def _rebuild_daily_summary(self):
+        """Построение daily_summary из логов и свёрток (без commit)"""
+        self.cursor.execute(f"""
+            INSERT OR REPLACE INTO daily_summary (log_date, completed, scheduled)
+            {self._daily_summary_sql()}
+        """)
+    
+    def rebuild_daily_summary(self):
+        """Пересчёт сводки по дням (тепловая карта)"""
+        self._rebuild_daily_summary()
+        self.conn.commit()
+        self.cursor.execute("SELECT COUNT(*) FROM daily_summary")
+        days = self.cursor.fetchone()[0]
+        print(f"✓ Сводка по дням пересчитана: {days} дней")
+        return days
+    
+    def check_daily_summary(self):
+        """
+        Сверка инкрементально поддерживаемой daily_summary с полным пересчётом
+        (сама таблица не меняется)
+        Returns:
+            [(дата, (выполнено, запланировано) в таблице, то же после пересчёта)]
+        """
+        self.cursor.execute(f"""
+            SELECT expected.log_date, daily_summary.completed, daily_summary.scheduled,
+                   expected.completed, expected.scheduled
+            FROM ({self._daily_summary_sql()}) AS expected
+            LEFT JOIN daily_summary ON daily_summary.log_date = expected.log_date
+            WHERE daily_summary.completed IS NOT expected.completed
+                OR daily_summary.scheduled IS NOT expected.scheduled
+            ORDER BY expected.log_date
+        """)
+        mismatches = [(log_date, (completed, scheduled), (expected_completed, expected_scheduled))
+                      for log_date, completed, scheduled, expected_completed, expected_scheduled
+                      in self.cursor.fetchall()]
+        if mismatches:
+            print(f"✗ Сводка по дням расходится с пересчётом в {len(mismatches)} днях")
+        else:
+            print("✓ Сводка по дням совпадает с пересчётом")
+        return mismatches
+    
+    # ============ ХРАНЕНИЕ ЛОГОВ ============
+    
+    def compact_logs(self, retention_days=LOG_RETENTION_DAYS, batch_size=500):
+        """
+        Свёртка логов старше retention_days в месячные строки habit_log_rollups
+        Сворачиваются только целые месяцы; каждая пачка из batch_size пар
+        (привычка, месяц) - отдельная транзакция: вставка свёрток и удаление
+        исходных строк. Счётчики, серии, битмапы и сводка по дням не меняются,
+        статистика и экспорт читают свёртки через habit_days.
+        Returns:
+            {'months': свёрнуто пар (привычка, месяц), 'rows': удалено строк логов}
+        """
+        cutoff = (datetime.now().date() - timedelta(days=retention_days)).replace(day=1)
+        result = {'months': 0, 'rows': 0}
+        
+        while True:
+            self.cursor.execute("""
+                SELECT DISTINCT habit_id, substr(log_date, 1, 7) as month
+                FROM habit_logs
+                WHERE day < ?
+                    AND NOT EXISTS (
+                        SELECT 1 FROM habit_log_rollups
+                        WHERE habit_log_rollups.habit_id = habit_logs.habit_id
+                            AND habit_log_rollups.month = substr(habit_logs.log_date, 1, 7)
+                    )
+                LIMIT ?
+            """, (cutoff.toordinal(), batch_size))
+            groups = []
+            for habit_id, month in self.cursor.fetchall():
+                first = date.fromisoformat(f"{month}-01")
+                following = (first + timedelta(days=31)).replace(day=1)
+                groups.append((habit_id, first.toordinal(), following.toordinal() - 1))
+            if not groups:
+                break
+            
+            try:
+                self.conn.execute("BEGIN TRANSACTION")
+                self.cursor.executemany("""
+                    INSERT INTO habit_log_rollups
+                    (habit_id, month, completed_bits, completed_count, first_day, last_completed, days)
+                    SELECT 
+                        habit_id,
+                        substr(log_date, 1, 7),
+                        SUM(CASE WHEN completed = 1
+                            THEN 1 << (CAST(substr(log_date, 9, 2) AS INTEGER) - 1) ELSE 0 END),
+                        SUM(completed = 1),
+                        MIN(log_date),
+                        MAX(CASE WHEN completed = 1 THEN log_date END),
+                        json_group_object(substr(log_date, 9, 2), json_array(note, created_at, amount))
+                    FROM habit_logs
+                    WHERE habit_id = ? AND day BETWEEN ? AND ?
+                    GROUP BY habit_id
+                """, groups)
+                # Триггеры не срабатывают для свёрнутых месяцев - см. ROW_NOT_ROLLED_UP_SQL
+                self.cursor.executemany("""
+                    DELETE FROM habit_logs WHERE habit_id = ? AND day BETWEEN ? AND ?
+                """, groups)
+                result['rows'] += self.cursor.rowcount
+                self.conn.commit()
+            except sqlite3.Error as e:
+                self.conn.rollback()
+                print(f"✗ Ошибка при свёртке логов: {e}")
+                return None
+            result['months'] += len(groups)
+        
+        self._incremental_vacuum()
+        print(f"✓ Логи до {cutoff} свёрнуты: {result['months']} месячных свёрток, "
+              f"удалено строк: {result['rows']}")
+        return result
+    
+    def collect_orphans(self, batch_size=500):
+        """
+        Удаление строк, ссылающихся на несуществующие привычки (остались от
+        удалений до включения внешних ключей), и возврат освободившихся страниц
+        Каждая пачка из batch_size строк - отдельная транзакция. Сводка по дням
+        считает только существующие привычки (после пересчёта осиротевших логов
+        в ней уже нет), поэтому не вычитается по строкам, а пересчитывается один раз в конце.
+        Returns:
+            {'habits': ID удалённых привычек, таблица: удалено строк, ...,
+             'pages': освобождено страниц, 'bytes': освобождено байт} или None при ошибке
+        """
+        self.cursor.execute(" UNION ".join(
+            f"SELECT habit_id FROM {table} WHERE habit_id NOT IN (SELECT id FROM habits)"
+            for table, _ in ORPHAN_TABLES
+        ))
+        orphan_ids = sorted(row[0] for row in self.cursor.fetchall())
+        result = {'habits': len(orphan_ids)}
+        result.update((table, 0) for table, _ in ORPHAN_TABLES)
+        self.cursor.execute("PRAGMA page_count")
+        pages_before = self.cursor.fetchone()[0]
+        
+        for table, key in ORPHAN_TABLES:
+            columns = key.count(',') + 1
+            from_json = ", ".join(f"json_extract(value, '$[{i}]')" for i in range(columns))
+            while orphan_ids:
+                self.cursor.execute(f"""
+                    SELECT {key} FROM {table}
+                    WHERE habit_id IN (SELECT value FROM json_each(?))
+                    LIMIT ?
+                """, (json.dumps(orphan_ids), batch_size))
+                keys = self.cursor.fetchall()
+                if not keys:
+                    break
+                
+                try:
+                    self.conn.execute("BEGIN TRANSACTION")
+                    self.cursor.execute(f"""
+                        DELETE FROM {table}
+                        WHERE ({key}) IN (SELECT {from_json} FROM json_each(?))
+                    """, (json.dumps(keys),))
+                    result[table] += self.cursor.rowcount
+                    self.conn.commit()
+                except sqlite3.Error as e:
+                    self.conn.rollback()
+                    print(f"✗ Ошибка при удалении осиротевших строк из {table}: {e}")
+                    return None
+        
+        if result['habit_logs'] or result['habit_log_rollups']:
+            self._rebuild_daily_summary()
+            self.conn.commit()
+        for habit_id in orphan_ids:
+            self.schedule_cache.invalidate(habit_id)
+        
+        self._incremental_vacuum()
+        self.cursor.execute("PRAGMA page_count")
+        pages_after = self.cursor.fetchone()[0]
+        self.cursor.execute("PRAGMA page_size")
+        result['pages'] = max(0, pages_before - pages_after)
+        result['bytes'] = result['pages'] * self.cursor.fetchone()[0]
+        
+        rows = sum(result[table] for table, _ in ORPHAN_TABLES)
+        print(f"✓ Удалено осиротевших строк: {rows} (удалённых привычек: {result['habits']})")
+        for table, _ in ORPHAN_TABLES:
+            if result[table]:
+                print(f"  {table}: {result[table]}")
+        print(f"  🗜  Освобождено страниц: {result['pages']} ({result['bytes'] / 1024:.0f} КБ)")
+        return result
+    
+    def _forget_rolled_up_days(self, months):
+        """
+        Вычитание выполненных дней свёрток из daily_summary перед их удалением (без commit)
+        Args:
+            months: список (habit_id, месяц 'YYYY-MM')
+        """
+        if not months:
+            return
+        self.cursor.execute(f"""
+            SELECT log_date, COUNT(*) FROM ({ROLLUP_DAYS_SQL})
+            WHERE completed = 1 AND (habit_id, substr(log_date, 1, 7)) IN (
+                SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]')
+                FROM json_each(?)
+            )
+            GROUP BY log_date
+        """, (json.dumps(list(months)),))
+        self.cursor.executemany(
+            "UPDATE daily_summary SET completed = completed - ? WHERE log_date = ?",
+            [(count, log_date) for log_date, count in self.cursor.fetchall()]
+        )
+    
+    def _incremental_vacuum(self):
+        """Возврат освободившихся страниц; БД без auto_vacuum переводится один раз"""
+        self.cursor.execute("PRAGMA auto_vacuum")
+        if self.cursor.fetchone()[0] != 2:
+            self.cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            self.cursor.execute("VACUUM")
+        # execute() делает один шаг прагмы (одна страница), executescript - до конца
+        self.conn.executescript("PRAGMA incremental_vacuum")
+    
+    def _unroll_logs(self, keys):
+        """
+        Возврат свёрнутых месяцев в habit_logs перед записью в них (без commit)
+        Args:
+            keys: итерируемое из (habit_id, log_date)
+        Returns:
+            количество развёрнутых месяцев
+        """
+        months = json.dumps(sorted({(habit_id, log_date[:7]) for habit_id, log_date in keys}))
+        in_months = """
+            ({month}) IN (
+                SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]')
+                FROM json_each(?)
+            )
+        """
+        self.cursor.execute(
+            f"SELECT COUNT(*) FROM habit_log_rollups WHERE {in_months.format(month='habit_id, month')}",
+            (months,)
+        )
+        if not self.cursor.fetchone()[0]:
+            return 0
+        
+        # Пока свёртка существует, триггеры habit_logs эти строки не учитывают
+        self.cursor.execute(f"""
+            INSERT OR IGNORE INTO habit_logs (habit_id, day, completed, note, created_at, amount)
+            SELECT habit_id, day, completed, note, created_at, amount FROM ({ROLLUP_DAYS_SQL})
+            WHERE {in_months.format(month='habit_id, substr(log_date, 1, 7)')}
+        """, (months,))
+        self.cursor.execute(
+            f"DELETE FROM habit_log_rollups WHERE {in_months.format(month='habit_id, month')}",
+            (months,)
+        )
+        return self.cursor.rowcount
+    
+    def _habit_days_sql(self, condition):
+        """
+        Записи лога привычек :habit_ids (JSON-список) из habit_logs и свёрток.
+        Условие повторяется в обеих частях UNION ALL, чтобы работали индексы:
+        в представление habit_days фильтр по подзапросу не проталкивается
+        """
+        return f"""
+            SELECT habit_id, day, completed FROM habit_logs
+            WHERE habit_id IN (SELECT value FROM json_each(:habit_ids)) AND {condition}
+            UNION ALL
+            SELECT habit_id, day, completed FROM ({ROLLUP_DAYS_SQL})
+            WHERE habit_id IN (SELECT value FROM json_each(:habit_ids)) AND {condition}
+        """
+    
+    def _rolled_up_completed(self, habit_ids, start, end):
+        """Число выполненных дней из свёрток в [start, end]: {habit_id: count}"""
+        self.cursor.execute("""
+            SELECT habit_id, month, completed_bits
+            FROM habit_log_rollups
+            WHERE month BETWEEN substr(?, 1, 7) AND substr(?, 1, 7)
+                AND (? IS NULL OR habit_id IN (SELECT value FROM json_each(?)))
+        """, (start, end,
+              None if habit_ids is None else 1,
+              None if habit_ids is None else json.dumps(list(habit_ids))))
+        
+        counts = {}
+        for habit_id, month, bits in self.cursor.fetchall():
+            # Маска дней месяца, попадающих в окно
+            first = int(start[8:]) if start[:7] == month else 1
+            last = int(end[8:]) if end[:7] == month else 31
+            mask = (1 << last) - (1 << (first - 1))
+            counts[habit_id] = counts.get(habit_id, 0) + bin(bits & mask).count('1')
+        return counts
+    
+    # ============ РАСПИСАНИЕ ============
+    
+    def _parse_frequency(self, frequency):
+        """Разбор частоты при создании/изменении привычки; при ошибке - None"""
+        try:
+            return parse_frequency(frequency)
+        except ValueError as e:
+            print(f"✗ {e}. Примеры: daily, weekly, monthly, 3x/week, 2x/month")
             return None
     
-    def get_monthly_stats(self, habit_id):
-        """Статистика за месяц"""
+    def _validate_target_time(self, target_time):
+        """Проверка времени напоминания при создании/изменении привычки"""
+        try:
+            parse_target_time(target_time)
+            return True
+        except ValueError as e:
+            print(f"✗ {e}. Примеры: 07:00, Sunday 19:00")
+            return False
+    
+    def _validate_target_value(self, target_value):
+        """Проверка цели по количеству (None - привычка без количества)"""
+        if target_value is None:
+            return True
+        try:
+            if float(target_value) > 0:
+                return True
+        except (TypeError, ValueError):
+            pass
+        print(f"✗ Цель по количеству должна быть положительным числом, получено '{target_value}'")
+        return False
+    
+    def _notify_habit_changed(self, habit_id):
+        """Оповещение подписчиков habit_listeners (например, планировщика напоминаний)"""
+        for listener in self.habit_listeners:
+            listener(habit_id)
+    
+    def _notify_logs_changed(self, habit_id, log_date):
+        """Оповещение подписчиков log_listeners (например, скользящих рядов HabitAnalytics)"""
+        for listener in self.log_listeners:
+            listener(habit_id, log_date)
+    
+    def _schedule_of(self, frequency):
+        """Расписание привычки; нераспознанная частота старых БД считается ежедневной"""
+        try:
+            return parse_frequency(frequency)
+        except ValueError:
+            return DAILY
+    
+    def _update_reminder_gaps(self):
+        """Пересчёт habits.reminder_gap_days по частоте привычек (без commit)"""
+        self.cursor.execute("SELECT id, frequency FROM habits")
+        self.cursor.executemany(
+            "UPDATE habits SET reminder_gap_days = ? WHERE id = ?",
+            [(reminder_gap_days(self._schedule_of(frequency)), habit_id)
+             for habit_id, frequency in self.cursor.fetchall()]
+        )
+    
+    def _period_counts(self, schedules, start, end):
+        """
+        Число выполнений по периодам расписания, пересекающимся с [start, end]
+        Args:
+            schedules: {habit_id: Schedule}
+            start, end: границы (date)
+        Returns:
+            {habit_id: {начало периода: выполнено за весь период}}
+        
+        Периоды берутся из schedule_cache; недостающие считаются одним
+        запросом по первичному ключу (habit_id, day) и кладутся в кэш.
+        """
+        counts = {}
+        missing = {}
+        for habit_id, schedule in schedules.items():
+            habit_counts = counts[habit_id] = {}
+            for p_start, _, length in iter_periods(start, end, schedule.period):
+                count = self.schedule_cache.get(habit_id, schedule.period, p_start)
+                if count is None:
+                    missing.setdefault(habit_id, []).append((p_start, length))
+                else:
+                    habit_counts[p_start] = count
+        if not missing:
+            return counts
+        
+        first = min(periods[0][0] for periods in missing.values())
+        last = max(p_start + timedelta(days=length - 1)
+                   for periods in missing.values() for p_start, length in periods)
+        self.cursor.execute(f"""
+            SELECT habit_id, day
+            FROM ({self._habit_days_sql("completed = 1 AND day BETWEEN :first AND :last")})
+        """, {'habit_ids': json.dumps(list(missing)),
+              'first': first.toordinal(), 'last': last.toordinal()})
+        
+        fetched = {habit_id: dict.fromkeys((p for p, _ in periods), 0)
+                   for habit_id, periods in missing.items()}
+        for habit_id, day in self.cursor.fetchall():
+            p_start = period_start(date.fromordinal(day), schedules[habit_id].period)
+            if p_start in fetched[habit_id]:
+                fetched[habit_id][p_start] += 1
+        
+        for habit_id, habit_counts in fetched.items():
+            period = schedules[habit_id].period
+            for p_start, count in habit_counts.items():
+                self.schedule_cache.put(habit_id, period, p_start, count)
+            counts[habit_id].update(habit_counts)
+        return counts
+    
+    def _credited_occurrences(self, schedule, period_counts, start, end):
+        """
+        Выполнения, засчитанные по расписанию: в каждом периоде не больше
+        плана (перевыполнение одной недели не закрывает пропуски другой)
+        """
+        credited = 0.0
+        for p_start, overlap, length in iter_periods(start, end, schedule.period):
+            planned = schedule.times * overlap / length
+            credited += min(period_counts.get(p_start, 0), planned)
+        return credited
+    
+    def get_schedule_streak(self, habit_id):
+        """
+        Серия по расписанию: подряд идущие периоды, в которых план выполнен
+        (для 3x/week - недели минимум с тремя отметками). Текущий период
+        засчитывается, как только план выполнен, и не прерывает серию до его конца.
+        Returns:
+            (текущая серия, самая длинная серия, период) или None
+        """
+        self.cursor.execute(f"""
+            SELECT name, frequency, {TRACKING_START_SQL.format(habit="habits")}
+            FROM habits
+            WHERE id = ?
+        """, (habit_id,))
+        habit = self.cursor.fetchone()
+        if not habit or habit[0] is None:
+            print(f"✗ Привычка с ID {habit_id} не найдена!")
+            return None
+        
+        name, frequency, first_day = habit
+        schedule = self._schedule_of(frequency)
         today = datetime.now().date()
-        month_ago = today - timedelta(days=29)
         
-        self.cursor.execute("""
+        if schedule == DAILY:
+            # Для ежедневных привычек серия по расписанию - это серия дней
+            state = self._get_streak_state(habit_id)
+            self.conn.commit()
+            yesterday = (today - timedelta(days=1)).isoformat()
+            current = state['current_streak'] if (state['current_end'] or '') >= yesterday else 0
+            result = (current, state['longest_streak'], schedule.period)
+        else:
+            start = min(date.fromisoformat(first_day), today)
+            counts = self._period_counts({habit_id: schedule}, start, today)[habit_id]
+            met = [counts.get(p_start, 0) >= schedule.times
+                   for p_start, _, _ in iter_periods(start, today, schedule.period)]
+            
+            longest = run = 0
+            for is_met in met:
+                run = run + 1 if is_met else 0
+                longest = max(longest, run)
+            # Незавершённый текущий период без выполненного плана серию не рвёт
+            current = 0
+            for is_met in reversed(met[:-1] if not met[-1] else met):
+                if not is_met:
+                    break
+                current += 1
+            result = (current, longest, schedule.period)
+        
+        units = {'day': 'дней', 'week': 'недель', 'month': 'месяцев'}[schedule.period]
+        print(f"\n📆 Серия по расписанию ({frequency}) - '{name}':")
+        print(f"  🔥 Текущая: {result[0]} {units} подряд, рекорд: {result[1]}")
+        return result
+    
+    # ============ СТАТИСТИКА ============
+    
+    def _window_stats_rows(self, habit_ids, start, end):
+        """
+        Статистика за окно [start, end] с учётом расписания привычек
+        Дни до начала отслеживания привычки (создание или первая запись)
+        в окно не входят. План - ожидаемое по частоте число выполнений
+        (неполные недели/месяцы - пропорционально), процент - доля плана,
+        засчитанная по периодам.
+        Returns:
+            [(id, name, expected, completed, success_rate)]
+        """
+        self.cursor.execute(f"""
+            WITH tracked AS (
+                SELECT 
+                    habits.id,
+                    habits.name,
+                    habits.frequency,
+                    MAX(?, {TRACKING_START_SQL.format(habit="habits")}) as first_day
+                FROM habits
+                WHERE ? IS NULL OR habits.id IN (SELECT value FROM json_each(?))
+            )
             SELECT 
-                habits.name,
-                COUNT(habit_logs.id) as total_days,
-                SUM(CASE WHEN habit_logs.completed = 1 THEN 1 ELSE 0 END) as completed_days,
-                ROUND(SUM(CASE WHEN habit_logs.completed = 1 THEN 1 ELSE 0 END) * 100.0 / 
-                      COUNT(habit_logs.id), 1) as success_rate
-            FROM habits
-            LEFT JOIN habit_logs ON habits.id = habit_logs.habit_id 
-            WHERE habits.id = ? AND habit_logs.log_date BETWEEN ? AND ?
-            GROUP BY habits.id
-        """, (habit_id, month_ago.isoformat(), today.isoformat()))
+                tracked.id,
+                tracked.name,
+                tracked.frequency,
+                tracked.first_day,
+                COUNT(habit_logs.day) as completed_days
+            FROM tracked
+            LEFT JOIN habit_logs ON habit_logs.habit_id = tracked.id
+                AND habit_logs.day BETWEEN ? AND ?
+                AND habit_logs.completed = 1
+            GROUP BY tracked.id
+            ORDER BY tracked.id
+        """, (start,
+              None if habit_ids is None else 1,
+              None if habit_ids is None else json.dumps(list(habit_ids)),
+              self._day_number(start), self._day_number(end)))
+        rows = self.cursor.fetchall()
+        
+        # Выполненные дни из свёрнутых месяцев добавляются к сырым логам
+        rolled_up = self._rolled_up_completed(habit_ids, start, end)
+        rows = [(habit_id, name, frequency, first_day, completed + rolled_up.get(habit_id, 0))
+                for habit_id, name, frequency, first_day, completed in rows]
+        
+        end_day = date.fromisoformat(end)
+        windows = {}
+        for habit_id, _, frequency, first_day, _ in rows:
+            first_day = date.fromisoformat(first_day)
+            if first_day <= end_day:
+                windows[habit_id] = (self._schedule_of(frequency), first_day)
+        
+        # Ежедневным привычкам периоды не нужны: в дне не больше одной отметки
+        counts = self._period_counts(
+            {habit_id: schedule for habit_id, (schedule, _) in windows.items() if schedule != DAILY},
+            min((first_day for _, first_day in windows.values()), default=end_day), end_day
+        )
+        
+        results = []
+        for habit_id, name, _, _, completed in rows:
+            expected = credited = 0.0
+            if habit_id in windows:
+                schedule, first_day = windows[habit_id]
+                expected = expected_occurrences(schedule, first_day, end_day)
+                credited = completed if schedule == DAILY else self._credited_occurrences(
+                    schedule, counts[habit_id], first_day, end_day)
+            rate = round(credited * 100.0 / expected, 1) if expected else None
+            expected = round(expected, 1)
+            results.append((habit_id, name, int(expected) if expected.is_integer() else expected,
+                            completed, rate))
+        return results
+    
+    def get_window_stats(self, habit_ids=None, start=None, end=None):
+        """
+        Статистика за произвольное окно для нескольких (или всех) привычек
+        Args:
+            habit_ids: список ID привычек; None - все привычки
+            start, end: границы окна (YYYY-MM-DD), по умолчанию - последние 7 дней
+        Returns:
+            [(id, name, expected, completed, success_rate)] - план по расписанию,
+            выполнено и процент выполнения плана
+        """
+        end = self._normalize_date(end)
+        if end is None:
+            return []
+        if start is None:
+            start = (date.fromisoformat(end) - timedelta(days=6)).isoformat()
+        start = self._normalize_date(start)
+        if start is None:
+            return []
         
-        result = self.cursor.fetchone()
-        if result:
+        results = self._window_stats_rows(habit_ids, start, end)
+        if results:
+            print(f"\n📊 СТАТИСТИКА С {start} ПО {end}:")
+            for habit_id, name, total, completed, rate in results:
+                print(f"  {name}: {completed} из {total} по плану ({rate or 0}%)")
+        else:
+            print("✗ Нет привычек!")
+        return results
+    
+    def get_weekly_stats(self, habit_id):
+        """Статистика выполнения за неделю"""
+        today = datetime.now().date()
+        return self._print_period_stats(habit_id, today - timedelta(days=6), today, "неделю")
+    
+    def get_monthly_stats(self, habit_id):
+        """Статистика за месяц"""
+        today = datetime.now().date()
+        return self._print_period_stats(habit_id, today - timedelta(days=29), today, "месяц")
+    
+    def _print_period_stats(self, habit_id, start, end, period_name):
+        """Статистика одной привычки за период в формате (name, total, completed, rate)"""
+        rows = self._window_stats_rows([habit_id], start.isoformat(), end.isoformat())
+        if rows and rows[0][2]:
+            result = rows[0][1:]
             name, total, completed, rate = result
-            print(f"\n📊 Статистика за месяц - '{name}':")
-            print(f"  ✓ Выполнено дней: {completed} из {total}")
+            print(f"\n📊 Статистика за {period_name} - '{name}':")
+            print(f"  ✓ Выполнено: {completed} из {total} по плану")
             print(f"  📈 Процент успеха: {rate}%")
             return result
         else:
-            print(f"✗ Нет данных за месяц для привычки {habit_id}")
+            print(f"✗ Нет данных за {period_name} для привычки {habit_id}")
             return None
     
     def get_all_habits_stats(self):
@@ -246,14 +1768,19 @@ class HabitTracker:
             SELECT 
                 habits.id,
                 habits.name,
-                COUNT(habit_logs.id) as total_logs,
-                SUM(CASE WHEN habit_logs.completed = 1 THEN 1 ELSE 0 END) as completed,
-                ROUND(SUM(CASE WHEN habit_logs.completed = 1 THEN 1 ELSE 0 END) * 100.0 / 
-                      NULLIF(COUNT(habit_logs.id), 0), 1) as success_rate
+                COALESCE(logs.total_logs, 0) as total_logs,
+                logs.completed,
+                ROUND(logs.completed * 100.0 / NULLIF(logs.total_logs, 0), 1) as success_rate
             FROM habits
-            LEFT JOIN habit_logs ON habits.id = habit_logs.habit_id
+            LEFT JOIN (
+                SELECT 
+                    habit_id,
+                    COUNT(*) as total_logs,
+                    SUM(CASE WHEN completed = 1 THEN 1 ELSE 0 END) as completed
+                FROM habit_days
+                GROUP BY habit_id
+            ) logs ON logs.habit_id = habits.id
             WHERE habits.is_active = 1
-            GROUP BY habits.id
             ORDER BY success_rate DESC
         """)
         
@@ -269,40 +1796,15 @@ class HabitTracker:
             return []
     
     def get_longest_streak(self, habit_id):
-        """Самая длинная серия выполнения привычки"""
-        self.cursor.execute("""
-            WITH streaks AS (
-                SELECT 
-                    log_date,
-                    completed,
-                    ROW_NUMBER() OVER (ORDER BY log_date) - 
-                    ROW_NUMBER() OVER (PARTITION BY completed ORDER BY log_date) as streak_group
-                FROM habit_logs
-                WHERE habit_id = ? AND completed = 1
-            ),
-            streak_lengths AS (
-                SELECT 
-                    streak_group,
-                    COUNT(*) as streak_length,
-                    MIN(log_date) as start_date,
-                    MAX(log_date) as end_date
-                FROM streaks
-                GROUP BY streak_group
-            )
-            SELECT 
-                streak_length,
-                start_date,
-                end_date
-            FROM streak_lengths
-            ORDER BY streak_length DESC
-            LIMIT 1
-        """, (habit_id,))
-        
-        result = self.cursor.fetchone()
+        """Самая длинная серия выполнения привычки (подряд идущие дни)"""
         self.cursor.execute("SELECT name FROM habits WHERE id = ?", (habit_id,))
         habit = self.cursor.fetchone()
         
-        if result and habit:
+        state = self._get_streak_state(habit_id) if habit else None
+        self.conn.commit()
+        
+        if state and state['longest_streak']:
+            result = (state['longest_streak'], state['longest_start'], state['longest_end'])
             length, start, end = result
             print(f"\n🔥 Самая длинная серия - '{habit[0]}':")
             print(f"  📈 Длина: {length} дней")
@@ -312,29 +1814,113 @@ class HabitTracker:
             print(f"✗ Нет данных о сериях для привычки {habit_id}")
             return None
     
-    def get_reminder_habits(self):
-        """Привычки, не выполнявшиеся более 2 дней"""
+    def get_current_streak(self, habit_id):
+        """Текущая серия: продолжается, если последняя отметка - сегодня или вчера"""
+        self.cursor.execute("SELECT name FROM habits WHERE id = ?", (habit_id,))
+        habit = self.cursor.fetchone()
+        if not habit:
+            print(f"✗ Привычка с ID {habit_id} не найдена!")
+            return None
+        
+        state = self._get_streak_state(habit_id)
+        self.conn.commit()
+        
+        yesterday = (datetime.now().date() - timedelta(days=1)).isoformat()
+        if state['current_end'] and state['current_end'] >= yesterday:
+            result = (state['current_streak'], state['current_start'], state['current_end'])
+        else:
+            result = (0, None, None)
+        
+        length, start, end = result
+        print(f"\n🔥 Текущая серия - '{habit[0]}': {length} дней")
+        if length:
+            print(f"  📅 С {start} по {end}")
+        return result
+    
+    def get_quantity_stats(self, habit_id, start=None, end=None):
+        """
+        Статистика привычки с количеством за период (по умолчанию - 30 дней)
+        по дневным итогам habit_logs.amount, без суммирования отметок habit_events
+        Returns:
+            {'target', 'unit', 'days', 'total', 'average', 'best', 'days_met'} или None
+        """
+        end = self._normalize_date(end)
+        if end is None:
+            return None
+        if start is None:
+            start = (date.fromisoformat(end) - timedelta(days=29)).isoformat()
+        start = self._normalize_date(start)
+        if start is None:
+            return None
+        
+        self.cursor.execute("SELECT name, target_value, unit FROM habits WHERE id = ?", (habit_id,))
+        habit = self.cursor.fetchone()
+        if not habit or habit[1] is None:
+            print(f"✗ Привычка с ID {habit_id} с целью по количеству не найдена!")
+            return None
+        name, target, unit = habit
+        
+        self.cursor.execute("""
+            SELECT COALESCE(SUM(amount), 0), MAX(amount), SUM(completed = 1)
+            FROM habit_days
+            WHERE habit_id = ? AND day BETWEEN ? AND ?
+        """, (habit_id, self._day_number(start), self._day_number(end)))
+        total, best, days_met = self.cursor.fetchone()
+        days = self._days_between(start, end) + 1
+        stats = {
+            'target': target,
+            'unit': unit,
+            'days': days,
+            'total': total,
+            'average': round(total / days, 2) if days > 0 else 0.0,
+            'best': best,
+            'days_met': days_met or 0,
+        }
+        print(f"\n💧 '{name}' С {start} ПО {end}: всего {total:g} {unit or ''}, "
+              f"в среднем {stats['average']:g} в день (цель {target:g}), "
+              f"цель достигнута {stats['days_met']} из {stats['days']} дней")
+        return stats
+    
+    def get_reminder_habits(self, risk_model=None):
+        """
+        Привычки, перерыв в которых превысил допустимый по расписанию:
+        2 дня для ежедневных, неделя для weekly, 3 дня для 3x/week и т.д.
+        С risk_model (HabitRiskModel из habit_risk.py, требует NumPy) - привычки
+        с высоким риском пропуска сегодня: [(habit_id, название, риск)] по убыванию риска
+        """
+        if risk_model is not None:
+            results = risk_model.at_risk()
+            if results:
+                print("\n🚨 НАПОМИНАНИЕ - Привычки, которые сегодня скорее всего будут пропущены:")
+                for habit_id, name, risk in results:
+                    print(f"  ⚠️  '{name}' - риск пропуска {risk:.0%}")
+            else:
+                print("✓ Все привычки выполняются регулярно! 🎉")
+            return results
+        
         today = datetime.now().date()
-        two_days_ago = today - timedelta(days=2)
         
+        # reminder_due = last_completed_date + reminder_gap_days (генерируемая
+        # колонка), поэтому это два поиска по частичному индексу: диапазон и NULL
         self.cursor.execute("""
-            SELECT 
-                habits.id,
-                habits.name,
-                MAX(habit_logs.log_date) as last_completion,
-                julianday(?) - julianday(MAX(habit_logs.log_date)) as days_passed
+            SELECT id, name, last_completed_date
             FROM habits
-            LEFT JOIN habit_logs ON habits.id = habit_logs.habit_id 
-                AND habit_logs.completed = 1
-            WHERE habits.is_active = 1
-            GROUP BY habits.id
-            HAVING days_passed > 2 OR MAX(habit_logs.log_date) IS NULL
-            ORDER BY days_passed DESC
+            WHERE is_active = 1 AND reminder_due < ?
+            UNION ALL
+            SELECT id, name, NULL
+            FROM habits
+            WHERE is_active = 1 AND reminder_due IS NULL
         """, (today.isoformat(),))
         
-        results = self.cursor.fetchall()
+        # Число дней без выполнения - разность номеров дней
+        results = [
+            (habit_id, name, last_date,
+             today.toordinal() - self._day_number(last_date) if last_date else None)
+            for habit_id, name, last_date in self.cursor.fetchall()
+        ]
+        results.sort(key=lambda row: (row[3] is None, -(row[3] or 0)))
         if results:
-            print("\n🚨 НАПОМИНАНИЕ - Привычки не выполнялись более 2 дней:")
+            print("\n🚨 НАПОМИНАНИЕ - Привычки не выполнялись дольше, чем позволяет расписание:")
             for habit_id, name, last_date, days in results:
                 if last_date:
                     print(f"  ⚠️  '{name}' - {days:.0f} дней не выполнялась (последний раз: {last_date})")
@@ -347,43 +1933,214 @@ class HabitTracker:
     
     # ============ ДОСТИЖЕНИЯ ============
     
-    def _check_achievements(self, habit_id):
-        """Проверка и добавление достижений (бейджи)"""
-        # Получаем статистику
+    def _evaluate_achievements(self, changes=None):
+        """
+        Выдача бейджей по правилам achievement_rules набором SQL-запросов (без commit)
+        Args:
+            changes: {habit_id: [log_date, ...]} - новые отметки (проверяются только эти
+                привычки, а окна - только вокруг новых дней); None - все привычки за всю историю
+        Returns:
+            список выданных бейджей [(habit_id, название, описание)]
+        
+        Правила count/streak проверяются одним запросом по счётчикам привычек,
+        правила rate и window - запросом по habit_logs и свёрткам на каждый размер окна.
+        Правило rate смотрит только на окно, заканчивающееся сегодня: прошлые периоды
+        не проверяются и при changes=None (для них - правило window).
+        """
+        if changes is None:
+            self.cursor.execute("SELECT json_group_array(id) FROM habits")
+            scope = self.cursor.fetchone()[0]
+        else:
+            scope = json.dumps(sorted(changes))
+        
+        # Серии ещё не считались (БД до появления habit_streaks) - считаем, иначе
+        # правила streak видели бы 0
         self.cursor.execute("""
-            SELECT 
-                COUNT(CASE WHEN completed = 1 THEN 1 END) as completed_count
-            FROM habit_logs
-            WHERE habit_id = ? AND completed = 1
-        """, (habit_id,))
+            SELECT id FROM habits
+            WHERE id IN (SELECT value FROM json_each(?))
+                AND id NOT IN (SELECT habit_id FROM habit_streaks)
+        """, (scope,))
+        missing_streaks = [row[0] for row in self.cursor.fetchall()]
+        if missing_streaks:
+            self._recompute_streaks(missing_streaks)
         
-        result = self.cursor.fetchone()
-        if not result:
-            return
+        params = {'habit_ids': scope, 'today': date.today().toordinal()}
+        selects = ["""
+            SELECT habits.id AS habit_id, rule.badge_name, rule.description
+            FROM achievement_rules AS rule
+            JOIN habits
+            LEFT JOIN habit_streaks ON habit_streaks.habit_id = habits.id
+            WHERE rule.is_active = 1 AND rule.metric IN ('count', 'streak')
+                AND habits.id IN (SELECT value FROM json_each(:habit_ids))
+                AND CASE rule.metric
+                    WHEN 'count' THEN habits.completed_count >= rule.threshold
+                    WHEN 'streak' THEN COALESCE(habit_streaks.longest_streak, 0) >= rule.threshold
+                END
+        """]
         
-        completed_count = result[0]
+        # Окно, содержащее новый день d, целиком лежит в [d - окно + 1, d + окно - 1]
+        if changes is not None:
+            days = [self._day_number(log_date) for log_dates in changes.values()
+                    for log_date in log_dates]
+            params['first_day'], params['last_day'] = min(days), max(days)
+        else:
+            params['first_day'] = params['last_day'] = None
+        self.cursor.execute("""
+            SELECT DISTINCT metric, window_days FROM achievement_rules
+            WHERE is_active = 1 AND metric IN ('rate', 'window')
+        """)
+        for metric, window_days in self.cursor.fetchall():
+            window_days = int(window_days)
+            if metric == 'rate':
+                # Процент выполненных дней в окне, заканчивающемся сегодня
+                reached = f"best.done * 100.0 >= rule.threshold * {window_days}"
+                best = f"""
+                    SELECT habit_id, COUNT(*) AS done
+                    FROM ({self._habit_days_sql(
+                        f"completed = 1 AND day BETWEEN :today - {window_days - 1} AND :today")})
+                    GROUP BY habit_id
+                """
+            else:
+                # Лучшее число выполненных дней в скользящем окне
+                reached = "best.done >= rule.threshold"
+                best = f"""
+                    SELECT habit_id, MAX(done) AS done FROM (
+                        SELECT habit_id, COUNT(*) OVER (
+                            PARTITION BY habit_id ORDER BY day
+                            RANGE BETWEEN {window_days - 1} PRECEDING AND CURRENT ROW
+                        ) AS done
+                        FROM ({self._habit_days_sql(
+                            f"completed = 1 AND (:first_day IS NULL "
+                            f"OR day BETWEEN :first_day - {window_days - 1} "
+                            f"AND :last_day + {window_days - 1})")})
+                    )
+                    GROUP BY habit_id
+                """
+            selects.append(f"""
+                SELECT best.habit_id, rule.badge_name, rule.description
+                FROM ({best}) AS best
+                JOIN achievement_rules AS rule
+                    ON rule.metric = '{metric}' AND rule.window_days = {window_days}
+                WHERE rule.is_active = 1 AND {reached}
+            """)
         
-        # Проверяем достижения
-        achievements = [
-            (7, "🎯 Неделяч", "Выполнил привычку 7 дней подряд!"),
-            (30, "🏆 Месячник", "Выполнил привычку 30 дней!"),
-            (100, "💯 Столетие", "Выполнил привычку 100 раз!"),
-        ]
+        self.cursor.execute(f"""
+            SELECT earned.habit_id, earned.badge_name, earned.description
+            FROM ({' UNION ALL '.join(selects)}) AS earned
+            WHERE NOT EXISTS (
+                SELECT 1 FROM achievements
+                WHERE achievements.habit_id = earned.habit_id
+                    AND achievements.badge_name = earned.badge_name
+            )
+            ORDER BY earned.habit_id
+        """, params)
+        awarded = self.cursor.fetchall()
+        self.cursor.executemany("""
+            INSERT OR IGNORE INTO achievements (habit_id, badge_name, description)
+            VALUES (?, ?, ?)
+        """, awarded)
+        return awarded
+    
+    def backfill_achievements(self):
+        """
+        Выдача всех заслуженных по текущим правилам бейджей за всю историю всех привычек
+        (правила rate - только за окно, заканчивающееся сегодня)
+        Returns:
+            число выданных бейджей
+        """
+        try:
+            self.conn.execute("BEGIN TRANSACTION")
+            awarded = self._evaluate_achievements()
+            self.conn.commit()
+        except sqlite3.Error as e:
+            self.conn.rollback()
+            print(f"✗ Ошибка: {e}")
+            return 0
+        print(f"✓ Выдано достижений по правилам: {len(awarded)}")
+        return len(awarded)
+    
+    def _print_awarded(self, awarded):
+        """Вывод новых достижений"""
+        for _, badge_name, description in awarded:
+            print(f"  🎉 ДОСТИЖЕНИЕ: {badge_name} - {description}")
+    
+    def get_achievement_rules(self):
+        """Список правил достижений"""
+        self.cursor.execute("""
+            SELECT badge_name, description, metric, threshold, window_days, is_active
+            FROM achievement_rules
+            ORDER BY metric, threshold
+        """)
+        rules = self.cursor.fetchall()
+        print(f"\n📜 ПРАВИЛА ДОСТИЖЕНИЙ:")
+        for badge_name, description, metric, threshold, window_days, is_active in rules:
+            window = f", окно {window_days} дн." if window_days else ""
+            status = "" if is_active else " (отключено)"
+            print(f"  {badge_name} - {metric} >= {threshold:g}{window}{status}: {description}")
+        return rules
+    
+    def add_achievement_rule(self, badge_name, description, metric, threshold, window_days=None):
+        """
+        Добавление правила достижения и выдача бейджа по всей истории
+        Args:
+            metric: 'count', 'streak', 'window' или 'rate' (см. ACHIEVEMENT_METRICS)
+            threshold: порог метрики (для 'rate' - процент)
+            window_days: размер окна в днях для 'window' и 'rate'
+        """
+        if not badge_name:
+            print("✗ Название бейджа не может быть пустым!")
+            return False
+        if metric not in ACHIEVEMENT_METRICS:
+            print(f"✗ Неизвестная метрика '{metric}', допустимо: {', '.join(ACHIEVEMENT_METRICS)}")
+            return False
+        try:
+            threshold = float(threshold)
+            window_days = int(window_days) if window_days else None
+        except (TypeError, ValueError):
+            print("✗ Порог и окно должны быть числами!")
+            return False
+        if threshold <= 0 or (metric == 'rate' and threshold > 100):
+            print(f"✗ Некорректный порог {threshold:g}!")
+            return False
+        if metric in ('window', 'rate'):
+            if not window_days or window_days <= 0:
+                print(f"✗ Для метрики '{metric}' нужно окно в днях!")
+                return False
+        else:
+            window_days = None
         
-        for threshold, badge_name, description in achievements:
-            if completed_count == threshold:
-                self.cursor.execute("""
-                    SELECT id FROM achievements 
-                    WHERE habit_id = ? AND badge_name = ?
-                """, (habit_id, badge_name))
-                
-                if not self.cursor.fetchone():
-                    self.cursor.execute("""
-                        INSERT INTO achievements (habit_id, badge_name, description)
-                        VALUES (?, ?, ?)
-                    """, (habit_id, badge_name, description))
-                    self.conn.commit()
-                    print(f"  🎉 ДОСТИЖЕНИЕ: {badge_name} - {description}")
+        try:
+            self.conn.execute("BEGIN TRANSACTION")
+            self.cursor.execute("""
+                INSERT INTO achievement_rules (badge_name, description, metric, threshold, window_days)
+                VALUES (?, ?, ?, ?, ?)
+            """, (badge_name, description or badge_name, metric, threshold, window_days))
+            awarded = self._evaluate_achievements()
+            self.conn.commit()
+        except sqlite3.IntegrityError:
+            self.conn.rollback()
+            print(f"✗ Правило '{badge_name}' уже существует!")
+            return False
+        except sqlite3.Error as e:
+            self.conn.rollback()
+            print(f"✗ Ошибка: {e}")
+            return False
+        print(f"✓ Правило '{badge_name}' добавлено, выдано бейджей: {len(awarded)}")
+        return True
+    
+    def set_achievement_rule_active(self, badge_name, is_active=True):
+        """Включение или отключение правила (выданные бейджи остаются)"""
+        self.cursor.execute("""
+            UPDATE achievement_rules SET is_active = ? WHERE badge_name = ?
+        """, (1 if is_active else 0, badge_name))
+        if not self.cursor.rowcount:
+            print(f"✗ Правило '{badge_name}' не найдено!")
+            return False
+        awarded = self._evaluate_achievements() if is_active else []
+        self.conn.commit()
+        print(f"✓ Правило '{badge_name}' {'включено' if is_active else 'отключено'}"
+              + (f", выдано бейджей: {len(awarded)}" if awarded else ""))
+        return True
     
     def get_achievements(self, habit_id):
         """Получение достижений привычки"""
@@ -437,11 +2194,198 @@ class HabitTracker:
             print(f"✗ Ошибка при экспорте: {e}")
             return False
     
+    def export_data(self, filename, start=None, end=None, habit_ids=None, batch_size=1000):
+        """
+        Потоковый экспорт привычек, логов и достижений
+        Args:
+            filename: *.jsonl или *.csv, с суффиксом .gz - со сжатием gzip
+            start, end: диапазон дат логов (YYYY-MM-DD), по умолчанию - вся история
+            habit_ids: список ID привычек; None - все привычки
+            batch_size: размер пачки fetchmany
+        Returns:
+            {таблица: количество строк} или None при ошибке
+        
+        Строки читаются пачками и сразу пишутся в файл, поэтому память
+        не зависит от объёма истории. Привычки идут первыми - импорт
+        сопоставляет их ID по названию до чтения логов.
+        """
+        if start is not None:
+            start = self._normalize_date(start)
+            if start is None:
+                return None
+        if end is not None:
+            end = self._normalize_date(end)
+            if end is None:
+                return None
+        is_csv = '.csv' in filename
+        habit_filter = (None if habit_ids is None else 1,
+                        None if habit_ids is None else json.dumps(list(habit_ids)))
+        # Логи выгружаются из habit_days - вместе со свёрнутыми месяцами
+        queries = [
+            ('habits', "WHERE ? IS NULL OR id IN (SELECT value FROM json_each(?)) ORDER BY id",
+             habit_filter),
+            ('habit_logs', """
+                WHERE (? IS NULL OR habit_id IN (SELECT value FROM json_each(?)))
+                    AND day BETWEEN ? AND ?
+                ORDER BY habit_id, day
+             """, habit_filter + (self._day_number(start or date.min.isoformat()),
+                                  self._day_number(end or date.max.isoformat()))),
+            ('achievements', """
+                WHERE ? IS NULL OR habit_id IN (SELECT value FROM json_each(?))
+                ORDER BY id
+             """, habit_filter),
+        ]
+        
+        counts = {}
+        try:
+            with self._open_export(filename, 'w') as f:
+                if is_csv:
+                    writer = csv.writer(f)
+                    writer.writerow(EXPORT_CSV_COLUMNS)
+                
+                for table, condition, params in queries:
+                    fields = EXPORT_FIELDS[table]
+                    source = 'habit_days' if table == 'habit_logs' else table
+                    cursor = self.conn.execute(
+                        f"SELECT {', '.join(fields)} FROM {source} {condition}", params
+                    )
+                    counts[table] = 0
+                    while True:
+                        rows = cursor.fetchmany(batch_size)
+                        if not rows:
+                            break
+                        for row in rows:
+                            record = dict(zip(fields, row))
+                            if is_csv:
+                                writer.writerow([table] + [record.get(column, '')
+                                                           for column in EXPORT_CSV_COLUMNS[1:]])
+                            else:
+                                f.write(json.dumps({'table': table, **record}, ensure_ascii=False) + "\n")
+                        counts[table] += len(rows)
+        except (OSError, ValueError, sqlite3.Error) as e:
+            print(f"✗ Ошибка при экспорте: {e}")
+            return None
+        
+        print(f"✓ Данные экспортированы в {filename}: "
+              f"привычек {counts['habits']}, логов {counts['habit_logs']}, "
+              f"достижений {counts['achievements']}")
+        return counts
+    
+    def import_data(self, filename, batch_size=1000):
+        """
+        Потоковый импорт файла export_data (JSONL/CSV, в т.ч. .gz)
+        Привычки сопоставляются по названию: существующие не изменяются,
+        новые создаются, а habit_id логов и достижений переводятся
+        в ID этой базы. Логи пишутся пачками по batch_size через executemany.
+        Returns:
+            {таблица: количество строк} или None при ошибке
+        """
+        counts = {'habits': 0, 'habit_logs': 0, 'achievements': 0, 'skipped': 0}
+        id_map = {}
+        pending = {'habit_logs': [], 'achievements': []}
+        
+        try:
+            with self._open_export(filename, 'r') as f:
+                records = csv.DictReader(f) if '.csv' in filename else map(json.loads, f)
+                self.conn.execute("BEGIN TRANSACTION")
+                for record in records:
+                    table = record.get('table')
+                    if table not in EXPORT_FIELDS:
+                        counts['skipped'] += 1
+                        continue
+                    record = {field: self._import_value(field, record.get(field))
+                              for field in EXPORT_FIELDS[table]}
+                    
+                    if table == 'habits':
+                        id_map[record['id']] = self._import_habit(record)
+                        counts['habits'] += 1
+                        continue
+                    
+                    if record['habit_id'] not in id_map:
+                        counts['skipped'] += 1
+                        continue
+                    record['habit_id'] = id_map[record['habit_id']]
+                    pending[table].append(record)
+                    if len(pending[table]) >= batch_size:
+                        counts[table] += self._flush_import(table, pending[table])
+                
+                for table, records in pending.items():
+                    counts[table] += self._flush_import(table, records)
+                self.conn.commit()
+        except (OSError, ValueError, KeyError, csv.Error, sqlite3.Error) as e:
+            if self.conn.in_transaction:
+                self.conn.rollback()
+            print(f"✗ Ошибка при импорте: {e}")
+            return None
+        
+        print(f"✓ Импортировано из {filename}: привычек {counts['habits']}, "
+              f"логов {counts['habit_logs']}, достижений {counts['achievements']}")
+        if counts['skipped']:
+            print(f"  ⚠️  Пропущено строк: {counts['skipped']}")
+        if counts['habits']:
+            self._notify_habit_changed(None)
+        self.rebuild_progress()
+        return counts
+    
+    def _open_export(self, filename, mode):
+        """Текстовый файл экспорта, для *.gz - через gzip"""
+        if filename.endswith('.gz'):
+            return gzip.open(filename, mode + 't', encoding='utf-8', newline='')
+        return open(filename, mode, encoding='utf-8', newline='')
+    
+    def _import_value(self, field, value):
+        """Значение поля из JSON/CSV: пустое число или дата - NULL, ID и флаги - int"""
+        if value is None or (value == '' and field in EXPORT_NULLABLE_FIELDS):
+            return None
+        return int(value) if field in EXPORT_INT_FIELDS else value
+    
+    def _import_habit(self, record):
+        """ID привычки в этой базе: найденной по названию или созданной (без commit)"""
+        self.cursor.execute("SELECT id FROM habits WHERE name = ?", (record['name'],))
+        row = self.cursor.fetchone()
+        if row:
+            return row[0]
+        
+        self.cursor.execute("""
+            INSERT INTO habits (name, description, category, frequency, target_time,
+                                created_at, is_active, reminder_gap_days, target_value, unit,
+                                deactivated_at)
+            VALUES (?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP), COALESCE(?, 1), ?, ?, ?, ?)
+        """, (record['name'], record['description'], record['category'],
+              record['frequency'] or 'daily', record['target_time'], record['created_at'],
+              record['is_active'], reminder_gap_days(self._schedule_of(record['frequency'])),
+              record['target_value'], record['unit'], record['deactivated_at']))
+        return self.cursor.lastrowid
+    
+    def _flush_import(self, table, records):
+        """Запись накопленной пачки логов или достижений (без commit)"""
+        if table == 'habit_logs':
+            for record in records:
+                record['log_date'] = date.fromisoformat(str(record['log_date'])).isoformat()
+                record['day'] = self._day_number(record['log_date'])
+            self._unroll_logs([(record['habit_id'], record['log_date']) for record in records])
+            self.cursor.executemany("""
+                INSERT INTO habit_logs (habit_id, day, completed, note, created_at, amount)
+                VALUES (:habit_id, :day, COALESCE(:completed, 0), :note,
+                        COALESCE(:created_at, CURRENT_TIMESTAMP), :amount)
+                ON CONFLICT(habit_id, day) DO UPDATE SET
+                    completed = excluded.completed, note = excluded.note, amount = excluded.amount
+            """, records)
+        else:
+            self.cursor.executemany("""
+                INSERT OR IGNORE INTO achievements (habit_id, badge_name, description, achieved_at)
+                VALUES (:habit_id, :badge_name, :description,
+                        COALESCE(:achieved_at, CURRENT_TIMESTAMP))
+            """, records)
+        count = len(records)
+        records.clear()
+        return count
+    
     # ============ ВСПОМОГАТЕЛЬНЫЕ МЕТОДЫ ============
     
     def _print_habit(self, habit):
         """Форматированный вывод привычки"""
-        habit_id, name, desc, cat, freq, target, created, active = habit
+        habit_id, name, desc, cat, freq, target, created, active, target_value, unit = habit
         
         print(f"\n  ID: {habit_id}")
         print(f"  📌 Название: {name}")
@@ -449,12 +2393,33 @@ class HabitTracker:
         print(f"  🔄 Частота: {freq}")
         if target:
             print(f"  ⏰ Время: {target}")
+        if target_value is not None:
+            print(f"  🎯 Цель на день: {target_value:g} {unit or ''}")
         if desc:
             print(f"  ℹ️  Описание: {desc}")
         print(f"  ✅ Статус: {'Активна' if active else 'Неактивна'}")
         print(f"  📅 Создана: {created}")
         print("  " + "-" * 60)
     
+    def _normalize_date(self, log_date, quiet=False):
+        """Дата в формате ISO (YYYY-MM-DD); None - сегодня. При ошибке - None"""
+        if log_date is None:
+            return datetime.now().date().isoformat()
+        try:
+            return date.fromisoformat(str(log_date)).isoformat()
+        except ValueError:
+            if not quiet:
+                print(f"✗ Некорректная дата '{log_date}', ожидается YYYY-MM-DD")
+            return None
+    
+    def _day_number(self, log_date):
+        """Номер дня (habit_logs.day) для ISO-даты"""
+        return date.fromisoformat(log_date).toordinal()
+    
+    def _days_between(self, start, end):
+        """Количество дней между двумя ISO-датами"""
+        return self._day_number(end) - self._day_number(start)
+    
     def _validate_habit(self, name):
         """Валидация названия привычки"""
         if not name or not isinstance(name, str):
@@ -465,7 +2430,7 @@ class HabitTracker:
     def list_all_habits(self):
         """Вывод всех привычек"""
         self.cursor.execute(
-            "SELECT * FROM habits ORDER BY created_at DESC"
+            f"SELECT {HABIT_COLUMNS} FROM habits ORDER BY created_at DESC"
         )
         habits = self.cursor.fetchall()
         
@@ -494,16 +2459,23 @@ class HabitTracker:
             print("6. 📊 Статистика за неделю")
             print("7. 📊 Статистика за месяц")
             print("8. 📈 Статистика по всем привычкам")
-            print("9. 🔥 Самая длинная серия")
+            print("9. 🔥 Серии выполнения")
             print("10. 🚨 Напоминания")
             print("11. 🏆 Достижения")
             print("12. 📋 Все привычки")
             print("13. 💾 Экспорт статистики")
             print("14. 🚀 Добавить тестовые данные")
+            print("15. 🛠  Пересчитать производные данные")
+            print("16. 📤 Экспорт данных (JSONL/CSV)")
+            print("17. 📥 Импорт данных (JSONL/CSV)")
+            print("18. 🗜  Свернуть старые логи")
+            print("19. 🧹 Удалить записи удалённых привычек")
+            print("20. 💧 Отметить количество")
+            print("21. 📜 Правила достижений")
             print("0. ❌ Выход")
             print("=" * 60)
             
-            choice = input("Выберите действие (0-14): ").strip()
+            choice = input("Выберите действие (0-21): ").strip()
             
             if choice == "0":
                 print("✓ До свидания!")
@@ -536,6 +2508,20 @@ class HabitTracker:
                 self.export_stats_to_file()
             elif choice == "14":
                 self._add_test_data()
+            elif choice == "15":
+                self.rebuild_progress()
+            elif choice == "16":
+                self._menu_export_data()
+            elif choice == "17":
+                self._menu_import_data()
+            elif choice == "18":
+                self._menu_compact_logs()
+            elif choice == "19":
+                self.collect_orphans()
+            elif choice == "20":
+                self._menu_check_in()
+            elif choice == "21":
+                self._menu_achievement_rules()
             else:
                 print("✗ Неверный выбор!")
     
@@ -546,10 +2532,13 @@ class HabitTracker:
             name = input("Название привычки: ").strip()
             category = input("Категория (здоровье, учеба, спорт и т.д.): ").strip()
             description = input("Описание (опционально): ").strip()
-            frequency = input("Частота (daily, weekly и т.д., по умолчанию daily): ").strip() or "daily"
-            target_time = input("Время выполнения, например '09:00' (опционально): ").strip()
+            frequency = input("Частота (daily, weekly, 3x/week, 2x/month, по умолчанию daily): ").strip() or "daily"
+            target_time = input("Время выполнения, например '09:00' или 'Sunday 19:00' (опционально): ").strip()
+            target_value = input("Цель на день для привычки с количеством, например 8 (опционально): ").strip()
+            unit = input("Единица (стаканы, шаги и т.д.): ").strip() if target_value else ""
             
-            self.create_habit(name, description, category, frequency, target_time)
+            self.create_habit(name, description, category, frequency, target_time,
+                              target_value or None, unit)
         except Exception as e:
             print(f"✗ Ошибка: {e}")
     
@@ -580,6 +2569,10 @@ class HabitTracker:
             if desc:
                 updates['description'] = desc
             
+            frequency = input("Новая частота (daily, weekly, 3x/week...): ").strip()
+            if frequency:
+                updates['frequency'] = frequency
+            
             if updates:
                 self.update_habit(habit_id, **updates)
             else:
@@ -606,6 +2599,17 @@ class HabitTracker:
         except ValueError:
             print("✗ Ошибка: ID должно быть числом!")
     
+    def _menu_check_in(self):
+        """Меню отметки количества"""
+        try:
+            habit_id = int(input("Введите ID привычки: ").strip())
+            amount = float(input("Количество (отрицательное - исправление): ").strip())
+            note = input("Заметка (опционально): ").strip()
+            if self.add_check_in(habit_id, amount, note=note):
+                self.get_quantity_stats(habit_id)
+        except ValueError:
+            print("✗ Ошибка: ID и количество должны быть числами!")
+    
     def _menu_weekly_stats(self):
         """Меню статистики за неделю"""
         try:
@@ -623,10 +2627,12 @@ class HabitTracker:
             print("✗ Ошибка: ID должно быть числом!")
     
     def _menu_longest_streak(self):
-        """Меню самой длинной серии"""
+        """Меню серий выполнения"""
         try:
             habit_id = int(input("Введите ID привычки: ").strip())
+            self.get_current_streak(habit_id)
             self.get_longest_streak(habit_id)
+            self.get_schedule_streak(habit_id)
         except ValueError:
             print("✗ Ошибка: ID должно быть числом!")
     
@@ -638,6 +2644,44 @@ class HabitTracker:
         except ValueError:
             print("✗ Ошибка: ID должно быть числом!")
     
+    def _menu_achievement_rules(self):
+        """Меню правил достижений"""
+        self.get_achievement_rules()
+        if input("\nДобавить правило? (да/нет): ").strip().lower() != "да":
+            return
+        print("Метрики:")
+        for metric, description in ACHIEVEMENT_METRICS.items():
+            print(f"  {metric} - {description}")
+        badge_name = input("Название бейджа: ").strip()
+        description = input("Описание: ").strip()
+        metric = input("Метрика: ").strip()
+        threshold = input("Порог: ").strip()
+        window_days = input("Окно в днях (для window и rate): ").strip() if metric in ('window', 'rate') else None
+        self.add_achievement_rule(badge_name, description, metric, threshold, window_days)
+    
+    def _menu_export_data(self):
+        """Меню экспорта данных"""
+        filename = input("Файл (*.jsonl, *.csv, с .gz - сжатие) [habits_export.jsonl.gz]: ").strip()
+        start = input("Логи с даты YYYY-MM-DD (пусто - вся история): ").strip() or None
+        end = input("Логи по дату YYYY-MM-DD (пусто - по сегодня): ").strip() or None
+        self.export_data(filename or "habits_export.jsonl.gz", start, end)
+    
+    def _menu_import_data(self):
+        """Меню импорта данных"""
+        filename = input("Файл экспорта: ").strip()
+        if filename:
+            self.import_data(filename)
+        else:
+            print("✗ Файл не указан!")
+    
+    def _menu_compact_logs(self):
+        """Меню свёртки старых логов"""
+        try:
+            days = input(f"Хранить подневные логи, дней [{LOG_RETENTION_DAYS}]: ").strip()
+            self.compact_logs(int(days) if days else LOG_RETENTION_DAYS)
+        except ValueError:
+            print("✗ Ошибка: число дней должно быть целым!")
+    
     def _add_test_data(self):
         """Добавление тестовых данных"""
         habits_data = [
@@ -653,23 +2697,23 @@ class HabitTracker:
             if self.create_habit(name, desc, cat, freq, time):
                 count += 1
         
-        # Добавляем логи для примера
-        today = datetime.now().date()
-        for i in range(1, 6):
-            habit_id = i
-            for day in range(0, 30):
-                log_date = (today - timedelta(days=day)).isoformat()
-                # ~70% выполнения
-                import random
-                if random.random() < 0.7:
-                    self.cursor.execute("""
-                        INSERT OR IGNORE INTO habit_logs 
-                        (habit_id, log_date, completed) 
-                        VALUES (?, ?, 1)
-                    """, (habit_id, log_date))
-            
-            self.conn.commit()
+        # Добавляем логи для примера (~70% выполнения) одной пачкой;
+        # большие объёмы для замеров - habit_workload.py
+        # ID берутся по названиям: create_habit возвращает True, а не ID
+        self.cursor.execute("""
+            SELECT id FROM habits WHERE name IN (SELECT value FROM json_each(?))
+        """, (json.dumps([habit[0] for habit in habits_data]),))
+        habit_ids = [row[0] for row in self.cursor.fetchall()]
+        today = datetime.now().date().toordinal()
+        logs = [(habit_id, today - day)
+                for habit_id in habit_ids for day in range(30) if random.random() < 0.7]
+        self.cursor.executemany("""
+            INSERT OR IGNORE INTO habit_logs (habit_id, day, completed)
+            VALUES (?, ?, 1)
+        """, logs)
+        self.conn.commit()
         
+        self.rebuild_progress()
         print(f"✓ Добавлено {count} тестовых привычек с логами!")
 
 
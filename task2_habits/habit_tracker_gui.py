@@ -4,13 +4,105 @@
 GUI for "Трекер привычек" using Tkinter.
 """
 
+import queue
+import threading
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-from datetime import datetime
+from datetime import date, datetime
 
+from habit_schedule import parse_frequency
 from habit_tracker import HabitTracker
 
 
+class ReportWorker:
+    """Background thread with its own DB connection for reports."""
+
+    def __init__(self, db_path):
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+        self.thread = threading.Thread(target=self._run, args=(db_path,), name="habit-reports", daemon=True)
+        self.thread.start()
+
+    def submit(self, func, callback):
+        # func(tracker) runs on the worker, callback(result) - on the Tk thread
+        self.jobs.put((func, callback))
+
+    def _run(self, db_path):
+        # If the connection can't be opened, the error is reported once right away
+        # and then answers every job, so reports never hang on "Загрузка..."
+        try:
+            tracker, startup_error = HabitTracker(db_path), None
+        except Exception as e:
+            tracker, startup_error = None, e
+            self.results.put((None, None, e))
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            func, callback = job
+            if startup_error is not None:
+                self.results.put((callback, None, startup_error))
+                continue
+            try:
+                self.results.put((callback, func(tracker), None))
+            except Exception as e:
+                self.results.put((callback, None, e))
+        if tracker is not None:
+            tracker.close()
+
+    def close(self):
+        self.jobs.put(None)
+        self.thread.join(timeout=5)
+
+
+class CalendarHeatmap:
+    """Per-habit year calendar drawn into a cached PhotoImage."""
+
+    CELL = 12
+    STEP = 14
+    TOP = 16
+    EMPTY = "#ebedf0"
+    DONE = "#40c463"
+    MONTHS = ["Янв", "Фев", "Мар", "Апр", "Май", "Июн", "Июл", "Авг", "Сен", "Окт", "Ноя", "Дек"]
+    MAX_IMAGES = 32
+
+    def __init__(self, parent):
+        self.width = 54 * self.STEP
+        self.height = 7 * self.STEP
+        self.canvas = tk.Canvas(parent, width=self.width, height=self.height + self.TOP,
+                                bg="white", highlightthickness=0)
+        self.image_item = self.canvas.create_image(0, self.TOP, anchor=tk.NW)
+        # (habit_id, year) -> (PhotoImage, days drawn into it)
+        self.images = {}
+
+    def show(self, habit_id, year, days):
+        key = (habit_id, year)
+        image, drawn = self.images.pop(key, (None, None))
+        if image is None:
+            image = tk.PhotoImage(width=self.width, height=self.height)
+            image.put("white", to=(0, 0, self.width, self.height))
+            drawn = [None] * len(days)
+
+        # Only days that changed since the image was last drawn are repainted
+        offset = date(year, 1, 1).weekday()
+        for day, value in enumerate(days):
+            if value != drawn[day]:
+                column, row = divmod(day + offset, 7)
+                x, y = column * self.STEP, row * self.STEP
+                image.put(self.DONE if value else self.EMPTY, to=(x, y, x + self.CELL, y + self.CELL))
+
+        self.images[key] = (image, list(days))
+        while len(self.images) > self.MAX_IMAGES:
+            del self.images[next(iter(self.images))]
+
+        self.canvas.itemconfigure(self.image_item, image=image)
+        self.canvas.delete("months")
+        for month in range(12):
+            column = (date(year, month + 1, 1).timetuple().tm_yday - 1 + offset) // 7
+            self.canvas.create_text(column * self.STEP, 0, text=self.MONTHS[month],
+                                    anchor=tk.NW, font=("DejaVu Sans", 8), tags="months")
+
+
 class HabitTrackerGUI:
     def __init__(self, root):
         self.root = root
@@ -18,9 +110,12 @@ class HabitTrackerGUI:
         self.root.geometry("1000x700")
 
         self.app = HabitTracker()
+        self.reports = ReportWorker(self.app.db_path)
+        self.heatmap_key = None
         self._setup_style()
         self._build_ui()
         self.refresh_habits()
+        self.root.after(50, self._poll_reports)
 
         self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
@@ -133,6 +228,19 @@ class HabitTrackerGUI:
 
         ttk.Button(reports, text="Экспорт в файл", command=self.export_stats).grid(row=3, column=0, padx=6, pady=6)
 
+        calendar = ttk.LabelFrame(self.tab_reports, text="Календарь выполнения")
+        calendar.pack(fill=tk.X, padx=10, pady=(0, 10))
+
+        self.heatmap_year_var = tk.StringVar(value=str(datetime.now().year))
+        ttk.Label(calendar, text="Год").grid(row=0, column=0, sticky=tk.W, padx=6, pady=4)
+        ttk.Entry(calendar, textvariable=self.heatmap_year_var, width=8).grid(row=0, column=1, sticky=tk.W, padx=6, pady=4)
+        ttk.Button(calendar, text="Показать", command=self.show_heatmap).grid(row=0, column=2, padx=6, pady=4)
+        self.heatmap_title = ttk.Label(calendar, text="")
+        self.heatmap_title.grid(row=0, column=3, sticky=tk.W, padx=6, pady=4)
+
+        self.heatmap = CalendarHeatmap(calendar)
+        self.heatmap.canvas.grid(row=1, column=0, columnspan=4, padx=6, pady=6)
+
         self.output = tk.Text(self.tab_reports, height=18, wrap=tk.WORD)
         self.output.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
 
@@ -168,19 +276,35 @@ class HabitTrackerGUI:
         for var in [self.habit_id_var, self.name_var, self.desc_var, self.cat_var, self.freq_var, self.time_var]:
             var.set("")
 
+    def _check_frequency(self, frequency):
+        # create_habit/update_habit reject unknown frequencies; say why instead of silently failing
+        try:
+            parse_frequency(frequency)
+        except ValueError as e:
+            messagebox.showerror("Ошибка", f"{e}.\nПримеры: daily, weekly, monthly, 3x/week, 2x/month")
+            return False
+        return True
+
     def add_habit(self):
         name = self.name_var.get().strip()
         if not name:
             messagebox.showerror("Ошибка", "Название обязательно.")
             return
+        frequency = self.freq_var.get().strip() or "daily"
+        if not self._check_frequency(frequency):
+            return
         if self.app.create_habit(
             name,
             self.desc_var.get().strip(),
             self.cat_var.get().strip(),
-            self.freq_var.get().strip() or "daily",
+            frequency,
             self.time_var.get().strip(),
         ):
             self.refresh_habits()
+        else:
+            messagebox.showerror(
+                "Ошибка", "Привычка не создана: название должно быть уникальным, время - например 07:00 или Sunday 19:00."
+            )
 
     def update_habit(self):
         try:
@@ -197,6 +321,8 @@ class HabitTrackerGUI:
             updates["category"] = self.cat_var.get().strip()
         if self.freq_var.get().strip():
             updates["frequency"] = self.freq_var.get().strip()
+            if not self._check_frequency(updates["frequency"]):
+                return
         if self.time_var.get().strip():
             updates["target_time"] = self.time_var.get().strip()
         if updates and self.app.update_habit(habit_id, **updates):
@@ -221,7 +347,8 @@ class HabitTrackerGUI:
             return
         date_str = self.log_date_var.get().strip() or None
         note = self.log_note_var.get().strip()
-        self.app.log_habit_completion(habit_id, log_date=date_str, note=note)
+        if self.app.log_habit_completion(habit_id, log_date=date_str, note=note):
+            self._refresh_heatmap(habit_id)
 
     def unlog_completion(self):
         try:
@@ -230,7 +357,8 @@ class HabitTrackerGUI:
             messagebox.showerror("Ошибка", "Введите корректный ID.")
             return
         date_str = self.log_date_var.get().strip() or None
-        self.app.unlog_habit_completion(habit_id, log_date=date_str)
+        if self.app.unlog_habit_completion(habit_id, log_date=date_str):
+            self._refresh_heatmap(habit_id)
 
     def _write_output(self, title, lines):
         self.output.delete("1.0", tk.END)
@@ -239,26 +367,47 @@ class HabitTrackerGUI:
         for line in lines:
             self.output.insert(tk.END, line + "\n")
 
+    def _run_report(self, func, callback):
+        self._write_output("Загрузка...", [])
+        self.reports.submit(func, callback)
+
+    def _poll_reports(self):
+        while True:
+            try:
+                callback, result, error = self.reports.results.get_nowait()
+            except queue.Empty:
+                break
+            if error is not None:
+                messagebox.showerror("Ошибка", str(error))
+            else:
+                callback(result)
+        self.root.after(50, self._poll_reports)
+
     def weekly_stats(self):
         habit_id = self._get_report_id()
         if habit_id is None:
             return
-        result = self.app.get_weekly_stats(habit_id)
-        if result:
-            name, total, completed, rate = result
-            self._write_output("Статистика за неделю", [f"{name}: {completed}/{total} дней ({rate}%)"])
+        self._run_report(lambda app: app.get_weekly_stats(habit_id),
+                         lambda result: self._show_period_stats("Статистика за неделю", result))
 
     def monthly_stats(self):
         habit_id = self._get_report_id()
         if habit_id is None:
             return
-        result = self.app.get_monthly_stats(habit_id)
+        self._run_report(lambda app: app.get_monthly_stats(habit_id),
+                         lambda result: self._show_period_stats("Статистика за месяц", result))
+
+    def _show_period_stats(self, title, result):
         if result:
             name, total, completed, rate = result
-            self._write_output("Статистика за месяц", [f"{name}: {completed}/{total} дней ({rate}%)"])
+            self._write_output(title, [f"{name}: {completed} из {total} по плану ({rate}%)"])
+        else:
+            self._write_output(title, ["Нет данных"])
 
     def all_stats(self):
-        results = self.app.get_all_habits_stats()
+        self._run_report(lambda app: app.get_all_habits_stats(), self._show_all_stats)
+
+    def _show_all_stats(self, results):
         lines = [f"{name}: {completed}/{total} дней ({rate or 0}%)" for _, name, total, completed, rate in results]
         self._write_output("Статистика по всем привычкам", lines)
 
@@ -266,13 +415,19 @@ class HabitTrackerGUI:
         habit_id = self._get_report_id()
         if habit_id is None:
             return
-        result = self.app.get_longest_streak(habit_id)
+        self._run_report(lambda app: app.get_longest_streak(habit_id), self._show_longest_streak)
+
+    def _show_longest_streak(self, result):
         if result:
             length, start, end = result
             self._write_output("Самая длинная серия", [f"{length} дней: {start} - {end}"])
+        else:
+            self._write_output("Самая длинная серия", ["Нет данных"])
 
     def reminders(self):
-        results = self.app.get_reminder_habits()
+        self._run_report(lambda app: app.get_reminder_habits(), self._show_reminders)
+
+    def _show_reminders(self, results):
         lines = []
         for _, name, last_date, days in results:
             if last_date:
@@ -285,7 +440,9 @@ class HabitTrackerGUI:
         habit_id = self._get_report_id()
         if habit_id is None:
             return
-        results = self.app.get_achievements(habit_id)
+        self._run_report(lambda app: app.get_achievements(habit_id), self._show_achievements)
+
+    def _show_achievements(self, results):
         lines = [f"{badge} - {desc} ({date})" for badge, desc, date in results]
         self._write_output("Достижения", lines or ["Пока нет достижений"])
 
@@ -296,8 +453,42 @@ class HabitTrackerGUI:
             filetypes=[("Text files", "*.txt")],
         )
         if filename:
-            if self.app.export_stats_to_file(filename):
-                messagebox.showinfo("Готово", f"Отчет сохранен: {filename}")
+            self._run_report(lambda app: app.export_stats_to_file(filename),
+                             lambda ok: self._show_export(filename, ok))
+
+    def _show_export(self, filename, ok):
+        if ok:
+            self._write_output("Экспорт", [f"Отчет сохранен: {filename}"])
+            messagebox.showinfo("Готово", f"Отчет сохранен: {filename}")
+        else:
+            self._write_output("Экспорт", ["Не удалось сохранить отчет"])
+
+    def show_heatmap(self):
+        habit_id = self._get_report_id()
+        if habit_id is None:
+            return
+        try:
+            year = int(self.heatmap_year_var.get().strip())
+            date(year, 1, 1)
+        except ValueError:
+            messagebox.showerror("Ошибка", "Введите корректный год.")
+            return
+        self.heatmap_key = (habit_id, year)
+        self._request_heatmap(habit_id, year)
+
+    def _refresh_heatmap(self, habit_id):
+        if self.heatmap_key and self.heatmap_key[0] == habit_id:
+            self._request_heatmap(*self.heatmap_key)
+
+    def _request_heatmap(self, habit_id, year):
+        self.reports.submit(lambda app: app.get_year_calendar(habit_id, year),
+                            lambda days: self._show_heatmap(habit_id, year, days))
+
+    def _show_heatmap(self, habit_id, year, days):
+        if self.heatmap_key != (habit_id, year):
+            return
+        self.heatmap.show(habit_id, year, days)
+        self.heatmap_title.config(text=f"Привычка {habit_id}, {year}: выполнено дней - {sum(days)}")
 
     def _get_report_id(self):
         try:
@@ -307,6 +498,7 @@ class HabitTrackerGUI:
             return None
 
     def on_close(self):
+        self.reports.close()
         self.app.close()
         self.root.destroy()
 
@@ -0,0 +1,329 @@
+
+"""
+Синтетическая нагрузка и бенчмарк трекера привычек (требует NumPy)
+Генератор создаёт N пользователей × M привычек × Y лет логов с сериями,
+провалами, недельной сезонностью и забрасыванием привычек; все случайные
+величины тянутся массивами, логи пишутся одной пачкой executemany на пользователя.
+Бенчмарк замеряет основные операции на каждом масштабе и пишет результаты в JSON.
+"""
+
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from habit_schedule import parse_frequency, reminder_gap_days
+from habit_sharding import ShardedHabitService
+
+
+# Частоты привычек и их доли среди сгенерированных привычек
+FREQUENCIES = (
+    ("daily", 0.45),
+    ("5x/week", 0.10),
+    ("3x/week", 0.25),
+    ("weekly", 0.15),
+    ("2x/month", 0.05),
+)
+
+# Множитель вероятности выполнения по дням недели (понедельник - воскресенье)
+WEEKDAY_FACTORS = np.array([1.0, 1.0, 0.97, 0.95, 0.88, 0.7, 0.78])
+
+# Средняя длина фаз (дней): активная фаза с регулярным выполнением и провал
+MEAN_ACTIVE_DAYS = 24
+MEAN_LAPSE_DAYS = 6
+
+# Доля привычек, которые бросают, и доля брошенных, отключённых в приложении
+ABANDON_SHARE = 0.3
+DEACTIVATE_SHARE = 0.5
+
+# Доля записей лога со снятой отметкой (completed = 0)
+UNDONE_SHARE = 0.02
+
+# Масштабы бенчмарка по умолчанию: (пользователей, привычек на пользователя, лет)
+DEFAULT_SCALES = ((1, 5, 1), (10, 10, 2), (25, 20, 3))
+
+_PERIOD_DAYS = {'day': 1, 'week': 7, 'month': 30}
+_CATEGORIES = ("Спорт", "Здоровье", "Учеба", "Работа", "Планирование")
+_TARGET_TIMES = ("07:00", "08:30", "12:00", "19:00", "21:00", "")
+
+
+class WorkloadGenerator:
+    """
+    Генератор синтетической истории привычек:
+        service = ShardedHabitService("habit_shards")
+        WorkloadGenerator(seed=1).populate(service, users=10, habits=10, years=2)
+    """
+    
+    def __init__(self, seed=None, end=None):
+        """
+        Args:
+            seed: зерно генератора (одинаковое зерно - одинаковая история)
+            end: последний день истории (date), по умолчанию - сегодня
+        """
+        self.rng = np.random.default_rng(seed)
+        self.end = end or datetime.now().date()
+    
+    # ============ ГЕНЕРАЦИЯ ============
+    
+    def habits(self, count, days):
+        """
+        Параметры привычек пользователя
+        Returns:
+            список dict: name, category, frequency, target_time, start (номер дня
+            начала от начала истории), stop (день, с которого привычка брошена),
+            is_active, p_done (вероятность выполнения в активной фазе)
+        """
+        names = [frequency for frequency, _ in FREQUENCIES]
+        shares = np.array([share for _, share in FREQUENCIES])
+        frequencies = self.rng.choice(len(names), size=count, p=shares / shares.sum())
+        
+        # Часть привычек заводится не в первый день истории
+        starts = np.where(self.rng.random(count) < 0.6, 0,
+                          self.rng.integers(0, max(1, days * 2 // 3), size=count))
+        # Брошенные привычки: день забрасывания после начала
+        abandoned = self.rng.random(count) < ABANDON_SHARE
+        stops = np.where(abandoned,
+                         starts + (self.rng.beta(2, 2, size=count) * (days - starts)).astype(int),
+                         days)
+        deactivated = abandoned & (self.rng.random(count) < DEACTIVATE_SHARE)
+        # Привычки выполняются чаще плана: множитель по пользователю/привычке
+        eagerness = self.rng.lognormal(0.15, 0.25, size=count)
+        
+        habits = []
+        for i in range(count):
+            frequency = names[frequencies[i]]
+            schedule = parse_frequency(frequency)
+            rate = schedule.times / _PERIOD_DAYS[schedule.period]
+            target_time = str(self.rng.choice(_TARGET_TIMES))
+            if schedule.period == 'week' and schedule.times == 1 and target_time:
+                target_time = f"Sunday {target_time}"
+            habits.append({
+                'name': f"Привычка {i + 1}",
+                'category': _CATEGORIES[i % len(_CATEGORIES)],
+                'frequency': frequency,
+                'target_time': target_time,
+                'start': int(starts[i]),
+                'stop': int(stops[i]),
+                'is_active': 0 if deactivated[i] else 1,
+                'p_done': float(min(0.97, rate * eagerness[i])),
+            })
+        return habits
+    
+    def completion_days(self, habits, days):
+        """
+        Матрица дней с записями в логе
+        Активные фазы и провалы чередуются, длины фаз - геометрические (серии);
+        в активной фазе день выполняется с вероятностью p_done × множитель дня недели.
+        Returns:
+            (logged, completed) - bool-матрицы формы (привычек, дней)
+        """
+        count = len(habits)
+        p_done = np.array([habit['p_done'] for habit in habits])
+        starts = np.array([habit['start'] for habit in habits])
+        stops = np.array([habit['stop'] for habit in habits])
+        
+        # Фазы: длины всех фаз сразу (не больше days фаз на привычку), чётность
+        # номера фазы со сдвигом first_active - активна ли фаза
+        first_active = self.rng.random(count) < 0.8
+        phase = np.arange(days)
+        active_phase = (phase[None, :] % 2 == 0) == first_active[:, None]
+        lengths = self.rng.geometric(
+            np.where(active_phase, 1 / MEAN_ACTIVE_DAYS, 1 / MEAN_LAPSE_DAYS)
+        )
+        ends = np.cumsum(lengths, axis=1)
+        boundaries = np.zeros((count, days + 1), dtype=np.int32)
+        rows, cols = np.nonzero(ends < days)
+        boundaries[rows, ends[rows, cols]] = 1
+        phase_of_day = np.cumsum(boundaries[:, :days], axis=1)
+        active = (phase_of_day % 2 == 0) == first_active[:, None]
+        
+        first_day = self.end - timedelta(days=days - 1)
+        weekdays = (np.arange(days) + first_day.weekday()) % 7
+        probability = p_done[:, None] * WEEKDAY_FACTORS[weekdays][None, :]
+        tracked = (phase[None, :] >= starts[:, None]) & (phase[None, :] < stops[:, None])
+        
+        completed = active & tracked & (self.rng.random((count, days)) < probability)
+        # Изредка отметку ставят и снимают - строка остаётся с completed = 0
+        undone = tracked & ~completed & (self.rng.random((count, days)) < UNDONE_SHARE)
+        return completed | undone, completed
+    
+    # ============ ЗАПИСЬ В БД ============
+    
+    def populate(self, service, users, habits, years):
+        """
+        Генерация истории для users пользователей сервиса ShardedHabitService
+        Returns:
+            {'users', 'habits', 'logs', 'seconds'}
+        """
+        started = time.perf_counter()
+        days = int(round(years * 365.25))
+        totals = {'users': users, 'habits': 0, 'logs': 0}
+        for user in range(1, users + 1):
+            with service.tracker(user) as tracker:
+                written_habits, written_logs = self.populate_tracker(tracker, habits, days)
+            totals['habits'] += written_habits
+            totals['logs'] += written_logs
+        totals['seconds'] = round(time.perf_counter() - started, 3)
+        return totals
+    
+    def populate_tracker(self, tracker, count, days):
+        """
+        Запись count привычек с историей за days дней в БД трекера
+        Логи вставляются одной пачкой при работающих триггерах (схема не меняется,
+        параллельные писатели в ту же БД не теряют производные данные), затем
+        счётчики, серии, битмапы, сводка по дням и достижения пересчитываются один раз.
+        Returns:
+            (записано привычек, записано строк логов)
+        """
+        habits = self.habits(count, days)
+        logged, completed = self.completion_days(habits, days)
+        first_day = self.end - timedelta(days=days - 1)
+        
+        conn = tracker.conn
+        try:
+            conn.execute("BEGIN TRANSACTION")
+            habit_ids = []
+            for habit in habits:
+                created = first_day + timedelta(days=habit['start'])
+                cursor = conn.execute("""
+                    INSERT INTO habits (name, description, category, frequency, target_time,
+                                        created_at, is_active, reminder_gap_days)
+                    VALUES (?, '', ?, ?, ?, ?, ?, ?)
+                """, (habit['name'], habit['category'], habit['frequency'], habit['target_time'],
+                      f"{created.isoformat()} 08:00:00", habit['is_active'],
+                      reminder_gap_days(parse_frequency(habit['frequency']))))
+                habit_ids.append(cursor.lastrowid)
+            
+            # Строки идут в порядке первичного ключа (habit_id, day)
+            rows, cols = np.nonzero(logged)
+            day_numbers = cols + first_day.toordinal()
+            logs = [(habit_ids[row], int(day), int(done))
+                    for row, day, done in zip(rows.tolist(), day_numbers.tolist(),
+                                              completed[rows, cols].tolist())]
+            
+            conn.executemany(
+                "INSERT INTO habit_logs (habit_id, day, completed) VALUES (?, ?, ?)", logs
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        
+        with contextlib.redirect_stdout(io.StringIO()):
+            tracker.rebuild_progress()
+        return len(habits), len(logs)
+
+
+# ============ БЕНЧМАРК ============
+
+def _timings(samples):
+    """Сводка замеров (секунды) в миллисекундах"""
+    values = np.array(samples) * 1000
+    return {
+        'calls': len(samples),
+        'total_ms': round(float(values.sum()), 3),
+        'mean_ms': round(float(values.mean()), 3),
+        'p50_ms': round(float(np.percentile(values, 50)), 3),
+        'p95_ms': round(float(np.percentile(values, 95)), 3),
+        'max_ms': round(float(values.max()), 3),
+    }
+
+
+def _measure(samples, operation, func, *args):
+    """Замер одного вызова (вывод операции в консоль подавляется)"""
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = func(*args)
+    samples.setdefault(operation, []).append(time.perf_counter() - started)
+    return result
+
+
+def benchmark_scale(users, habits, years, seed=None, base_dir=None, sample_users=5):
+    """
+    Генерация нагрузки одного масштаба и замер операций на sample_users пользователях
+    Returns:
+        dict с параметрами масштаба, объёмом данных и замерами по операциям
+    """
+    work_dir = tempfile.mkdtemp(prefix="habit_bench_", dir=base_dir)
+    service = ShardedHabitService(work_dir, max_open=max(sample_users, 1))
+    try:
+        generator = WorkloadGenerator(seed)
+        generated = generator.populate(service, users, habits, years)
+        today = generator.end
+        year_ago = (today - timedelta(days=364)).isoformat()
+        export_path = os.path.join(work_dir, "export.jsonl")
+        
+        samples = {}
+        for user in range(1, min(users, sample_users) + 1):
+            with service.tracker(user) as tracker:
+                habit_ids = [row[0] for row in tracker.conn.execute("SELECT id FROM habits")]
+                for habit_id in habit_ids:
+                    _measure(samples, 'check_in', tracker.log_habit_completion,
+                             habit_id, today.isoformat())
+                _measure(samples, 'window_stats', tracker.get_window_stats,
+                         None, year_ago, today.isoformat())
+                _measure(samples, 'all_stats', tracker.get_all_habits_stats)
+                for habit_id in habit_ids:
+                    _measure(samples, 'current_streak', tracker.get_current_streak, habit_id)
+                    _measure(samples, 'longest_streak', tracker.get_longest_streak, habit_id)
+                    _measure(samples, 'schedule_streak', tracker.get_schedule_streak, habit_id)
+                _measure(samples, 'reminders', tracker.get_reminder_habits)
+                _measure(samples, 'export', tracker.export_data, export_path)
+        
+        db_bytes = sum(os.path.getsize(service.shard_path(user)) for user in range(1, users + 1))
+        return {
+            'users': users,
+            'habits_per_user': habits,
+            'years': years,
+            'habits': generated['habits'],
+            'logs': generated['logs'],
+            'generate_s': generated['seconds'],
+            'db_bytes': db_bytes,
+            'operations': {operation: _timings(values) for operation, values in samples.items()},
+        }
+    finally:
+        service.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def run_benchmark(scales=DEFAULT_SCALES, output="habit_benchmark.json", seed=0,
+                  base_dir=None, sample_users=5):
+    """
+    Бенчмарк на каждом масштабе (пользователей, привычек, лет) с записью JSON
+    Returns:
+        список результатов benchmark_scale
+    """
+    results = []
+    for users, habits, years in scales:
+        print(f"⏱  {users} польз. × {habits} привычек × {years} г. ...")
+        result = benchmark_scale(users, habits, years, seed, base_dir, sample_users)
+        results.append(result)
+        print(f"  ✓ логов {result['logs']}, генерация {result['generate_s']} с, "
+              f"БД {result['db_bytes'] / 1024 / 1024:.1f} МБ")
+        for operation, timing in result['operations'].items():
+            print(f"    {operation:>15}: {timing['calls']:>4} вызовов, среднее {timing['mean_ms']} мс, "
+                  f"p95 {timing['p95_ms']} мс")
+    
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'seed': seed,
+            'results': results,
+        }, f, ensure_ascii=False, indent=2)
+    print(f"✓ Результаты бенчмарка сохранены в {output}")
+    return results
+
+
+def main():
+    """Бенчмарк на масштабах по умолчанию"""
+    run_benchmark()
+
+
+if __name__ == "__main__":
+    main()